@@ -1,92 +1,515 @@
+import datetime
 import os
-import sqlite3
 import tkinter as tk
+from tkinter import filedialog
 from tkinter import messagebox
 from tkinter import ttk
-from tkcalendar import DateEntry
+
+import db
+import exporter
+import metrics
+from widgets import Autocomplete, Debouncer, MetricsWindow, PagedTreeLoader, ReusableDialog, StatusBar, TreeDelta
+from prefixindex import PrefixIndex
+from rowstore import RowStore
+from worker import QueryWorker, WriteQueue
+
+DB_PATH = 'bookstore.db'
+
+# Сколько строк подгружается в таблицу за один раз
+PAGE_SIZE = 100
+
+# Максимум строк в результатах поиска
+SEARCH_LIMIT = 500
+
+# Задержка поиска при вводе текста, мс
+SEARCH_DELAY = 300
+
+# Сколько id передаётся в одном DELETE ... WHERE id IN (...) при массовом удалении
+DELETE_BATCH_SIZE = 500
+
+# Сколько свободных страниц возвращается файлу базы за один шаг и пауза между шагами, мс
+VACUUM_STEP_PAGES = 1000
+VACUUM_STEP_DELAY = 50
+
+# Количество экземпляров, которым заменяется прежний флаг "Да" при миграции и импорте
+DEFAULT_STOCK_QUANTITY = 1
+
+# Порог, ниже которого книга считается заканчивающейся
+LOW_STOCK = 5
+
+# Столбцы, заполняемые при добавлении книги
+BOOK_COLUMNS = ('title', 'author', 'genre', 'price', 'pub_date', 'stock')
+
+# Столбцы строки books и столбцы с повторяющимися значениями, которые хранятся без повторов
+BOOK_FIELDS = ('id',) + BOOK_COLUMNS
+BOOK_INTERNED = ('author', 'genre', 'pub_date')
+
+# Поля диалога добавления с подсказками уже встречавшихся значений
+SUGGEST_FIELDS = ('author', 'genre')
+
+INSERT_BOOK_SQL = '''
+    INSERT INTO books (title, author, genre, price, pub_date, stock) 
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+# Поля каталога, доступные для поиска
+SEARCH_FIELDS = {
+    "Везде": None,
+    "Название": 'title',
+    "Автор": 'author',
+    "Жанр": 'genre',
+}
+
+# Фильтр по наличию на складе: подпись в интерфейсе -> значение фильтра
+STOCK_FILTERS = {
+    "": None,
+    "В наличии": 'in',
+    "Заканчиваются": 'low',
+    "Нет в наличии": 'out',
+}
+
+# Столбцы таблицы, по которым возможна сортировка на стороне базы
+SORT_COLUMNS = {
+    'id': 'books.id',
+    'title': 'books.title',
+    'author': 'books.author',
+    'genre': 'books.genre',
+    'price': 'books.price',
+    'pub_date': 'books.pub_date',
+    'stock': 'books.stock',
+}
 
 
 # Функции работы с базой данных
 def create_db():
     try:
-        conn = sqlite3.connect('bookstore.db')
-        cursor = conn.cursor()
+        conn = db.get_connection(DB_PATH)
+        with conn:
+            cursor = conn.cursor()
 
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS books (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                author TEXT NOT NULL,
-                genre TEXT NOT NULL,
-                price REAL NOT NULL,
-                pub_date TEXT NOT NULL,
-                stock TEXT NOT NULL
-            )
-        ''')
-
-        conn.commit()
-        conn.close()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS books (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT NOT NULL,
+                    author TEXT NOT NULL,
+                    genre TEXT NOT NULL,
+                    price REAL NOT NULL,
+                    pub_date TEXT NOT NULL,
+                    stock TEXT NOT NULL
+                )
+            ''')
+
+        db.migrate(conn, MIGRATIONS)
     except Exception as e:
         print(f"Error creating database: {e}")
+        return
+    enable_vacuum()
 
-def add_book(title, author, genre, price, pub_date, stock):
+def enable_vacuum():
+    # Однократный VACUUM при переходе на incremental_vacuum - уже после миграций и отдельно от них:
+    # его ошибка не оставляет схему старой
     try:
-        conn = sqlite3.connect('bookstore.db')
-        cursor = conn.cursor()
-
+        db.enable_incremental_vacuum(db.get_connection(DB_PATH))
+    except Exception as e:
+        print(f"Error enabling incremental vacuum: {e}")
+
+# Миграции схемы (номер версии хранится в PRAGMA user_version)
+def migrate_v1_catalog_index(cursor):
+    # Триграммный индекс по названию, автору и жанру: поиск подстрок без полного просмотра таблицы
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            title, author, genre, content='books', content_rowid='id', tokenize='trigram'
+        )
+    ''')
+    create_catalog_triggers(cursor)
+    # Индексируем книги, уже сохранённые в существующем bookstore.db
+    cursor.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+
+def create_catalog_triggers(cursor):
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, author, genre) VALUES (new.id, new.title, new.author, new.genre);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author, genre)
+            VALUES ('delete', old.id, old.title, old.author, old.genre);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, author, genre ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author, genre)
+            VALUES ('delete', old.id, old.title, old.author, old.genre);
+            INSERT INTO books_fts (rowid, title, author, genre) VALUES (new.id, new.title, new.author, new.genre);
+        END
+    ''')
+
+def migrate_v2_stock_quantity(cursor):
+    # Флаг наличия "Да"/"Нет" заменяется количеством экземпляров на складе
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'books'")
+    sequence = cursor.fetchone()
+
+    cursor.execute('''
+        CREATE TABLE books_v2 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            author TEXT NOT NULL,
+            genre TEXT NOT NULL,
+            price REAL NOT NULL,
+            pub_date TEXT NOT NULL,
+            stock INTEGER NOT NULL DEFAULT 0 CHECK (stock >= 0)
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO books_v2 (id, title, author, genre, price, pub_date, stock)
+        SELECT id, title, author, genre, price, pub_date,
+               CASE
+                   WHEN stock = 'Да' THEN ?
+                   WHEN CAST(stock AS INTEGER) > 0 THEN CAST(stock AS INTEGER)
+                   ELSE 0
+               END
+        FROM books
+    ''', (DEFAULT_STOCK_QUANTITY,))
+    cursor.execute('DROP TABLE books')
+    cursor.execute('ALTER TABLE books_v2 RENAME TO books')
+    if sequence:
+        # Счётчик AUTOINCREMENT не должен повторно выдать id удалённых книг
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'books'")
         cursor.execute('''
-            INSERT INTO books (title, author, genre, price, pub_date, stock) 
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (title, author, genre, price, pub_date, stock))
+            INSERT INTO sqlite_sequence (name, seq)
+            VALUES ('books', MAX(?, (SELECT IFNULL(MAX(id), 0) FROM books)))
+        ''', sequence)
+
+    # Триггеры каталога удалены вместе со старой таблицей; id не изменились, индекс остаётся верным
+    create_catalog_triggers(cursor)
+
+    # Частичный индекс только по книгам в наличии: списки "в наличии" и "заканчиваются"
+    # читают его, а не всю таблицу. Условие stock > 0 должно буквально входить в запрос.
+    cursor.execute('CREATE INDEX idx_books_in_stock ON books (stock) WHERE stock > 0')
+
+def migrate_v3_sort_indexes(cursor):
+    # Индексы для сортировки и фильтров таблицы: страница читается по индексу без сортировки всей таблицы
+    cursor.execute('CREATE INDEX idx_books_price ON books (price)')
+    cursor.execute('CREATE INDEX idx_books_pub_date ON books (pub_date)')
+    cursor.execute('CREATE INDEX idx_books_author ON books (author)')
+    # Статистика для планировщика, чтобы он выбирал подходящий индекс. Собирается только по книгам:
+    # статистика служебных таблиц полнотекстового индекса, снятая с пустой базы, замедляет вставку
+    cursor.execute('ANALYZE books')
+
+def migrate_v4_catalog_stats(cursor):
+    # Убирает статистику служебных таблиц books_fts, записанную прежним ANALYZE по всей базе:
+    # с ней планировщик выбирает для внутренних запросов индекса полный просмотр,
+    # и каждая вставка становится тем медленнее, чем больше книг
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+    if cursor.fetchone():
+        cursor.execute("DELETE FROM sqlite_stat1 WHERE tbl LIKE 'books_fts%'")
+        # Перечитывает статистику в уже открытых соединениях
+        cursor.execute('ANALYZE sqlite_master')
+
+def migrate_v5_genre_index(cursor):
+    # Индекс жанра: список жанров для подсказок в диалоге добавления читается по индексу, без строк таблицы
+    cursor.execute('CREATE INDEX idx_books_genre ON books (genre)')
+
+def migrate_v6_title_index(cursor):
+    # Индекс названия для сортировки таблицы по названию; id - rowid и уже входит в индекс последним столбцом
+    cursor.execute('CREATE INDEX idx_books_title ON books (title)')
+    cursor.execute('ANALYZE books')
+
+MIGRATIONS = [
+    (1, migrate_v1_catalog_index),
+    (2, migrate_v2_stock_quantity),
+    (3, migrate_v3_sort_indexes),
+    (4, migrate_v4_catalog_stats),
+    (5, migrate_v5_genre_index),
+    (6, migrate_v6_title_index),
+]
+
+def insert_book(cursor, values):
+    # Добавляет книгу в открытой транзакции; values - в порядке BOOK_COLUMNS. Возвращает строку книги
+    cursor.execute(INSERT_BOOK_SQL, values)
+    cursor.execute('SELECT * FROM books WHERE id = ?', (cursor.lastrowid,))
+    return cursor.fetchone()
+
+def remove_books(cursor, book_ids):
+    # Удаляет книги в открытой транзакции, передавая id пакетами; возвращает id удалённых
+    deleted = []
+    for start in range(0, len(book_ids), DELETE_BATCH_SIZE):
+        batch = book_ids[start:start + DELETE_BATCH_SIZE]
+        placeholders = ', '.join('?' * len(batch))
+        cursor.execute(f'DELETE FROM books WHERE id IN ({placeholders}) RETURNING id', batch)
+        deleted.extend(row[0] for row in cursor.fetchall())
+    return deleted
+
+def remove_books_by_filter(cursor, filters):
+    # Удаляет в открытой транзакции все книги, подходящие под фильтры, одним запросом; возвращает id удалённых
+    conditions, params = book_filter_conditions(filters)
+    if not conditions:
+        raise ValueError("фильтр не задан: удаление всех книг не выполняется")
+    cursor.execute(f"DELETE FROM books WHERE {' AND '.join(conditions)} RETURNING id", params)
+    return [row[0] for row in cursor.fetchall()]
+
+# Записи одной транзакцией для пакетных скриптов и бенчмарков. Ошибки не перехватываются:
+# о них сообщает вызывающий, окно - в строке состояния
+@metrics.timed
+def add_book(title, author, genre, price, pub_date, stock):
+    # Возвращает строку новой книги
+    conn = db.get_connection(DB_PATH)
+    with conn:
+        return insert_book(conn.cursor(), (title, author, genre, price, pub_date, stock))
+
+def validate_book(record):
+    # Проверяет запись (словарь полей) и возвращает значения в порядке BOOK_COLUMNS
+    values = {}
+    for column in BOOK_COLUMNS:
+        value = record.get(column)
+        value = '' if value is None else str(value).strip()
+        if not value:
+            raise ValueError(f"поле {column} обязательно для заполнения")
+        values[column] = value
 
-        conn.commit()
-        conn.close()
-        messagebox.showinfo("Успех", "Книга успешно добавлена!")
+    try:
+        values['price'] = float(values['price'])
+    except ValueError:
+        raise ValueError(f"цена должна быть числом: {values['price']}")
+    if values['price'] < 0:
+        raise ValueError(f"цена не может быть отрицательной: {values['price']}")
+    try:
+        values['pub_date'] = datetime.date.fromisoformat(values['pub_date']).isoformat()
+    except ValueError:
+        raise ValueError(f"дата должна быть в формате ГГГГ-ММ-ДД: {values['pub_date']}")
+    values['stock'] = parse_stock(values['stock'])
+
+    return tuple(values[column] for column in BOOK_COLUMNS)
+
+def parse_stock(value):
+    # Количество экземпляров; прежние значения "Да"/"Нет" тоже принимаются
+    value = str(value).strip()
+    if value == "Да":
+        return DEFAULT_STOCK_QUANTITY
+    if value == "Нет":
+        return 0
+    try:
+        quantity = int(value)
+    except ValueError:
+        raise ValueError(f"количество должно быть целым числом: {value}")
+    if quantity < 0:
+        raise ValueError(f"количество не может быть отрицательным: {value}")
+    return quantity
+
+@metrics.timed
+def view_books():
+    try:
+        rows = db.fetchall_cached(DB_PATH, 'SELECT * FROM books')
+
+        return rows
     except Exception as e:
-        print(f"Error adding book: {e}")
-        messagebox.showerror("Ошибка", f"Ошибка при добавлении книги: {e}")
+        print(f"Error viewing books: {e}")
+        return []
 
-def view_books():
+# Ключи фильтров book_filter_conditions
+FILTER_KEYS = ('price_min', 'price_max', 'stock')
+
+def book_filter_conditions(filters):
+    # Условия WHERE и параметры для фильтров: price_min, price_max и stock ('in', 'low' или 'out').
+    # Условие stock > 0 записано буквально, чтобы сработал частичный индекс idx_books_in_stock
+    conditions = []
+    params = []
+    filters = filters or {}
+    if filters.get('price_min') is not None:
+        conditions.append('books.price >= ?')
+        params.append(filters['price_min'])
+    if filters.get('price_max') is not None:
+        conditions.append('books.price <= ?')
+        params.append(filters['price_max'])
+    if filters.get('stock') == 'in':
+        conditions.append('books.stock > 0')
+    elif filters.get('stock') == 'low':
+        conditions.append('books.stock > 0 AND books.stock <= ?')
+        params.append(LOW_STOCK)
+    elif filters.get('stock') == 'out':
+        conditions.append('books.stock = 0')
+    return conditions, params
+
+@metrics.timed
+def query_books(filters=None, order_by='id', descending=False, after=None, limit=PAGE_SIZE):
+    # Страница книг с фильтрами и сортировкой. Последним столбцом строки идёт ключ сортировки:
+    # следующая страница продолжается после строки after по паре (ключ, id) без OFFSET
     try:
-        conn = sqlite3.connect('bookstore.db')
-        cursor = conn.cursor()
+        column = SORT_COLUMNS[order_by]
+        direction = 'DESC' if descending else 'ASC'
+        conditions, params = book_filter_conditions(filters)
+        if after is not None:
+            if order_by == 'id':
+                conditions.append(f"books.id {'<' if descending else '>'} ?")
+                params.append(after[0])
+            else:
+                conditions.append(f"({column}, books.id) {'<' if descending else '>'} (?, ?)")
+                params.extend((after[-1], after[0]))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
 
-        cursor.execute('SELECT * FROM books')
-        rows = cursor.fetchall()
+        rows = db.fetchall_cached(DB_PATH, f'''
+            SELECT books.*, {column} FROM books
+            {where}
+            ORDER BY {column} {direction}, books.id {direction}
+            LIMIT ?
+        ''', (*params, limit))
 
-        conn.close()
         return rows
     except Exception as e:
         print(f"Error viewing books: {e}")
         return []
 
-def search_books(title):
+def book_value_counts(field):
+    # Значения поля author или genre и число книг с ними - для подсказок в диалоге добавления.
+    # Группировка читает только индекс поля (idx_books_author, idx_books_genre)
+    try:
+        if field not in SUGGEST_FIELDS:
+            raise ValueError(f"подсказки для поля {field} не поддерживаются")
+        conn = db.get_connection(DB_PATH)
+        return conn.execute(f'SELECT {field}, COUNT(*) FROM books GROUP BY {field}').fetchall()
+    except Exception as e:
+        print(f"Error reading {field} values: {e}")
+        return []
+
+@metrics.timed
+def get_book_by_id(book_id):
     try:
-        conn = sqlite3.connect('bookstore.db')
-        cursor = conn.cursor()
+        row = db.fetchone_cached(DB_PATH, 'SELECT * FROM books WHERE id = ?', (book_id,))
+
+        return row
+    except Exception as e:
+        print(f"Error retrieving book: {e}")
+        return None
 
-        cursor.execute('SELECT * FROM books WHERE title LIKE ?', ('%' + title + '%',))
-        rows = cursor.fetchall()
+@metrics.timed
+def search_books(text, field=None, filters=None, limit=SEARCH_LIMIT):
+    # field - 'title', 'author', 'genre' или None для поиска по всем трём полям
+    try:
+        text = text.strip()
+        if not text:
+            return []
+
+        # Фильтры панели применяются и к результатам поиска
+        conditions, params = book_filter_conditions(filters)
+        where = ''.join(f' AND {condition}' for condition in conditions)
+
+        if len(text) < 3:
+            # Триграммному индексу нужно не меньше трёх символов
+            columns = [field] if field else ['title', 'author', 'genre']
+            condition = ' OR '.join(f'{column} LIKE ?' for column in columns)
+            rows = db.fetchall_cached(DB_PATH, f'SELECT * FROM books WHERE ({condition}){where} LIMIT ?',
+                                      ['%' + text + '%'] * len(columns) + params + [limit])
+        else:
+            phrase = '"' + text.replace('"', '""') + '"'
+            query = f'{field}: {phrase}' if field else phrase
+            # Совпадения в названии важнее, чем в авторе, а в авторе - чем в жанре
+            rows = db.fetchall_cached(DB_PATH, f'''
+                SELECT books.* FROM books_fts
+                JOIN books ON books.id = books_fts.rowid
+                WHERE books_fts MATCH ?{where}
+                ORDER BY bm25(books_fts, 3.0, 2.0, 1.0)
+                LIMIT ?
+            ''', (query, *params, limit))
 
-        conn.close()
         return rows
     except Exception as e:
+        # Поиск, прерванный окном ради более нового, передаётся QueryWorker: тот отбрасывает его молча
+        if db.is_interrupted(e):
+            raise
         print(f"Error searching books: {e}")
         return []
 
+@metrics.timed
+def export_books(path, filters=None, order_by='id', descending=False, text='', field=None,
+                 fmt=None, batch_size=exporter.EXPORT_BATCH_SIZE, progress=None):
+    # Потоковая выгрузка книг в том же виде, что и в таблице: с фильтрами, сортировкой
+    # или результатами поиска (без ограничения SEARCH_LIMIT); возвращает число строк
+    try:
+        conditions, params = book_filter_conditions(filters)
+        text = text.strip()
+        if text:
+            where = ''.join(f' AND {condition}' for condition in conditions)
+            if len(text) < 3:
+                columns = [field] if field else ['title', 'author', 'genre']
+                condition = ' OR '.join(f'{column} LIKE ?' for column in columns)
+                sql = f'SELECT * FROM books WHERE ({condition}){where}'
+                params = ['%' + text + '%'] * len(columns) + params
+            else:
+                phrase = '"' + text.replace('"', '""') + '"'
+                query = f'{field}: {phrase}' if field else phrase
+                sql = f'''
+                    SELECT books.* FROM books_fts
+                    JOIN books ON books.id = books_fts.rowid
+                    WHERE books_fts MATCH ?{where}
+                    ORDER BY bm25(books_fts, 3.0, 2.0, 1.0)
+                '''
+                params = [query, *params]
+        else:
+            column = SORT_COLUMNS[order_by]
+            direction = 'DESC' if descending else 'ASC'
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+            sql = f'''
+                SELECT books.* FROM books
+                {where}
+                ORDER BY {column} {direction}, books.id {direction}
+            '''
+
+        return exporter.export_rows(DB_PATH, sql, params, path, fmt, batch_size, progress)
+    except Exception as e:
+        print(f"Error exporting books: {e}")
+        return None
+
+@metrics.timed
 def delete_book(book_id):
+    # True, если книга была найдена и удалена
+    return bool(delete_books([book_id]))
+
+@metrics.timed
+def delete_books(book_ids):
+    # Удаляет выбранные книги одной транзакцией, передавая id пакетами; возвращает id удалённых
+    conn = db.get_connection(DB_PATH)
+    with conn:
+        return remove_books(conn.cursor(), book_ids)
+
+def count_books(filters):
     try:
-        conn = sqlite3.connect('bookstore.db')
-        cursor = conn.cursor()
+        conditions, params = book_filter_conditions(filters)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        row = db.fetchone_cached(DB_PATH, f'SELECT COUNT(*) FROM books {where}', params)
 
-        cursor.execute('DELETE FROM books WHERE id = ?', (book_id,))
+        return row[0]
+    except Exception as e:
+        print(f"Error counting books: {e}")
+        return None
 
-        conn.commit()
-        conn.close()
-        messagebox.showinfo("Успех", f"Книга с ID {book_id} успешно удалена!")
+def reclaim_space(pages=VACUUM_STEP_PAGES):
+    # Один шаг возврата свободного места файлу базы; возвращает число оставшихся свободных страниц
+    try:
+        return db.incremental_vacuum(DB_PATH, pages)
     except Exception as e:
-        print(f"Error deleting book: {e}")
-        messagebox.showerror("Ошибка", f"Ошибка при удалении книги: {e}")
+        print(f"Error reclaiming space: {e}")
+        return 0
+
+def update_stock(cursor, changes):
+    # Применяет изменения количества в открытой транзакции: changes - пары (id книги, изменение),
+    # отрицательное изменение - продажа. Возвращает изменённые строки книг
+    rows = []
+    for book_id, delta in changes:
+        cursor.execute('UPDATE books SET stock = stock + ? WHERE id = ? AND stock + ? >= 0',
+                       (delta, book_id, delta))
+        if cursor.rowcount == 0:
+            raise ValueError(f"Книга с ID {book_id} не найдена или на складе недостаточно экземпляров")
+        cursor.execute('SELECT * FROM books WHERE id = ?', (book_id,))
+        rows.append(cursor.fetchone())
+    return rows
+
+@metrics.timed
+def change_stock(changes):
+    # Атомарно применяет изменения количества: либо выполняются все изменения, либо ни одно
+    conn = db.get_connection(DB_PATH)
+    with conn:
+        return update_stock(conn.cursor(), changes)
 
 # Графический интерфейс
 class BookstoreApp:
@@ -103,22 +526,83 @@ class BookstoreApp:
         menubar.add_cascade(label="Файл", menu=file_menu)
         file_menu.add_command(label="Добавить книгу", command=self.open_add_book_window)
         file_menu.add_command(label="Удалить книгу", command=self.open_delete_book_window)
+        file_menu.add_command(label="Удалить выбранные", command=self.delete_selected_books)
+        file_menu.add_command(label="Удалить по фильтру", command=self.delete_filtered_books)
+        file_menu.add_separator()
+        file_menu.add_command(label="Продать книгу", command=lambda: self.open_stock_window("Продать книгу", self.sell_book))
+        file_menu.add_command(label="Пополнить склад", command=lambda: self.open_stock_window("Пополнить склад", self.restock_book))
+        file_menu.add_separator()
+        file_menu.add_command(label="Экспорт...", command=self.export_books)
         file_menu.add_separator()
         file_menu.add_command(label="Выход", command=root.quit)
 
+        view_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Вид", menu=view_menu)
+        view_menu.add_command(label="Все книги", command=lambda: self.show_stock(""))
+        view_menu.add_command(label="Только в наличии", command=lambda: self.show_stock("В наличии"))
+        view_menu.add_command(label="Заканчиваются", command=lambda: self.show_stock("Заканчиваются"))
+        view_menu.add_separator()
+        view_menu.add_command(label="Статистика кэша", command=self.show_cache_stats)
+        if metrics.ENABLED:
+            view_menu.add_command(label="Замеры производительности", command=lambda: MetricsWindow(root))
+
+        # Строка состояния: результаты записи показываются в ней, а не модальными окнами
+        self.status_bar = StatusBar(root)
+        # Добавление, удаление, продажа и пополнение идут через очередь с групповой фиксацией
+        self.writes = WriteQueue(DB_PATH, root)
+
         # Поисковая строка
         self.search_frame = ttk.Frame(root)
         self.search_frame.pack(fill=tk.X, padx=10, pady=5)
 
-        self.search_label = ttk.Label(self.search_frame, text="Поиск по названию:")
+        self.search_label = ttk.Label(self.search_frame, text="Поиск:")
         self.search_label.pack(side=tk.LEFT, padx=(0, 5))
 
-        self.search_entry = ttk.Entry(self.search_frame)
+        self.search_field_combo = ttk.Combobox(self.search_frame, values=list(SEARCH_FIELDS), state="readonly", width=12)
+        self.search_field_combo.current(0)
+        self.search_field_combo.pack(side=tk.LEFT, padx=(0, 5))
+        self.search_field_combo.bind("<<ComboboxSelected>>", lambda event: self.search_books())
+
+        # Запросы поиска выполняются в фоне, поиск запускается после паузы в наборе текста
+        self.worker = QueryWorker(root)
+        # Экспорт выполняется в своём потоке, чтобы поиск не ждал окончания выгрузки
+        self.export_worker = None
+        self.search_debouncer = Debouncer(root, SEARCH_DELAY, self.search_books)
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add('write', lambda *args: self.search_debouncer())
+
+        self.search_entry = ttk.Entry(self.search_frame, textvariable=self.search_var)
         self.search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.search_entry.bind("<Return>", lambda event: self.search_books())
 
         self.search_button = ttk.Button(self.search_frame, text="Поиск", command=self.search_books)
         self.search_button.pack(side=tk.LEFT, padx=(5, 0))
 
+        # Панель фильтров: условия передаются в запрос к базе, а не применяются к загруженным строкам
+        self.filters = {}
+        self.sort_column = 'id'
+        self.sort_descending = False
+
+        self.filter_frame = ttk.Frame(root)
+        self.filter_frame.pack(fill=tk.X, padx=10, pady=(0, 5))
+
+        ttk.Label(self.filter_frame, text="Цена от:").pack(side=tk.LEFT)
+        self.price_min_filter = ttk.Entry(self.filter_frame, width=10)
+        self.price_min_filter.pack(side=tk.LEFT, padx=(2, 4))
+
+        ttk.Label(self.filter_frame, text="до:").pack(side=tk.LEFT)
+        self.price_max_filter = ttk.Entry(self.filter_frame, width=10)
+        self.price_max_filter.pack(side=tk.LEFT, padx=(2, 8))
+
+        ttk.Label(self.filter_frame, text="Наличие:").pack(side=tk.LEFT)
+        self.stock_filter = ttk.Combobox(self.filter_frame, values=list(STOCK_FILTERS), state="readonly", width=14)
+        self.stock_filter.pack(side=tk.LEFT, padx=(2, 8))
+
+        self.apply_filter_button = ttk.Button(self.filter_frame, text="Применить", command=self.apply_filters)
+        self.apply_filter_button.pack(side=tk.LEFT)
+        self.reset_filter_button = ttk.Button(self.filter_frame, text="Сбросить", command=self.reset_filters)
+        self.reset_filter_button.pack(side=tk.LEFT, padx=(5, 0))
+
         # Таблица книг
         self.tree_frame = ttk.Frame(root)
         self.tree_frame.pack(fill=tk.BOTH, expand=True)
@@ -128,14 +612,19 @@ class BookstoreApp:
 
         self.tree = ttk.Treeview(self.tree_frame, columns=(
         "id", "title", "author", "genre", "price", "pub_date", "stock"),
-                                 show='headings', yscrollcommand=self.tree_scroll.set)
-        self.tree.heading("id", text="ID")
-        self.tree.heading("title", text="Название")
-        self.tree.heading("author", text="Автор")
-        self.tree.heading("genre", text="Жанр")
-        self.tree.heading("price", text="Цена")
-        self.tree.heading("pub_date", text="Дата публикации")
-        self.tree.heading("stock", text="В наличии")
+                                 show='headings')
+        self.headings = {
+            "id": "ID",
+            "title": "Название",
+            "author": "Автор",
+            "genre": "Жанр",
+            "price": "Цена",
+            "pub_date": "Дата публикации",
+            "stock": "На складе",
+        }
+        # Щелчок по заголовку сортирует таблицу в базе, повторный щелчок меняет направление
+        for column, text in self.headings.items():
+            self.tree.heading(column, text=text, command=lambda c=column: self.sort_by(c))
 
         self.tree.column("id", width=40)
         self.tree.column("title", width=150)
@@ -147,13 +636,46 @@ class BookstoreApp:
 
         self.tree.tag_configure('out_of_stock', background='#FFCCCC')  # Красный для отсутствующих в наличии
         self.tree.tag_configure('in_stock', background='#CCFFCC')  # Зеленый для в наличии
+        self.tree.tag_configure('low_stock', background='#FFFF99')  # Желтый для заканчивающихся
 
         self.tree.pack(fill=tk.BOTH, expand=True)
         self.tree_scroll.config(command=self.tree.yview)
 
         self.tree.bind("<Double-1>", self.open_book_detail_window)
-
+        self.tree.bind("<Delete>", lambda event: self.delete_selected_books())
+
+        # Точечные изменения строк (iid = id книги) и постраничная подгрузка при прокрутке
+        # Загруженные строки хранятся по id для окна деталей; жанры и авторы хранятся без повторов
+        self.rows = RowStore('BookRow', BOOK_FIELDS, BOOK_INTERNED)
+        self.delta = TreeDelta(self.tree, self.format_tree_row, self.rows)
+        self.pager = PagedTreeLoader(self.tree, self.tree_scroll, self.fetch_page, self.delta.upsert, PAGE_SIZE)
+
+        # Диалоги строятся при первом открытии и затем переиспользуются
+        self.add_book_dialog = ReusableDialog(root, "Добавить книгу", "400x400",
+                                              self.build_add_book_window, self.reset_add_book_window)
+        self.delete_book_dialog = ReusableDialog(root, "Удалить книгу", "300x150",
+                                                 self.build_delete_book_window, self.reset_delete_book_window)
+        self.stock_dialog = ReusableDialog(root, "Склад", "300x200", self.build_stock_window, self.reset_stock_window)
+        self.book_detail_dialog = ReusableDialog(root, "Детали книги", "400x400", self.build_book_detail_window)
+
+        # Возврат освободившегося после удаления места выполняется шагами между событиями интерфейса
+        self.reclaim_after_id = None
+
+        # Префиксные индексы авторов и жанров для подсказок (строятся при первом открытии диалога добавления)
+        self.value_indexes = {}
+
+        # База открывается и таблица заполняется только после первой отрисовки окна
+        self.root.after_idle(self.start)
+
+    def start(self):
+        self.root.wait_visibility()
+        self.root.update_idletasks()
+        metrics.startup_mark('first_paint')
+        create_db()
         self.view_books()
+        self.root.update_idletasks()
+        metrics.startup_mark('data_loaded')
+        metrics.startup_done(self.root)
 
     def center_window(self, width=1000, height=700):
         # Получаем размеры экрана
@@ -167,10 +689,15 @@ class BookstoreApp:
         # Устанавливаем размеры и позицию окна
         self.root.geometry(f'{width}x{height}+{x}+{y}')
 
+    @metrics.timed
     def open_add_book_window(self):
-        self.add_book_window = tk.Toplevel(self.root)
-        self.add_book_window.title("Добавить книгу")
-        self.add_book_window.geometry("400x400")
+        self.add_book_dialog.show()
+
+    def build_add_book_window(self, window):
+        # Календарь нужен только в этом окне, поэтому tkcalendar загружается при первом открытии
+        from tkcalendar import DateEntry
+
+        self.add_book_window = window
 
         self.title_label = ttk.Label(self.add_book_window, text="Название")
         self.title_label.pack(pady=5)
@@ -187,6 +714,14 @@ class BookstoreApp:
         self.genre_entry = ttk.Entry(self.add_book_window)
         self.genre_entry.pack(pady=5)
 
+        # Подсказки уже встречавшихся авторов и жанров, чтобы не множились разные написания.
+        # Индексы строятся в фоне при первом открытии окна
+        self.autocompletes = [Autocomplete(self.author_entry, lambda text: self.suggest_value('author', text)),
+                              Autocomplete(self.genre_entry, lambda text: self.suggest_value('genre', text))]
+        for field in SUGGEST_FIELDS:
+            self.worker.submit(f'{field}-index', lambda field=field: PrefixIndex(book_value_counts(field)),
+                               callback=lambda index, field=field: self.set_value_index(field, index))
+
         self.price_label = ttk.Label(self.add_book_window, text="Цена")
         self.price_label.pack(pady=5)
         self.price_entry = ttk.Entry(self.add_book_window)
@@ -197,32 +732,75 @@ class BookstoreApp:
         self.pub_date_entry = DateEntry(self.add_book_window, date_pattern='y-mm-dd')
         self.pub_date_entry.pack(pady=5)
 
-        self.stock_label = ttk.Label(self.add_book_window, text="В наличии")
+        self.stock_label = ttk.Label(self.add_book_window, text="Количество на складе")
         self.stock_label.pack(pady=5)
-        self.stock_combo = ttk.Combobox(self.add_book_window, values=["Да", "Нет"])
-        self.stock_combo.pack(pady=5)
+        self.stock_spinbox = ttk.Spinbox(self.add_book_window, from_=0, to=1000000)
+        self.stock_spinbox.set(0)
+        self.stock_spinbox.pack(pady=5)
 
         self.submit_button = ttk.Button(self.add_book_window, text="Добавить книгу", command=self.submit_book)
         self.submit_button.pack(pady=10)
 
+    def reset_add_book_window(self):
+        for entry in (self.title_entry, self.author_entry, self.genre_entry, self.price_entry):
+            entry.delete(0, tk.END)
+        self.pub_date_entry.set_date(datetime.date.today())
+        self.stock_spinbox.set(0)
+        for autocomplete in self.autocompletes:
+            autocomplete.hide()
+        self.title_entry.focus_set()
+
+    def set_value_index(self, field, index):
+        if index is not None:
+            self.value_indexes[field] = index
+
+    def suggest_value(self, field, text):
+        index = self.value_indexes.get(field)
+        return index.suggest(text) if index is not None else []
+
+    @metrics.timed
     def submit_book(self):
         title = self.title_entry.get()
         author = self.author_entry.get()
         genre = self.genre_entry.get()
         price = self.price_entry.get()
         pub_date = self.pub_date_entry.get()
-        stock = self.stock_combo.get()
+        stock = self.stock_spinbox.get()
         if title and author and genre and price and pub_date and stock:
-            add_book(title, author, genre, float(price), pub_date, stock)
-            self.add_book_window.destroy()
-            self.view_books()
+            try:
+                values = validate_book({'title': title, 'author': author, 'genre': genre,
+                                        'price': price, 'pub_date': pub_date, 'stock': stock})
+            except ValueError as e:
+                messagebox.showerror("Ошибка", f"Некорректные данные: {e}")
+                return
+            self.add_book_dialog.hide()
+            self.writes.submit(insert_book, (values,), self.book_saved)
         else:
             messagebox.showerror("Ошибка", "Все поля обязательны для заполнения!")
 
+    def book_saved(self, future):
+        # Вызывается после фиксации пакета очереди записи
+        error = future.exception()
+        if error is not None:
+            self.status_bar.show(f"Ошибка при добавлении книги: {error}", error=True)
+            return
+        book = future.result()
+        self.status_bar.show(f"Книга #{book[0]} добавлена")
+        for field, value in zip(BOOK_FIELDS, book):
+            if field in self.value_indexes:
+                self.value_indexes[field].add(value)
+        # Новая книга с наибольшим id появится сама, когда до неё дойдёт постраничная подгрузка;
+        # при фильтрах или другой сортировке её место в таблице определяет только запрос к базе
+        if self.pager.exhausted and not self.filters and self.sort_column == 'id' \
+                and not self.sort_descending and not self.search_entry.get().strip():
+            self.delta.apply(upserts=[book])
+
+    @metrics.timed
     def open_delete_book_window(self):
-        self.delete_book_window = tk.Toplevel(self.root)
-        self.delete_book_window.title("Удалить книгу")
-        self.delete_book_window.geometry("300x150")
+        self.delete_book_dialog.show()
+
+    def build_delete_book_window(self, window):
+        self.delete_book_window = window
 
         self.delete_label = ttk.Label(self.delete_book_window, text="ID книги для удаления")
         self.delete_label.pack(pady=5)
@@ -232,90 +810,275 @@ class BookstoreApp:
         self.delete_button = ttk.Button(self.delete_book_window, text="Удалить книгу", command=self.delete_book)
         self.delete_button.pack(pady=10)
 
+    def reset_delete_book_window(self):
+        self.delete_entry.delete(0, tk.END)
+        self.delete_entry.focus_set()
+
+    @metrics.timed
     def delete_book(self):
-        book_id = self.delete_entry.get()
-        if book_id:
-            delete_book(book_id)
-            self.delete_book_window.destroy()
-            self.view_books()
+        book_id = self.delete_entry.get().strip()
+        if book_id.isdigit():
+            self.writes.submit(remove_books, ([int(book_id)],), self.books_removed)
+            self.delete_book_dialog.hide()
         else:
             messagebox.showerror("Ошибка", "ID книги обязательно для заполнения!")
 
+    @metrics.timed
+    def delete_selected_books(self):
+        book_ids = [int(iid) for iid in self.tree.selection()]
+        if not book_ids:
+            messagebox.showerror("Ошибка", "Выберите книги в таблице!")
+            return
+        if not messagebox.askyesno("Удаление", f"Удалить выбранные книги ({len(book_ids)})?"):
+            return
+        self.writes.submit(remove_books, (book_ids,), self.books_removed)
+
+    def books_removed(self, future):
+        # Вызывается после фиксации пакета очереди записи
+        error = future.exception()
+        if error is not None:
+            self.status_bar.show(f"Ошибка при удалении книг: {error}", error=True)
+            return
+        deleted = future.result()
+        if not deleted:
+            self.status_bar.show("Книги для удаления не найдены", error=True)
+            return
+        if len(deleted) == 1:
+            self.status_bar.show(f"Книга #{deleted[0]} удалена")
+        else:
+            self.status_bar.show(f"Удалено книг: {len(deleted)}")
+        self.delta.apply(deletes=deleted)
+        self.schedule_reclaim()
+
+    @metrics.timed
+    def delete_filtered_books(self):
+        # Удаляются все книги, подходящие под фильтры панели (а не только загруженные в таблицу)
+        if not self.filters:
+            messagebox.showerror("Ошибка", "Задайте и примените фильтр по цене или наличию!")
+            return
+        count = count_books(self.filters)
+        if not count:
+            messagebox.showinfo("Удаление", "Нет книг, подходящих под фильтр")
+            return
+        if not messagebox.askyesno("Удаление", f"Удалить все книги, подходящие под фильтр ({count})?"):
+            return
+        self.writes.submit(remove_books_by_filter, (self.filters,), self.books_removed)
+
+    def schedule_reclaim(self):
+        if self.reclaim_after_id is None:
+            self.reclaim_after_id = self.root.after(VACUUM_STEP_DELAY, self.reclaim_step)
+
+    def reclaim_step(self):
+        self.reclaim_after_id = None
+        if reclaim_space() > 0:
+            self.schedule_reclaim()
+
+    @metrics.timed
+    def open_stock_window(self, title, action):
+        # Одно окно на продажу и пополнение: меняются только заголовок и действие кнопки
+        self.stock_dialog.show()
+        self.stock_window.title(title)
+        self.stock_button.config(text=title, command=action)
+
+    def build_stock_window(self, window):
+        self.stock_window = window
+
+        ttk.Label(self.stock_window, text="ID книги").pack(pady=5)
+        self.stock_id_entry = ttk.Entry(self.stock_window)
+        self.stock_id_entry.pack(pady=5)
+
+        ttk.Label(self.stock_window, text="Количество").pack(pady=5)
+        self.stock_quantity_spinbox = ttk.Spinbox(self.stock_window, from_=1, to=1000000)
+        self.stock_quantity_spinbox.set(1)
+        self.stock_quantity_spinbox.pack(pady=5)
+
+        self.stock_button = ttk.Button(self.stock_window)
+        self.stock_button.pack(pady=10)
+
+    def reset_stock_window(self):
+        self.stock_id_entry.delete(0, tk.END)
+        self.stock_quantity_spinbox.set(1)
+        self.stock_id_entry.focus_set()
+
+    def read_stock_window(self):
+        book_id = self.stock_id_entry.get().strip()
+        quantity = self.stock_quantity_spinbox.get().strip()
+        if book_id.isdigit() and quantity.isdigit() and int(quantity) > 0:
+            return int(book_id), int(quantity)
+        messagebox.showerror("Ошибка", "ID книги и количество должны быть положительными числами!")
+        return None
+
+    @metrics.timed
+    def sell_book(self):
+        values = self.read_stock_window()
+        if values:
+            book_id, quantity = values
+            self.writes.submit(update_stock, ([(book_id, -quantity)],), self.stock_changed)
+            self.stock_dialog.hide()
+
+    @metrics.timed
+    def restock_book(self):
+        values = self.read_stock_window()
+        if values:
+            self.writes.submit(update_stock, ([values],), self.stock_changed)
+            self.stock_dialog.hide()
+
+    def stock_changed(self, future):
+        # Вызывается после фиксации пакета очереди записи
+        error = future.exception()
+        if error is not None:
+            self.status_bar.show(f"Ошибка при изменении склада: {error}", error=True)
+            return
+        books = future.result()
+        self.status_bar.show(f"Склад обновлён: книга #{books[0][0]}, в наличии {books[0][6]} экз.")
+        self.delta.apply(upserts=self.loaded_rows(books))
+
+    @metrics.timed
     def open_book_detail_window(self, event):
         selected_item = self.tree.selection()
         if selected_item:
-            item = self.tree.item(selected_item)
-            book_id = item['values'][0]
-
-            book = self.get_book_by_id(book_id)
+            # Строка берётся из уже загруженных, к базе обращаемся, только если её там нет
+            book_id = int(selected_item[0])
+            book = self.rows.get(book_id) or self.get_book_by_id(book_id)
             if book:
-                self.detail_window = tk.Toplevel(self.root)
-                self.detail_window.title("Детали книги")
-                self.detail_window.geometry("400x400")
-
-                detail_frame = ttk.Frame(self.detail_window, padding="10")
-                detail_frame.pack(fill=tk.BOTH, expand=True)
-
-                ttk.Label(detail_frame, text="ID:", font=("Arial", 12, "bold")).grid(row=0, column=0, sticky="w", pady=2)
-                ttk.Label(detail_frame, text=book[0], font=("Arial", 12)).grid(row=0, column=1, sticky="w", pady=2)
-
-                ttk.Label(detail_frame, text="Название:", font=("Arial", 12, "bold")).grid(row=1, column=0, sticky="w", pady=2)
-                ttk.Label(detail_frame, text=book[1], font=("Arial", 12)).grid(row=1, column=1, sticky="w", pady=2)
-
-                ttk.Label(detail_frame, text="Автор:", font=("Arial", 12, "bold")).grid(row=2, column=0, sticky="w", pady=2)
-                ttk.Label(detail_frame, text=book[2], font=("Arial", 12)).grid(row=2, column=1, sticky="w", pady=2)
-
-                ttk.Label(detail_frame, text="Жанр:", font=("Arial", 12, "bold")).grid(row=3, column=0, sticky="w", pady=2)
-                ttk.Label(detail_frame, text=book[3], font=("Arial", 12)).grid(row=3, column=1, sticky="w", pady=2)
-
-                ttk.Label(detail_frame, text="Цена:", font=("Arial", 12, "bold")).grid(row=4, column=0, sticky="w", pady=2)
-                ttk.Label(detail_frame, text=book[4], font=("Arial", 12)).grid(row=4, column=1, sticky="w", pady=2)
-
-                ttk.Label(detail_frame, text="Дата публикации:", font=("Arial", 12, "bold")).grid(row=5, column=0, sticky="w", pady=2)
-                ttk.Label(detail_frame, text=book[5], font=("Arial", 12)).grid(row=5, column=1, sticky="w", pady=2)
+                self.book_detail_dialog.show()
+                for label, value in zip(self.detail_values, book):
+                    label.config(text=value)
+
+    def build_book_detail_window(self, window):
+        self.detail_window = window
+
+        detail_frame = ttk.Frame(self.detail_window, padding="10")
+        detail_frame.pack(fill=tk.BOTH, expand=True)
+
+        # Подписи полей создаются один раз, при открытии меняются только значения
+        fields = ("ID:", "Название:", "Автор:", "Жанр:", "Цена:", "Дата публикации:", "На складе:")
+        self.detail_values = []
+        for row, text in enumerate(fields):
+            ttk.Label(detail_frame, text=text, font=("Arial", 12, "bold")).grid(row=row, column=0, sticky="w", pady=2)
+            value = ttk.Label(detail_frame, font=("Arial", 12))
+            value.grid(row=row, column=1, sticky="w", pady=2)
+            self.detail_values.append(value)
+
+    def export_books(self):
+        path = filedialog.asksaveasfilename(parent=self.root, defaultextension=".csv", initialfile="books.csv",
+                                            filetypes=[("CSV", "*.csv"), ("CSV, gzip", "*.csv.gz"),
+                                                       ("JSONL", "*.jsonl"), ("JSONL, gzip", "*.jsonl.gz")])
+        if not path:
+            return
+        if self.export_worker is None:
+            self.export_worker = QueryWorker(self.root)
+        # Выгружается то, что показано в таблице: фильтры, сортировка или результаты поиска
+        field = SEARCH_FIELDS[self.search_field_combo.get()]
+        # Ключ - файл выгрузки: экспорт в другой файл не отменяет идущий, повторный в тот же файл заменяет его
+        self.export_worker.submit(('export', path), export_books,
+                                  (path, self.filters, self.sort_column, self.sort_descending,
+                                   self.search_entry.get(), field),
+                                  lambda count: self.export_done(path, count))
+
+    def export_done(self, path, count):
+        if count is None:
+            messagebox.showerror("Ошибка", "Ошибка при экспорте книг!")
+        else:
+            messagebox.showinfo("Успех", f"Выгружено книг: {count} в {path}")
 
-                ttk.Label(detail_frame, text="В наличии:", font=("Arial", 12, "bold")).grid(row=6, column=0, sticky="w", pady=2)
-                ttk.Label(detail_frame, text=book[6], font=("Arial", 12)).grid(row=6, column=1, sticky="w", pady=2)
+    def show_cache_stats(self):
+        stats = db.cache_stats(DB_PATH)
+        messagebox.showinfo("Статистика кэша",
+                            f"Попаданий: {stats['hits']}\n"
+                            f"Промахов: {stats['misses']}\n"
+                            f"Доля попаданий: {stats['hit_rate']:.0%}\n"
+                            f"Запросов в кэше: {stats['size']}\n"
+                            f"Сбросов: {stats['invalidations']}")
 
     def get_book_by_id(self, book_id):
-        try:
-            conn = sqlite3.connect('bookstore.db')
-            cursor = conn.cursor()
-
-            cursor.execute('SELECT * FROM books WHERE id = ?', (book_id,))
-            row = cursor.fetchone()
-
-            conn.close()
-            return row
-        except Exception as e:
-            print(f"Error retrieving book: {e}")
-            return None
+        return get_book_by_id(book_id)
 
     def search_books(self):
-        title = self.search_entry.get()
-        filtered_books = search_books(title)
-        self.update_tree(filtered_books)
+        self.search_debouncer.cancel()
+        text = self.search_entry.get()
+        if not text.strip():
+            self.view_books()
+            return
+        field = SEARCH_FIELDS[self.search_field_combo.get()]
+        # Результат устаревшего поиска отбрасывается, если пользователь продолжил ввод
+        self.worker.submit('search', search_books, (text, field, self.filters), self.update_tree)
 
+    @metrics.timed
     def view_books(self):
-        all_books = view_books()
-        self.update_tree(all_books)
+        self.worker.cancel('search')
+        self.delta.clear()
+        self.pager.reset()
+
+    def fetch_page(self, last_row, limit):
+        return query_books(self.filters, self.sort_column, self.sort_descending, last_row, limit)
 
+    def loaded_rows(self, books):
+        # Обновляются только строки, уже загруженные в таблицу; остальные подгрузятся из базы
+        return [book for book in books if book[0] in self.rows]
+
+    def sort_by(self, column):
+        if self.sort_column == column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column = column
+            self.sort_descending = False
+        for name, text in self.headings.items():
+            if name == column:
+                text += " ▼" if self.sort_descending else " ▲"
+            self.tree.heading(name, text=text)
+        # Результаты поиска упорядочены по релевантности, сортировка применяется к списку книг
+        self.search_var.set("")
+        self.search_books()
+
+    def show_stock(self, label):
+        self.stock_filter.set(label)
+        self.apply_filters()
+
+    def apply_filters(self):
+        filters = {'stock': STOCK_FILTERS[self.stock_filter.get()]}
+        for key, entry in (('price_min', self.price_min_filter), ('price_max', self.price_max_filter)):
+            value = entry.get().strip()
+            if value:
+                try:
+                    filters[key] = float(value)
+                except ValueError:
+                    messagebox.showerror("Ошибка", "Цена должна быть числом!")
+                    return
+        self.filters = {key: value for key, value in filters.items() if value is not None}
+        self.search_books()
+
+    def reset_filters(self):
+        self.price_min_filter.delete(0, tk.END)
+        self.price_max_filter.delete(0, tk.END)
+        self.stock_filter.set("")
+        self.filters = {}
+        self.search_books()
+
+    @metrics.timed
     def update_tree(self, books):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.pager.stop()
+        self.delta.clear()
 
         for book in books:
-            tags = ()
-            if book[6] == "Нет":
-                tags += ('out_of_stock',)
-            else:
-                tags += ('in_stock',)
+            self.delta.upsert(book)
+
+    def format_tree_row(self, book):
+        tags = ()
+        if book[6] <= 0:
+            tags += ('out_of_stock',)
+        elif book[6] <= LOW_STOCK:
+            tags += ('low_stock',)
+        else:
+            tags += ('in_stock',)
 
-            self.tree.insert('', tk.END, values=(book[0], book[1], book[2], book[3], book[4], book[5], book[6]), tags=tags)
+        return (book[0], book[1], book[2], book[3], book[4], book[5], book[6]), tags
 
 
 if __name__ == "__main__":
-    create_db()
     root = tk.Tk()
     app = BookstoreApp(root)
+    metrics.startup_mark('window_built')
     root.mainloop()
+    # Поставленные в очередь записи фиксируются до выхода из процесса
+    app.writes.flush()
@@ -0,0 +1,638 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import db
+from prefixindex import PrefixIndex
+from rowstore import RowStore
+from sampledata import FIRST_NAMES, LAST_NAMES, fill_database, generate_books, generate_requests
+from worker import WriteQueue
+
+
+# Бенчмарки слоя работы с базой данных.
+# Запуск: python bench.py connection --rows 10000 --calls 2000
+#         python bench.py filters --rows 100000
+#         python bench.py suite --rows 10000 100000 1000000 --json results.json
+#         python bench.py compare old.json new.json
+#         python bench.py startup --runs 5 --json startup.json
+#         python bench.py rowstore --rows 100000
+#         python bench.py generate requests --rows 100000 --db requests.db
+
+REQUESTS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS requests (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        subject TEXT NOT NULL,
+        priority TEXT NOT NULL,
+        request_type TEXT NOT NULL,
+        description TEXT NOT NULL,
+        due_date TEXT NOT NULL,
+        responsible TEXT NOT NULL,
+        status TEXT NOT NULL
+    )
+'''
+
+INSERT_SQL = '''
+    INSERT INTO requests (subject, priority, request_type, description, due_date, responsible, status)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def sample_request(i):
+    return (f"Заявка {i}", ("Низкий", "Средний", "Высокий")[i % 3], ("Инцидент", "Обслуживание")[i % 2],
+            f"Описание заявки {i}", f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}", f"Сотрудник {i % 50}",
+            ("Открыта", "Закрыта")[i % 2])
+
+
+def fill_requests(path, rows):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(REQUESTS_SCHEMA)
+        conn.executemany(INSERT_SQL, (sample_request(i) for i in range(rows)))
+    conn.close()
+
+
+def measure(fn, calls):
+    timings = []
+    for i in range(calls):
+        start = time.perf_counter()
+        fn(i)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        'mean_us': statistics.fmean(timings) * 1e6,
+        'p50_us': timings[len(timings) // 2] * 1e6,
+        'p95_us': timings[int(len(timings) * 0.95)] * 1e6,
+    }
+
+
+def bench_connection(args):
+    # Сравнение соединения на каждый вызов (старое поведение) с общим соединением из db.py
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    path = os.path.join(workdir, 'requests.db')
+    fill_requests(path, args.rows)
+
+    def per_call(sql, params, write=False):
+        conn = sqlite3.connect(path)
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        if write:
+            conn.commit()
+        conn.close()
+        return rows
+
+    def shared(sql, params, write=False):
+        conn = db.get_connection(path)
+        if write:
+            with conn:
+                return conn.execute(sql, params).fetchall()
+        return conn.execute(sql, params).fetchall()
+
+    operations = {
+        'get_by_id': lambda run, i: run('SELECT * FROM requests WHERE id = ?', (i % args.rows + 1,)),
+        'search': lambda run, i: run('SELECT * FROM requests WHERE subject LIKE ?', (f'%{i % args.rows}%',)),
+        'insert': lambda run, i: run(INSERT_SQL, sample_request(i), write=True),
+    }
+
+    results = {}
+    for name, operation in operations.items():
+        old = measure(lambda i: operation(per_call, i), args.calls)
+        new = measure(lambda i: operation(shared, i), args.calls)
+        results[name] = {'before': old, 'after': new, 'speedup': old['mean_us'] / new['mean_us']}
+
+    db.close_all()
+    return results
+
+
+# Фильтры по полям, которые в схеме версии 2 хранятся кодами и имеют индексы:
+# (запрос к исходной схеме, запрос к схеме версии 2, параметры)
+FILTER_QUERIES = {
+    'status_count': ("SELECT COUNT(*) FROM requests WHERE status = ?",
+                     "SELECT COUNT(*) FROM requests WHERE status = (SELECT code FROM statuses WHERE label = ?)",
+                     ("Закрыта",)),
+    'priority_page': ("SELECT * FROM requests WHERE priority = ? LIMIT 100",
+                      "SELECT * FROM requests_view WHERE priority = ? LIMIT 100",
+                      ("Высокий",)),
+    'priority_due_page': ("SELECT * FROM requests WHERE priority = ? ORDER BY due_date, id LIMIT 100",
+                          "SELECT * FROM requests_view WHERE priority = ? ORDER BY due_date, id LIMIT 100",
+                          ("Высокий",)),
+    'due_date_range': ("SELECT * FROM requests WHERE due_date BETWEEN ? AND ?",
+                       "SELECT * FROM requests_view WHERE due_date BETWEEN ? AND ?",
+                       ("2024-03-01", "2024-03-02")),
+    'responsible': ("SELECT * FROM requests WHERE responsible = ?",
+                    "SELECT * FROM requests_view WHERE responsible = ?",
+                    ("Сотрудник 7",)),
+    'open_overdue': ("SELECT * FROM requests WHERE status = ? AND due_date < ? ORDER BY due_date LIMIT 100",
+                     "SELECT * FROM requests_view WHERE status = ? AND due_date < ? ORDER BY due_date LIMIT 100",
+                     ("Открыта", "2024-02-01")),
+}
+
+
+def table_size(path):
+    conn = sqlite3.connect(path)
+    size = conn.execute("SELECT SUM(pgsize) FROM dbstat WHERE name IN ('requests', 'requests_v2')").fetchone()[0]
+    conn.close()
+    return size
+
+
+def bench_filters(args):
+    # Фильтры по исходной схеме с текстовыми полями против схемы версии 2 после миграции
+    import requests as app
+
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    path = os.path.join(workdir, 'requests.db')
+    fill_requests(path, args.rows)
+    size_before = table_size(path)
+
+    def run_all(version):
+        conn = db.connect(path)
+        timings = {}
+        for name, queries in FILTER_QUERIES.items():
+            sql, params = queries[version], queries[2]
+            timings[name] = measure(lambda i: conn.execute(sql, params).fetchall(), args.calls)
+        conn.close()
+        return timings
+
+    before = run_all(0)
+    app.DB_PATH = path
+    app.create_db()
+    db.close_all()
+    after = run_all(1)
+
+    results = {name: {'before': before[name], 'after': after[name],
+                      'speedup': before[name]['mean_us'] / after[name]['mean_us']}
+               for name in FILTER_QUERIES}
+    print(f"Размер таблицы requests: {size_before} -> {table_size(path)} байт")
+    return results
+
+
+def generate_command(args):
+    path = args.db or ('requests.db' if args.table == 'requests' else 'bookstore.db')
+    elapsed = fill_database(args.table, path, args.rows, seed=args.seed)
+    print(f"{path}: добавлено {args.rows} строк за {elapsed:.1f} с ({args.rows / elapsed:.0f} строк/с)")
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+# Операции набора: имя -> (функция(app, i, ids, words), доля от --calls)
+SUITE_OPERATIONS = {
+    'requests': {
+        'view_all': (lambda app, i, ids, words: app.view_requests(), 0.1),
+        'first_page': (lambda app, i, ids, words: app.query_requests(), 1),
+        'filtered_page': (lambda app, i, ids, words: app.query_requests(
+            {'status': "Открыта", 'priority': "Высокий"}, 'due_date'), 1),
+        'search': (lambda app, i, ids, words: app.search_requests(words[i % len(words)]), 1),
+        'get_by_id': (lambda app, i, ids, words: app.get_request_by_id(ids[i % len(ids)]), 10),
+        'delete': (lambda app, i, ids, words: app.delete_request(ids[-1 - i % len(ids)]), 1),
+    },
+    'books': {
+        'view_all': (lambda app, i, ids, words: app.view_books(), 0.1),
+        'first_page': (lambda app, i, ids, words: app.query_books(), 1),
+        'filtered_page': (lambda app, i, ids, words: app.query_books({'stock': 'in'}, 'price'), 1),
+        'search': (lambda app, i, ids, words: app.search_books(words[i % len(words)]), 1),
+        'get_by_id': (lambda app, i, ids, words: app.get_book_by_id(ids[i % len(ids)]), 10),
+        'delete': (lambda app, i, ids, words: app.delete_book(ids[-1 - i % len(ids)]), 1),
+    },
+}
+
+SEARCH_WORDS = {
+    'requests': ["принтер", "сервер не", "ошибка", "доступ", "перенос данных", "бухгалтерия"],
+    'books': ["Тихий", "маяк", "Северный берег", "Иванов", "Фантастика", "Книга 7"],
+}
+
+
+def bench_tree(table, app, rows, tree_rows):
+    # Заполнение Treeview строками приложения в скрытом окне Tk
+    import tkinter as tk
+    from tkinter import ttk
+    from widgets import TreeDelta
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        return {'tree': {'skipped': f"нет дисплея: {e}"}}
+    root.withdraw()
+    # format_tree_row не обращается к состоянию окна приложения
+    app_class = app.RequestApp if table == 'requests' else app.BookstoreApp
+    tree = ttk.Treeview(root, columns=[f'c{i}' for i in range(7)], show='headings')
+    delta = TreeDelta(tree, lambda row: app_class.format_tree_row(None, row))
+
+    results = {}
+    for name, count in (('tree_page', app.PAGE_SIZE), ('tree_full', tree_rows)):
+        batch = rows[:count]
+        seconds = timed(lambda: [delta.upsert(row) for row in batch])
+        results[name] = {'rows': len(batch), 'seconds': seconds,
+                         'rows_per_s': len(batch) / seconds if seconds else 0.0}
+        tree.delete(*tree.get_children())
+    root.destroy()
+    return results
+
+
+def bench_suite_table(table, rows, args):
+    app = db.load_app(table)
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    path = os.path.join(workdir, 'requests.db' if table == 'requests' else 'bookstore.db')
+    app.DB_PATH = path
+    results = {}
+
+    results['create_db'] = {'seconds': timed(app.create_db)}
+    seconds = fill_database(table, path, rows, args.batch_size)
+    results['bulk_insert'] = {'rows': rows, 'seconds': seconds, 'rows_per_s': rows / seconds}
+
+    conn = db.get_connection(path)
+    results['db_size_bytes'] = conn.execute('PRAGMA page_count').fetchone()[0] * \
+        conn.execute('PRAGMA page_size').fetchone()[0]
+    table_name = 'requests' if table == 'requests' else 'books'
+    ids = [row[0] for row in conn.execute(f'SELECT id FROM {table_name} ORDER BY random() LIMIT ?',
+                                          (args.calls * 10,))]
+    words = SEARCH_WORDS[table]
+
+    for name, (operation, share) in SUITE_OPERATIONS[table].items():
+        calls = max(1, int(args.calls * share))
+        # Кэш результатов сбрасывается перед каждым вызовом: измеряется работа базы, а не кэша
+        results[name] = measure(lambda i: (db.invalidate(path), operation(app, i, ids, words)), calls)
+        results[name]['calls'] = calls
+
+    query = app.query_requests if table == 'requests' else app.query_books
+    results.update(bench_tree(table, app, query(limit=args.tree_rows), args.tree_rows))
+
+    db.close_all()
+    if not args.keep:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        os.rmdir(workdir)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def bench_suite(args):
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+        },
+        'results': {},
+    }
+    for table in args.tables:
+        report['results'][table] = {}
+        for rows in args.rows:
+            print(f"{table}: {rows} строк...", file=sys.stderr)
+            result = bench_suite_table(table, rows, args)
+            report['results'][table][str(rows)] = result
+            print_suite_results(table, rows, result)
+    return report
+
+
+def print_suite_results(table, rows, result):
+    print(f"== {table}, {rows} строк")
+    for name, value in result.items():
+        if not isinstance(value, dict):
+            print(f"  {name:16} {value}")
+        elif 'mean_us' in value:
+            print(f"  {name:16} {value['mean_us']:12.1f} мкс (p50 {value['p50_us']:.1f}, p95 {value['p95_us']:.1f})")
+        elif 'seconds' in value:
+            rate = f", {value['rows_per_s']:.0f} строк/с" if 'rows_per_s' in value else ''
+            print(f"  {name:16} {value['seconds']:12.3f} с{rate}")
+        else:
+            print(f"  {name:16} {value.get('skipped', value)}")
+
+
+def compare_command(args):
+    # Сравнение двух отчётов suite: рост времени больше порога считается регрессией
+    with open(args.old, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(args.new, encoding='utf-8') as f:
+        new = json.load(f)
+    regressions = 0
+    for table, sizes in new['results'].items():
+        for rows, result in sizes.items():
+            for name, value in result.items():
+                before = old['results'].get(table, {}).get(rows, {}).get(name)
+                if not isinstance(value, dict) or not isinstance(before, dict):
+                    continue
+                key = 'mean_us' if 'mean_us' in value else 'seconds'
+                if key not in value or not before.get(key):
+                    continue
+                ratio = value[key] / before[key]
+                mark = ''
+                if ratio > args.threshold:
+                    mark = '  РЕГРЕССИЯ'
+                    regressions += 1
+                digits = 3 if key == 'seconds' else 1
+                print(f"{table:8} {rows:>8} {name:16} {before[key]:12.{digits}f} -> {value[key]:12.{digits}f}  "
+                      f"x{ratio:.2f}{mark}")
+    print(f"Регрессий: {regressions} (порог x{args.threshold})")
+    return 1 if regressions else 0
+
+
+APP_SCRIPTS = {'requests': 'requests.py', 'books': 'G.py'}
+
+
+def run_startup(table, workdir, timeout):
+    # Один запуск приложения: общее время до выхода и отметки этапов из APP_STARTUP_REPORT
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), APP_SCRIPTS[table])
+    report_path = os.path.join(workdir, 'startup.json')
+    if os.path.exists(report_path):
+        os.remove(report_path)
+    env = dict(os.environ, APP_STARTUP_REPORT=report_path)
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, script], cwd=workdir, env=env, capture_output=True,
+                             text=True, timeout=timeout)
+    total = time.perf_counter() - start
+    if process.returncode != 0 or not os.path.exists(report_path):
+        lines = process.stderr.strip().splitlines()
+        return {'skipped': lines[-1] if lines else f"код завершения {process.returncode}"}
+    with open(report_path, encoding='utf-8') as f:
+        phases = json.load(f)
+    phases['process_total'] = total
+    return phases
+
+
+def bench_startup(args):
+    # Время холодного запуска: импорт модуля без окна и полный запуск до первой страницы данных
+    repo = os.path.dirname(os.path.abspath(__file__))
+    report = {'meta': {'commit': git_commit(), 'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version},
+              'results': {}}
+    for table in args.tables:
+        module = os.path.splitext(APP_SCRIPTS[table])[0]
+        imports = [timed(lambda: subprocess.run([sys.executable, '-c', f'import {module}'], cwd=repo, check=True))
+                   for _ in range(args.runs)]
+        # Формат совпадает с отчётом suite, поэтому отчёты сравниваются командой compare
+        result = {'import': {'seconds': statistics.median(imports)}}
+
+        workdir = tempfile.mkdtemp(prefix='bench_')
+        fill_database(table, os.path.join(workdir, 'requests.db' if table == 'requests' else 'bookstore.db'),
+                      args.rows)
+        db.close_all()
+        runs = [run_startup(table, workdir, args.timeout) for _ in range(args.runs)]
+        skipped = [run for run in runs if 'skipped' in run]
+        if skipped:
+            result['startup'] = skipped[0]
+        else:
+            for phase in runs[0]:
+                result[phase] = {'seconds': statistics.median(run[phase] for run in runs)}
+        report['results'][table] = {str(args.rows): result}
+        print_suite_results(table, args.rows, result)
+    return report
+
+
+def bench_rowstore(args):
+    # Память на загруженные в таблицу строки: кортежи из запроса против RowStore.
+    # Строки читаются из базы, чтобы значения были отдельными объектами str, как в приложении
+    report = {}
+    for table in args.tables:
+        app = db.load_app(table)
+        generate = generate_requests if table == 'requests' else generate_books
+        if table == 'requests':
+            fields, interned = app.REQUEST_FIELDS, app.REQUEST_INTERNED
+        else:
+            fields, interned = app.BOOK_FIELDS, app.BOOK_INTERNED
+        conn = sqlite3.connect(':memory:')
+        conn.execute(f"CREATE TABLE rows (id INTEGER PRIMARY KEY, {', '.join(fields[1:])})")
+        conn.executemany(f"INSERT INTO rows ({', '.join(fields[1:])}) VALUES ({', '.join('?' * (len(fields) - 1))})",
+                         generate(args.rows, args.seed))
+
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        rows = conn.execute('SELECT * FROM rows').fetchall()
+        tuples = tracemalloc.get_traced_memory()[0] - start
+        del rows
+
+        start = tracemalloc.get_traced_memory()[0]
+        store = RowStore('Row', fields, interned)
+        for row in conn.execute('SELECT * FROM rows'):
+            store.put(row)
+        stored = tracemalloc.get_traced_memory()[0] - start
+        tracemalloc.stop()
+        conn.close()
+
+        scale = 100000 / args.rows / 2 ** 20
+        report[table] = {'rows': args.rows, 'tuples_mb_per_100k': tuples * scale,
+                         'store_mb_per_100k': stored * scale, 'saving': 1 - stored / tuples}
+        print(f"{table:10} кортежи {tuples * scale:7.1f} МБ / 100 тыс. строк   "
+              f"RowStore {stored * scale:7.1f} МБ / 100 тыс. строк   экономия {1 - stored / tuples:.0%}")
+    return report
+
+
+def bench_writes(args):
+    # Устойчивая скорость создания записей: фиксация каждой вставки отдельно против очереди
+    # с групповой фиксацией (worker.WriteQueue), через которую пишут приложения
+    report = {}
+    for table in args.tables:
+        app = db.load_app(table)
+        generate = generate_requests if table == 'requests' else generate_books
+        insert = app.insert_request if table == 'requests' else app.insert_book
+        rows = list(generate(args.rows, args.seed))
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, f'{table}.db')
+            app.DB_PATH = path
+            app.create_db()
+
+            conn = db.connect(path)
+            start = time.perf_counter()
+            for values in rows:
+                with conn:
+                    insert(conn.cursor(), values)
+            single = time.perf_counter() - start
+            conn.close()
+
+            writes = WriteQueue(path, batch_size=args.batch_size, max_delay=args.max_delay)
+            start = time.perf_counter()
+            futures = [writes.submit(insert, (values,)) for values in rows]
+            writes.flush()
+            grouped = time.perf_counter() - start
+            errors = sum(1 for future in futures if future.exception() is not None)
+            db.close_all()
+
+        report[table] = {'rows': args.rows, 'per_insert_rows_per_s': args.rows / single,
+                         'write_queue_rows_per_s': args.rows / grouped, 'errors': errors}
+        print(f"{table:10} фиксация каждой вставки {args.rows / single:9.0f} строк/с   "
+              f"очередь записи {args.rows / grouped:9.0f} строк/с   ускорение {single / grouped:.1f}x"
+              + (f"   ошибок: {errors}" if errors else ''))
+    return report
+
+
+def bench_suggest(args):
+    # Время подсказки автодополнения по префиксному индексу на values разных значениях
+    # (имена вида "Фамилия Имя N" с неравномерной частотой) для префиксов длиной 1-8 символов
+    rng = random.Random(args.seed)
+    rows = [(f"{LAST_NAMES[i % len(LAST_NAMES)]} {FIRST_NAMES[i // len(LAST_NAMES) % len(FIRST_NAMES)]} {i}",
+             int(rng.paretovariate(1.2))) for i in range(args.values)]
+    start = time.perf_counter()
+    index = PrefixIndex(rows)
+    build = time.perf_counter() - start
+
+    samples = [value for value, count in rng.sample(rows, min(args.queries, len(rows)))]
+    times = []
+    for value in samples:
+        for length in (1, 2, 3, 5, 8):
+            start = time.perf_counter()
+            index.suggest(value[:length])
+            times.append(time.perf_counter() - start)
+    adds = []
+    for value in samples[:1000]:
+        start = time.perf_counter()
+        index.add(value)
+        adds.append(time.perf_counter() - start)
+    times.sort()
+    report = {'values': args.values, 'build_s': build, 'suggest_p50_ms': times[len(times) // 2] * 1000,
+              'suggest_p99_ms': times[int(len(times) * 0.99)] * 1000, 'suggest_max_ms': times[-1] * 1000,
+              'add_mean_ms': statistics.mean(adds) * 1000}
+    print(f"значений {args.values}: построение {build:.2f} с, подсказка p50 {report['suggest_p50_ms']:.3f} мс, "
+          f"p99 {report['suggest_p99_ms']:.3f} мс, максимум {report['suggest_max_ms']:.3f} мс, "
+          f"добавление {report['add_mean_ms']:.3f} мс")
+    return report
+
+
+def bench_reports(args):
+    # Время построения отчётов reports.py при разном числе процессов пула. Печатается и доля заявок
+    # самого загруженного ответственного: его отчёт строится из частей, которые собираются в конце
+    import reports
+    app = db.load_app('requests')
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    path = os.path.join(workdir, 'requests.db')
+    fill_database('requests', path, args.rows, seed=args.seed)
+    db.close_all()
+    conn = sqlite3.connect(path)
+    largest = conn.execute('''
+        SELECT COUNT(*) FROM requests GROUP BY responsible ORDER BY COUNT(*) DESC LIMIT 1
+    ''').fetchone()[0]
+    conn.close()
+    print(f"заявок {args.rows}, ядер {os.cpu_count()}, доля самого загруженного ответственного {largest / args.rows:.0%}")
+    report = {'rows': args.rows, 'cpu_count': os.cpu_count(), 'largest_share': largest / args.rows, 'results': {}}
+    base = None
+    for workers in args.workers:
+        seconds = statistics.median(timed(lambda: reports.generate_reports(path, os.path.join(workdir, 'reports'),
+                                                                           app.OPEN_STATUS, workers))
+                                    for _ in range(args.runs))
+        base = base or seconds
+        report['results'][str(workers)] = {'seconds': seconds, 'speedup': base / seconds}
+        print(f"процессов {workers:3}: {seconds:7.2f} с   ускорение {base / seconds:.2f}x")
+    return report
+
+
+def print_results(results, labels):
+    before_label, after_label = labels
+    for name, result in results.items():
+        old, new = result['before'], result['after']
+        print(f"{name:16} {before_label} {old['mean_us']:9.1f} мкс (p95 {old['p95_us']:9.1f})   "
+              f"{after_label} {new['mean_us']:9.1f} мкс (p95 {new['p95_us']:9.1f})   x{result['speedup']:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки работы с базой данных")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    connection_parser = subparsers.add_parser('connection', help="Общее соединение против connect на каждый вызов")
+    connection_parser.add_argument('--rows', type=int, default=10000)
+    connection_parser.add_argument('--calls', type=int, default=2000)
+    connection_parser.add_argument('--json', help="Файл для сохранения результатов")
+    connection_parser.set_defaults(func=bench_connection, labels=('connect-per-call', 'shared'))
+
+    filters_parser = subparsers.add_parser('filters', help="Фильтры до и после миграции схемы на версию 2")
+    filters_parser.add_argument('--rows', type=int, default=100000)
+    filters_parser.add_argument('--calls', type=int, default=20)
+    filters_parser.add_argument('--json', help="Файл для сохранения результатов")
+    filters_parser.set_defaults(func=bench_filters, labels=('text', 'codes'))
+
+    suite_parser = subparsers.add_parser('suite', help="Набор замеров обоих приложений на синтетических данных")
+    suite_parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    suite_parser.add_argument('--tables', nargs='+', choices=['requests', 'books'], default=['requests', 'books'])
+    suite_parser.add_argument('--calls', type=int, default=20, help="Вызовов каждой операции")
+    suite_parser.add_argument('--batch-size', type=int, default=10000, help="Строк в одной транзакции вставки")
+    suite_parser.add_argument('--tree-rows', type=int, default=10000, help="Строк для заполнения Treeview")
+    suite_parser.add_argument('--keep', action='store_true', help="Не удалять созданные базы")
+    suite_parser.add_argument('--json', help="Файл для сохранения результатов")
+    suite_parser.set_defaults(func=bench_suite, labels=None)
+
+    startup_parser = subparsers.add_parser('startup', help="Время запуска приложений до первой страницы данных")
+    startup_parser.add_argument('--tables', nargs='+', choices=['requests', 'books'], default=['requests', 'books'])
+    startup_parser.add_argument('--rows', type=int, default=100000, help="Строк в базе запускаемого приложения")
+    startup_parser.add_argument('--runs', type=int, default=5)
+    startup_parser.add_argument('--timeout', type=float, default=60, help="Предельное время одного запуска, с")
+    startup_parser.add_argument('--json', help="Файл для сохранения результатов")
+    startup_parser.set_defaults(func=bench_startup, labels=None)
+
+    rowstore_parser = subparsers.add_parser('rowstore', help="Память на загруженные строки: кортежи против RowStore")
+    rowstore_parser.add_argument('--tables', nargs='+', choices=['requests', 'books'], default=['requests', 'books'])
+    rowstore_parser.add_argument('--rows', type=int, default=100000)
+    rowstore_parser.add_argument('--seed', type=int, default=0)
+    rowstore_parser.add_argument('--json', help="Файл для сохранения результатов")
+    rowstore_parser.set_defaults(func=bench_rowstore, labels=None)
+
+    writes_parser = subparsers.add_parser('writes', help="Скорость создания записей: фиксация каждой вставки против очереди записи")
+    writes_parser.add_argument('--tables', nargs='+', choices=['requests', 'books'], default=['requests', 'books'])
+    writes_parser.add_argument('--rows', type=int, default=20000)
+    writes_parser.add_argument('--batch-size', type=int, default=500, help="Операций в одной транзакции очереди")
+    writes_parser.add_argument('--max-delay', type=int, default=20, help="Наибольшее ожидание пакета, мс")
+    writes_parser.add_argument('--seed', type=int, default=0)
+    writes_parser.add_argument('--json', help="Файл для сохранения результатов")
+    writes_parser.set_defaults(func=bench_writes, labels=None)
+
+    suggest_parser = subparsers.add_parser('suggest', help="Время подсказки автодополнения по префиксному индексу")
+    suggest_parser.add_argument('--values', type=int, default=100000, help="Разных значений в индексе")
+    suggest_parser.add_argument('--queries', type=int, default=2000)
+    suggest_parser.add_argument('--seed', type=int, default=0)
+    suggest_parser.add_argument('--json', help="Файл для сохранения результатов")
+    suggest_parser.set_defaults(func=bench_suggest, labels=None)
+
+    reports_parser = subparsers.add_parser('reports', help="Отчёты по ответственным при разном числе процессов")
+    reports_parser.add_argument('--rows', type=int, default=1000000)
+    reports_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    reports_parser.add_argument('--runs', type=int, default=3)
+    reports_parser.add_argument('--seed', type=int, default=0)
+    reports_parser.add_argument('--json', help="Файл для сохранения результатов")
+    reports_parser.set_defaults(func=bench_reports, labels=None)
+
+    compare_parser = subparsers.add_parser('compare', help="Сравнить два отчёта suite")
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=1.2, help="Допустимое замедление")
+
+    generate_parser = subparsers.add_parser('generate', help="Заполнить базу приложения синтетическими данными")
+    generate_parser.add_argument('table', choices=['requests', 'books'])
+    generate_parser.add_argument('--rows', type=int, default=100000)
+    generate_parser.add_argument('--db', help="Файл базы данных (по умолчанию requests.db или bookstore.db)")
+    generate_parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+    if args.command == 'compare':
+        sys.exit(compare_command(args))
+    if args.command == 'generate':
+        generate_command(args)
+        return
+    results = args.func(args)
+    if args.labels:
+        print_results(results, args.labels)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
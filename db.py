@@ -0,0 +1,288 @@
+import os
+import sqlite3
+import threading
+import urllib.parse
+from collections import OrderedDict
+
+import metrics
+
+
+# Общий слой подключений к SQLite для requests.py и G.py.
+# На каждый поток и каждый файл базы держится одно долгоживущее соединение,
+# поэтому connect/close и разбор SQL не повторяются при каждом действии.
+
+# Размер кэша подготовленных выражений (sqlite3 кэширует их по тексту SQL)
+STATEMENT_CACHE_SIZE = 256
+
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('temp_store', 'MEMORY'),
+    ('cache_size', -16000),  # ~16 МБ страничного кэша
+    ('mmap_size', 268435456),
+    ('busy_timeout', 5000),
+)
+
+# Для соединений только для чтения: journal_mode и synchronous - настройки записи,
+# а переключение в WAL через соединение mode=ro у базы не в WAL завершается ошибкой
+READ_PRAGMAS = tuple((name, value) for name, value in PRAGMAS if name not in ('journal_mode', 'synchronous'))
+
+# Кэш результатов чтения: число запросов и максимальный размер кэшируемого результата
+QUERY_CACHE_SIZE = 256
+QUERY_CACHE_MAX_ROWS = 10000
+
+_connections = {}
+_caches = {}
+_lock = threading.Lock()
+
+
+def connect(path, pragmas=PRAGMAS):
+    # Новое соединение с настроенными PRAGMA (без регистрации в общем пуле)
+    # При включённых замерах (APP_METRICS=1) запросы соединения попадают в журнал медленных запросов
+    factory = metrics.TimedConnection if metrics.ENABLED else sqlite3.Connection
+    conn = sqlite3.connect(path, timeout=5.0, cached_statements=STATEMENT_CACHE_SIZE,
+                           check_same_thread=False, uri=path.startswith('file:'), factory=factory)
+    for name, value in pragmas:
+        conn.execute(f'PRAGMA {name} = {value}')
+    if 'cache=shared' in path:
+        # Соединения общей базы в памяти (memory_path) делят один кэш и блокируют друг друга по таблицам;
+        # такая блокировка (SQLITE_LOCKED) не ждёт busy_timeout, а сразу даёт ошибку. Без блокировки чтения
+        # читатель не ждёт незафиксированную запись другого потока, но и видит её. Две одновременные
+        # записи из разных потоков по-прежнему получают SQLITE_LOCKED
+        conn.execute('PRAGMA read_uncommitted = 1')
+    return conn
+
+
+def get_connection(path):
+    # Общее соединение текущего потока для указанного файла базы
+    key = (path, threading.get_ident())
+    conn = _connections.get(key)
+    if conn is None:
+        conn = connect(path)
+        with _lock:
+            _connections[key] = conn
+    return conn
+
+
+def close_connection(path):
+    # Закрывает соединение текущего потока
+    with _lock:
+        conn = _connections.pop((path, threading.get_ident()), None)
+        cache = _caches.get(path)
+    if conn is not None:
+        if cache is not None:
+            cache.forget(conn)
+        conn.close()
+
+
+def interrupt(thread_ident):
+    # Прерывает запросы, выполняющиеся в соединениях указанного потока
+    with _lock:
+        connections = [conn for (path, ident), conn in _connections.items() if ident == thread_ident]
+    for conn in connections:
+        conn.interrupt()
+
+
+def is_interrupted(error):
+    # Запрос остановлен через interrupt, а не завершился ошибкой
+    return isinstance(error, sqlite3.OperationalError) and str(error) == 'interrupted'
+
+
+def close_all():
+    with _lock:
+        connections = list(_connections.values())
+        _connections.clear()
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.forget_all()
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError:
+            pass
+
+
+def data_version(path):
+    # Меняется, когда базу изменило другое соединение; собственные записи соединения на него не влияют
+    return get_connection(path).execute('PRAGMA data_version').fetchone()[0]
+
+
+def enable_incremental_vacuum(conn):
+    # Освобождённые при удалении страницы возвращаются файлу по частям (PRAGMA incremental_vacuum)
+    # вместо блокирующего полного VACUUM. У уже созданного файла режим меняется только
+    # перестройкой базы, поэтому при первом запуске выполняется однократный VACUUM.
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+        return
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('VACUUM')
+
+
+def incremental_vacuum(path, pages):
+    # Возвращает файлу не больше pages свободных страниц; результат - сколько свободных страниц осталось
+    # Через executescript: PRAGMA без результата execute выполняет за один шаг, освобождая одну страницу
+    conn = get_connection(path)
+    conn.executescript(f'PRAGMA incremental_vacuum({int(pages)})')
+    return conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+
+def memory_path(name):
+    # URI базы в памяти: все соединения процесса с этим именем (в том числе из других потоков)
+    # видят одну базу, пока открыто хотя бы одно из них
+    return f'file:{name}?mode=memory&cache=shared'
+
+
+def readonly_path(path):
+    # URI файла базы только для чтения: соединение не может ничего записать и не берёт блокировку записи,
+    # а в режиме WAL читает согласованный снимок, пока рядом пишут приложения
+    return f"file:{urllib.parse.quote(os.path.abspath(path))}?mode=ro"
+
+
+def connect_readonly(path):
+    # Соединение только для чтения с файлом базы: только PRAGMA чтения (READ_PRAGMAS)
+    return connect(readonly_path(path), READ_PRAGMAS)
+
+
+def backup(source, target):
+    # Копирует базу source в target онлайн-бэкапом SQLite постранично, без удаления файла и
+    # повторного создания схемы. Общее соединение этого потока с target остаётся рабочим.
+    src = connect(source)
+    try:
+        conn = get_connection(target)
+        src.backup(conn)
+    finally:
+        src.close()
+    invalidate(target)
+
+
+def migrate(conn, migrations):
+    # Применяет недостающие миграции схемы по PRAGMA user_version.
+    # migrations - список пар (версия, функция(cursor)), упорядоченный по версии.
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for target, migration in migrations:
+        if target <= version:
+            continue
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN')
+            migration(cursor)
+            cursor.execute(f'PRAGMA user_version = {target}')
+        version = target
+    return version
+
+
+def load_app(table):
+    # Модуль приложения таблицы импортируется по требованию: requests и G тянут за собой tkinter,
+    # а утилитам командной строки нужен только один из них
+    if table == 'requests':
+        import requests as app
+        return app
+    import G as app
+    return app
+
+
+class QueryCache:
+    # Ограниченный LRU-кэш результатов чтения для одного файла базы, ключ - (SQL, параметры).
+    # Сбрасывается при записи через любое соединение этого процесса (total_changes)
+    # и при изменениях из других соединений и процессов (PRAGMA data_version).
+    # Каждый сброс увеличивает generation: результат, прочитанный до сброса, в кэш уже не попадает.
+    def __init__(self, path, maxsize=QUERY_CACHE_SIZE, max_rows=QUERY_CACHE_MAX_ROWS):
+        self.path = path
+        self.maxsize = maxsize
+        self.max_rows = max_rows
+        self.entries = OrderedDict()
+        # Последние увиденные версии по объекту соединения (не id(conn): id закрытого соединения
+        # может достаться новому). Закрытые соединения убираются через forget
+        self.versions = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def check_changes(self, conn):
+        # data_version меняется, когда базу изменило другое соединение;
+        # total_changes - когда в неё писало само это соединение. Возвращает текущее поколение кэша
+        version = (conn.execute('PRAGMA data_version').fetchone()[0], conn.total_changes)
+        with self.lock:
+            if self.versions.get(conn) != version:
+                self.clear()
+                self.versions[conn] = version
+            return self.generation
+
+    def clear(self):
+        # Вызывается под self.lock
+        if self.entries:
+            self.entries.clear()
+            self.invalidations += 1
+        self.generation += 1
+
+    def forget(self, conn):
+        with self.lock:
+            self.versions.pop(conn, None)
+
+    def forget_all(self):
+        with self.lock:
+            self.versions.clear()
+
+    def fetchall(self, sql, params=()):
+        conn = get_connection(self.path)
+        generation = self.check_changes(conn)
+        key = (sql, tuple(params))
+        with self.lock:
+            rows = self.entries.get(key)
+            if rows is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return list(rows)
+            self.misses += 1
+
+        rows = conn.execute(sql, params).fetchall()
+        if len(rows) <= self.max_rows:
+            with self.lock:
+                # Пока шёл запрос, кэш сбросили по более новой версии базы: результат может быть устаревшим
+                if self.generation != generation:
+                    return rows
+                self.entries[key] = tuple(rows)
+                if len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+        return rows
+
+    def invalidate(self):
+        with self.lock:
+            self.clear()
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': len(self.entries),
+                'invalidations': self.invalidations,
+            }
+
+
+def get_cache(path):
+    cache = _caches.get(path)
+    if cache is None:
+        with _lock:
+            cache = _caches.setdefault(path, QueryCache(path))
+    return cache
+
+
+def fetchall_cached(path, sql, params=()):
+    return get_cache(path).fetchall(sql, params)
+
+
+def fetchone_cached(path, sql, params=()):
+    rows = get_cache(path).fetchall(sql, params)
+    return rows[0] if rows else None
+
+
+def invalidate(path):
+    get_cache(path).invalidate()
+
+
+def cache_stats(path):
+    return get_cache(path).stats()
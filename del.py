@@ -1,3 +1,124 @@
-# Удаление старой базы данных, если она существует
-if os.path.exists('requests.db'):
-    os.remove('requests.db')
+import argparse
+import os
+import sys
+import time
+
+import db
+
+
+# Сброс баз приложений к эталонному состоянию.
+# Вместо удаления requests.db (после которого нужны create_db и повторная загрузка данных)
+# база восстанавливается из заранее собранного эталона онлайн-бэкапом SQLite.
+# Запуск: python del.py                            - восстановить requests.db и bookstore.db из эталонов
+#         python del.py template --rows 100000     - собрать эталоны с синтетическими данными
+#         python del.py template --from-current    - сохранить текущие базы как эталоны
+#         python del.py --delete                   - удалить файлы баз, как раньше
+
+DATABASES = {'requests': 'requests.db', 'books': 'bookstore.db'}
+
+
+def template_path(path):
+    name, ext = os.path.splitext(path)
+    return f'{name}.template{ext}'
+
+
+def create_template(table, path, rows=0, seed=0):
+    # Эталон - база приложения со схемой всех миграций и, если задано, синтетическими данными
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    if rows:
+        import sampledata
+        sampledata.fill_database(table, path, rows, seed=seed)
+    else:
+        app = db.load_app(table)
+        app.DB_PATH = path
+        app.create_db()
+    db.close_connection(path)
+
+
+def save_template(path, template):
+    # Текущее состояние базы становится эталоном
+    db.backup(path, template)
+    db.close_connection(template)
+
+
+def restore(path, template):
+    # Восстанавливает базу из эталона; возвращает время в секундах
+    start = time.perf_counter()
+    db.backup(template, path)
+    db.get_connection(path).execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    elapsed = time.perf_counter() - start
+    db.close_connection(path)
+    return elapsed
+
+
+def use_memory(table, template=None):
+    # Режим для тестов: приложение работает с базой в памяти, заполненной из эталона (если задан).
+    # База существует, пока открыто общее соединение; повторный вызов возвращает её к эталону.
+    # Соединения потоков делят кэш (cache=shared): чтение не блокируется записью (read_uncommitted, см. db.connect),
+    # но запись, начатая, пока другой поток держит свою транзакцию записи, сразу получает
+    # "database table is locked" - тесты пишут в базу из одного потока (очередь записи это и делает)
+    app = db.load_app(table)
+    app.DB_PATH = db.memory_path(table)
+    if template:
+        db.backup(template, app.DB_PATH)
+    app.create_db()
+    return app
+
+
+def delete_databases(tables):
+    for table in tables:
+        path = DATABASES[table]
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        print(f"{path}: удалена")
+
+
+def template_command(args):
+    for table in args.tables:
+        path = DATABASES[table]
+        template = template_path(path)
+        if args.from_current:
+            if not os.path.exists(path):
+                print(f"{path}: база не найдена", file=sys.stderr)
+                continue
+            save_template(path, template)
+        else:
+            create_template(table, template, args.rows, args.seed)
+        print(f"{template}: эталон сохранён ({os.path.getsize(template) // 1024} КБ)")
+
+
+def restore_command(args):
+    for table in args.tables:
+        path = DATABASES[table]
+        template = template_path(path)
+        if not os.path.exists(template):
+            # Первый запуск: эталоном становится пустая база со схемой
+            create_template(table, template)
+        elapsed = restore(path, template)
+        print(f"{path}: восстановлена из {template} за {elapsed * 1000:.1f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сброс баз приложений к эталонному состоянию")
+    parser.add_argument('command', nargs='?', choices=['restore', 'template'], default='restore',
+                        help="restore - восстановить базы из эталонов, template - собрать эталоны")
+    parser.add_argument('--tables', nargs='+', choices=sorted(DATABASES), default=sorted(DATABASES))
+    parser.add_argument('--rows', type=int, default=0, help="Синтетических строк в эталоне")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--from-current', action='store_true', help="Сохранить текущие базы как эталоны")
+    parser.add_argument('--delete', action='store_true', help="Удалить файлы баз вместо восстановления")
+    args = parser.parse_args()
+
+    if args.command == 'template':
+        template_command(args)
+    elif args.delete:
+        delete_databases(args.tables)
+    else:
+        restore_command(args)
+
+
+if __name__ == "__main__":
+    main()
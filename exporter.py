@@ -0,0 +1,124 @@
+import argparse
+import csv
+import gzip
+import json
+import os
+import sys
+import time
+
+import db
+
+
+# Потоковая выгрузка заявок и книг в CSV/JSONL (при расширении .gz - со сжатием gzip).
+# Строки читаются из курсора пакетами fetchmany и сразу пишутся в файл, поэтому расход памяти
+# не зависит от размера таблицы.
+# Запуск: python exporter.py requests tickets.csv --filter status=Закрыта --order-by due_date
+#         python exporter.py books catalog.jsonl.gz --search Толстой
+
+# Строк в одном пакете fetchmany
+EXPORT_BATCH_SIZE = 1000
+
+
+def output_format(path):
+    name = path[:-3] if path.lower().endswith('.gz') else path
+    return 'csv' if name.lower().endswith('.csv') else 'jsonl'
+
+
+def open_output(path, compress):
+    if compress:
+        # Уровень 6 почти не уступает максимальному по размеру, но сжимает в несколько раз быстрее
+        return gzip.open(path, 'wt', compresslevel=6, encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+def export_rows(db_path, sql, params, path, fmt=None, batch_size=EXPORT_BATCH_SIZE, progress=None):
+    # Пишет результат запроса в файл; возвращает число строк.
+    # Файл сначала пишется во временный и переименовывается только после успешной выгрузки,
+    # так что прерванный экспорт не оставляет неполный файл
+    fmt = fmt or output_format(path)
+    partial = path + '.part'
+    conn = db.get_connection(db_path)
+    cursor = conn.execute(sql, params)
+    columns = [column[0] for column in cursor.description]
+    count = 0
+    try:
+        with open_output(partial, path.lower().endswith('.gz')) as f:
+            if fmt == 'csv':
+                writer = csv.writer(f)
+                writer.writerow(columns)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                if fmt == 'csv':
+                    writer.writerows(rows)
+                else:
+                    f.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n' for row in rows)
+                count += len(rows)
+                if progress is not None:
+                    progress(count)
+        os.replace(partial, path)
+    except BaseException:
+        cursor.close()
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return count
+
+
+def parse_filters(values, keys):
+    # --filter ключ=значение; ключи те же, что у фильтров панели приложения (keys - FILTER_KEYS модуля).
+    # Неизвестный ключ - ошибка: иначе опечатка в ключе молча выгружала бы всю таблицу
+    filters = {}
+    for value in values:
+        key, sep, text = value.partition('=')
+        if not sep:
+            raise ValueError(f"фильтр должен иметь вид ключ=значение: {value}")
+        key = key.strip()
+        if key not in keys:
+            raise ValueError(f"неизвестный фильтр: {key} (допустимы: {', '.join(keys)})")
+        filters[key] = text.strip()
+    return filters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Потоковая выгрузка заявок и книг в CSV/JSONL")
+    parser.add_argument('table', choices=['requests', 'books'])
+    parser.add_argument('path', help="Файл .csv или .jsonl, с суффиксом .gz - со сжатием")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="По умолчанию определяется по расширению")
+    parser.add_argument('--db', help="Файл базы данных (по умолчанию requests.db или bookstore.db)")
+    parser.add_argument('--filter', action='append', default=[], metavar='КЛЮЧ=ЗНАЧЕНИЕ',
+                        help="Фильтр, как на панели фильтров (например status=Закрыта, price_max=500)")
+    parser.add_argument('--search', default='', help="Выгрузить результаты поиска")
+    parser.add_argument('--order-by', default='id', help="Столбец сортировки")
+    parser.add_argument('--desc', action='store_true', help="Сортировка по убыванию")
+    parser.add_argument('--batch-size', type=int, default=EXPORT_BATCH_SIZE, help="Строк в одном fetchmany")
+    args = parser.parse_args()
+
+    app = db.load_app(args.table)
+    export = app.export_requests if args.table == 'requests' else app.export_books
+    app.DB_PATH = args.db or app.DB_PATH
+    try:
+        filters = parse_filters(args.filter, app.FILTER_KEYS)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.order_by not in app.SORT_COLUMNS:
+        parser.error(f"неизвестный столбец сортировки: {args.order_by}")
+
+    batch_size = max(1, args.batch_size)
+
+    def progress(count):
+        if count % (batch_size * 100) == 0:
+            print(f"Выгружено {count} строк", file=sys.stderr)
+
+    start = time.perf_counter()
+    count = export(args.path, filters, args.order_by, args.desc, args.search,
+                   fmt=args.format, batch_size=batch_size, progress=progress)
+    if count is None:
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+    print(f"Выгружено: {count}, время: {elapsed:.2f} с, скорость: {count / elapsed if elapsed else 0:.0f} строк/с")
+
+
+if __name__ == "__main__":
+    main()
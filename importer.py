@@ -0,0 +1,109 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import db
+
+
+# Пакетный импорт заявок и книг из CSV/JSONL без графического интерфейса.
+# Запуск: python importer.py requests tickets.csv --batch-size 10000
+#         python importer.py books catalog.jsonl --db bookstore.db
+
+
+def read_records(path, fmt):
+    # Построчно отдаёт (номер строки, запись) без загрузки файла в память целиком
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for line_num, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_num, ValueError(f"некорректный JSON: {e}")
+                    continue
+                if not isinstance(record, dict):
+                    yield line_num, ValueError("строка должна быть JSON-объектом")
+                    continue
+                yield line_num, record
+
+
+def import_file(table, path, fmt, db_path, batch_size, rejects_path):
+    app = db.load_app(table)
+    if table == 'requests':
+        insert_sql, validate = app.INSERT_REQUEST_SQL, app.validate_request
+    else:
+        insert_sql, validate = app.INSERT_BOOK_SQL, app.validate_book
+    app.DB_PATH = db_path
+    app.create_db()
+
+    conn = db.connect(db_path)
+    imported = 0
+    rejected = 0
+    batch = []
+    start = time.perf_counter()
+
+    def flush():
+        with conn:
+            conn.executemany(insert_sql, batch)
+        batch.clear()
+
+    with open(rejects_path, 'w', encoding='utf-8') as rejects:
+        for line_num, record in read_records(path, fmt):
+            try:
+                if isinstance(record, ValueError):
+                    error, record = record, None
+                    raise error
+                batch.append(validate(record))
+            except ValueError as e:
+                rejected += 1
+                rejects.write(json.dumps({'line': line_num, 'error': str(e), 'record': record},
+                                         ensure_ascii=False, default=str) + '\n')
+                continue
+
+            if len(batch) >= batch_size:
+                imported += len(batch)
+                flush()
+                elapsed = time.perf_counter() - start
+                print(f"Импортировано {imported} строк ({imported / elapsed:.0f} строк/с)", file=sys.stderr)
+
+        if batch:
+            imported += len(batch)
+            flush()
+
+    conn.close()
+    elapsed = time.perf_counter() - start
+    return imported, rejected, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетный импорт заявок и книг из CSV/JSONL")
+    parser.add_argument('table', choices=['requests', 'books'])
+    parser.add_argument('path', help="Файл CSV (с заголовком) или JSONL")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="По умолчанию определяется по расширению")
+    parser.add_argument('--db', help="Файл базы данных (по умолчанию requests.db или bookstore.db)")
+    parser.add_argument('--batch-size', type=int, default=10000, help="Строк в одной транзакции")
+    parser.add_argument('--rejects', help="Файл для отклонённых строк (по умолчанию <файл>.rejected.jsonl)")
+    args = parser.parse_args()
+
+    fmt = args.format or ('csv' if args.path.lower().endswith('.csv') else 'jsonl')
+    db_path = args.db or ('requests.db' if args.table == 'requests' else 'bookstore.db')
+    rejects_path = args.rejects or os.path.splitext(args.path)[0] + '.rejected.jsonl'
+
+    imported, rejected, elapsed = import_file(args.table, args.path, fmt, db_path,
+                                              max(1, args.batch_size), rejects_path)
+    print(f"Импортировано: {imported}, отклонено: {rejected}, время: {elapsed:.2f} с, "
+          f"скорость: {imported / elapsed if elapsed else 0:.0f} строк/с")
+    if rejected:
+        print(f"Отклонённые строки записаны в {rejects_path}")
+
+
+if __name__ == "__main__":
+    main()
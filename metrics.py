@@ -0,0 +1,254 @@
+import atexit
+import bisect
+import datetime
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+# Необязательные замеры времени для requests.py и G.py.
+# Включаются переменной окружения: APP_METRICS=1 python requests.py
+# Выключенные замеры ничего не стоят: декоратор timed возвращает функцию без изменений.
+
+ENABLED = os.environ.get('APP_METRICS') == '1'
+
+# Запросы дольше порога (мс) записываются в журнал медленных запросов вместе с планом выполнения
+SLOW_QUERY_MS = float(os.environ.get('APP_SLOW_QUERY_MS', 50))
+SLOW_QUERY_LOG = os.environ.get('APP_SLOW_QUERY_LOG', 'slow_queries.log')
+
+# Файл, в который замеры выгружаются при выходе из приложения (необязательно)
+METRICS_FILE = os.environ.get('APP_METRICS_FILE')
+
+# Замер запуска: APP_STARTUP_REPORT=startup.json - записать отметки этапов запуска в файл
+# и закрыть приложение, как только окно отрисовано и первая страница данных загружена
+STARTUP_REPORT = os.environ.get('APP_STARTUP_REPORT')
+
+# Верхние границы интервалов гистограммы, мс
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+
+# Запросы, для которых EXPLAIN QUERY PLAN не имеет смысла
+NO_PLAN_PREFIXES = ('PRAGMA', 'BEGIN', 'COMMIT', 'ROLLBACK', 'ANALYZE', 'CREATE', 'DROP', 'ALTER', 'EXPLAIN')
+
+_histograms = {}
+_slow_queries = 0
+_lock = threading.Lock()
+
+# Отметки этапов запуска, с от загрузки модулей приложения (metrics импортируется вместе с db)
+_loaded = time.perf_counter()
+_startup = {}
+
+
+class Histogram:
+    # Распределение длительностей по интервалам BUCKETS_MS
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, fraction):
+        # Верхняя граница интервала, в который попадает заданная доля замеров
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': self.total_ms,
+            'mean_ms': self.total_ms / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'max_ms': self.max_ms,
+            'buckets': {('inf' if bound == float('inf') else str(bound)): count
+                        for bound, count in zip(BUCKETS_MS, self.counts) if count},
+        }
+
+
+def record(name, seconds):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.add(seconds * 1000)
+
+
+def timed(fn):
+    # Декоратор для функций работы с базой и обновления интерфейса; имя замера - имя функции
+    if not ENABLED:
+        return fn
+    name = fn.__qualname__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            record(name, time.perf_counter() - start)
+    return wrapper
+
+
+def query_plan(conn, sql, params):
+    if sql.lstrip().upper().startswith(NO_PLAN_PREFIXES):
+        return None
+    try:
+        # Напрямую через sqlite3.Connection, чтобы сам EXPLAIN не замерялся
+        rows = sqlite3.Connection.execute(conn, 'EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+        return [row[3] for row in rows]
+    except sqlite3.Error as e:
+        return [f"план недоступен: {e}"]
+
+
+def log_slow_query(conn, sql, params, seconds):
+    global _slow_queries
+    entry = {
+        'time': datetime.datetime.now().isoformat(timespec='milliseconds'),
+        'ms': round(seconds * 1000, 3),
+        'thread': threading.current_thread().name,
+        'sql': ' '.join(sql.split()),
+        'params': params,
+        'plan': query_plan(conn, sql, params) if params is not None else None,
+    }
+    line = json.dumps(entry, ensure_ascii=False, default=str)
+    with _lock:
+        _slow_queries += 1
+        with open(SLOW_QUERY_LOG, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+
+class TimedCursor(sqlite3.Cursor):
+    # Курсор, замеряющий выполнение запроса вместе с чтением результата.
+    # Запрос с результатом считается завершённым после fetchall, пустого fetchone/fetchmany,
+    # следующего execute или close.
+    statement = None
+
+    def start(self, sql, params):
+        self.finish()
+        self.statement = [sql, params, 0.0]
+
+    def add_time(self, start):
+        if self.statement is not None:
+            self.statement[2] += time.perf_counter() - start
+
+    def finish(self):
+        statement, self.statement = self.statement, None
+        if statement is not None:
+            sql, params, seconds = statement
+            record('sql', seconds)
+            if seconds * 1000 >= SLOW_QUERY_MS:
+                log_slow_query(self.connection, sql, params, seconds)
+
+    def execute(self, sql, parameters=()):
+        self.start(sql, parameters)
+        start = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        finally:
+            self.add_time(start)
+        if self.description is None:
+            # Запрос без результата (INSERT, UPDATE, DELETE) уже выполнен полностью
+            self.finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        # Для пакетной вставки план не строится: параметров много
+        self.start(sql, None)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.add_time(start)
+            self.finish()
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self.add_time(start)
+        if row is None:
+            self.finish()
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self.add_time(start)
+        if not rows:
+            self.finish()
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self.add_time(start)
+        self.finish()
+        return rows
+
+    def close(self):
+        self.finish()
+        super().close()
+
+
+class TimedConnection(sqlite3.Connection):
+    # Соединение, все курсоры которого замеряют запросы (db.connect использует его при APP_METRICS=1)
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def startup_mark(phase):
+    # Отметки не зависят от APP_METRICS: они дешёвые и нужны для отслеживания времени запуска
+    _startup[phase] = time.perf_counter() - _loaded
+
+
+def startup_done(root):
+    if STARTUP_REPORT:
+        with open(STARTUP_REPORT, 'w', encoding='utf-8') as f:
+            json.dump(_startup, f, indent=2)
+        root.after_idle(root.destroy)
+
+
+def snapshot():
+    with _lock:
+        return {
+            'enabled': ENABLED,
+            'slow_query_ms': SLOW_QUERY_MS,
+            'slow_query_log': SLOW_QUERY_LOG,
+            'slow_queries': _slow_queries,
+            'startup': dict(_startup),
+            'timings': {name: histogram.to_dict() for name, histogram in sorted(_histograms.items())},
+        }
+
+
+def dump(path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot(), f, ensure_ascii=False, indent=2)
+
+
+def reset():
+    global _slow_queries
+    with _lock:
+        _histograms.clear()
+        _slow_queries = 0
+
+
+if ENABLED and METRICS_FILE:
+    atexit.register(dump, METRICS_FILE)
@@ -0,0 +1,98 @@
+import bisect
+import heapq
+
+
+# Префиксный индекс значений поля (ответственный, автор, жанр) для автодополнения в диалогах.
+# Значения хранятся списком, отсортированным по ключу в нижнем регистре (casefold), поэтому все значения
+# с введённым префиксом занимают в нём непрерывный отрезок, который находится двумя bisect.
+# Подсказки упорядочены по числу записей с этим значением: чаще используемое написание предлагается первым.
+
+# Отрезок длиннее этого не просматривается при каждом нажатии: лучшие значения таких префиксов
+# вычисляются при построении индекса и поддерживаются при добавлении значений
+SCAN_LIMIT = 256
+
+# Подсказок по умолчанию
+SUGGEST_LIMIT = 8
+
+
+class PrefixIndex:
+    def __init__(self, rows=(), limit=SUGGEST_LIMIT):
+        # rows - пары (значение, число записей), например из SELECT поле, COUNT(*) ... GROUP BY поле
+        self.limit = limit
+        self.counts = {}
+        for value, count in rows:
+            if value:
+                self.counts[value] = self.counts.get(value, 0) + count
+        entries = sorted((value.casefold(), value) for value in self.counts)
+        self.keys = [key for key, value in entries]
+        self.values = [value for key, value in entries]
+        self.top = {}
+        self.build_top(0, len(self.keys), 0)
+
+    def build_top(self, start, end, depth):
+        # Лучшие значения префикса длины depth, занимающего отрезок [start, end).
+        # Длинный отрезок делится по следующей букве, и лучшие значения префикса выбираются
+        # из лучших значений его продолжений - каждое значение просматривается один раз
+        if end - start <= SCAN_LIMIT:
+            return self.best(start, end, self.limit)
+        candidates = []
+        index = start
+        while index < end:
+            key = self.keys[index]
+            if len(key) <= depth:
+                # Значение совпадает с самим префиксом
+                candidates.append(self.values[index])
+                index += 1
+                continue
+            child = bisect.bisect_left(self.keys, key[:depth + 1] + '\U0010ffff', index, end)
+            candidates += self.build_top(index, child, depth + 1)
+            index = child
+        top = heapq.nlargest(self.limit, candidates, key=self.counts.__getitem__)
+        self.top[self.keys[start][:depth]] = top
+        return top
+
+    def best(self, start, end, limit):
+        return heapq.nlargest(limit, self.values[start:end], key=self.counts.__getitem__)
+
+    def add(self, value, count=1):
+        # Учитывает новую запись со значением value (например, только что созданную заявку)
+        if not value:
+            return
+        key = value.casefold()
+        if value in self.counts:
+            self.counts[value] += count
+        else:
+            self.counts[value] = count
+            index = bisect.bisect_right(self.keys, key)
+            self.keys.insert(index, key)
+            self.values.insert(index, value)
+        # Число записей только растёт, поэтому лучшие значения префиксов этого значения
+        # обновляются на месте: значение либо поднимается в списке, либо вытесняет последнее
+        value_count = self.counts[value]
+        for end in range(len(key) + 1):
+            top = self.top.get(key[:end])
+            if top is None:
+                continue
+            if value not in top:
+                if len(top) >= self.limit and self.counts[top[-1]] >= value_count:
+                    continue
+                top.append(value)
+            top.sort(key=self.counts.__getitem__, reverse=True)
+            del top[self.limit:]
+
+    def suggest(self, prefix, limit=None):
+        limit = limit or self.limit
+        prefix = prefix.casefold()
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + '\U0010ffff', start)
+        if end - start <= SCAN_LIMIT:
+            return self.best(start, end, limit)
+        top = self.top.get(prefix)
+        if top is None or limit > self.limit:
+            # Отрезок вырос при добавлении значений или запрошено больше подсказок, чем запоминается
+            top = self.best(start, end, max(limit, self.limit))
+            self.top[prefix] = top[:self.limit]
+        return top[:limit]
+
+    def __len__(self):
+        return len(self.values)
@@ -0,0 +1,329 @@
+import argparse
+import concurrent.futures
+import datetime
+import heapq
+import os
+import re
+import sys
+import time
+
+import db
+
+
+# Еженедельные отчёты о загрузке ответственных: для каждого ответственного - отдельный файл с числом
+# заявок по статусам, средним возрастом открытых заявок по приоритетам и списком просроченных заявок.
+# Отчёты строятся без окна приложения, параллельно в пуле процессов. Каждый процесс открывает базу
+# только для чтения (URI mode=ro) и выполняет задание в одной транзакции чтения, то есть по неизменному
+# снимку WAL: операторы продолжают работать, отчёты не берут блокировку записи.
+# Запуск: python reports.py reports/ --db requests.db --workers 4
+
+# Заявок на одно задание пула. Ответственные с меньшей нагрузкой собираются в задания такого объёма,
+# а заявки ответственного с большей делятся на части по диапазонам id: иначе один загруженный
+# ответственный занимал бы один процесс дольше, чем все остальные вместе. Части читаются в разных
+# транзакциях, поэтому заявка, изменённая во время построения, может попасть в отчёт в двух состояниях
+REPORT_TASK_ROWS = 20000
+
+# Строк просроченных заявок в одном fetchmany
+REPORT_BATCH_SIZE = 1000
+
+# Заявки ответственного идут в индексе idx_requests_responsible по возрастанию id,
+# поэтому и вся выборка, и часть по диапазону id читаются одним отрезком индекса
+STATUS_COUNTS_SQL = '''
+    SELECT requests.status, statuses.label, COUNT(*) FROM requests
+    JOIN statuses ON statuses.code = requests.status
+    WHERE {where}
+    GROUP BY requests.status
+'''
+
+# Возраст в днях на момент построения отчёта. Заявки без даты создания (созданные до её появления)
+# входят в число заявок, но не в средний возраст. Сумма, а не среднее - чтобы складывать части
+OPEN_AGE_SQL = '''
+    SELECT requests.priority, priorities.label, COUNT(*), COUNT(requests.created_at),
+           SUM(julianday(?) - julianday(requests.created_at))
+    FROM requests
+    JOIN priorities ON priorities.code = requests.priority
+    WHERE {where} AND requests.status = (SELECT code FROM statuses WHERE label = ?)
+    GROUP BY requests.priority
+'''
+
+OVERDUE_SQL = '''
+    SELECT requests.id, requests.due_date, CAST(julianday(?) - julianday(requests.due_date) AS INTEGER),
+           priorities.label, requests.subject
+    FROM requests
+    JOIN priorities ON priorities.code = requests.priority
+    WHERE {where} AND requests.status = (SELECT code FROM statuses WHERE label = ?)
+      AND requests.due_date < ?
+    ORDER BY requests.due_date, requests.id
+'''
+
+# Соединение процесса пула только для чтения
+_conn = None
+
+
+def report_name(responsible):
+    # Имя файла из имени ответственного: только буквы, цифры, дефис и подчёркивание
+    return re.sub(r'[^\w-]+', '_', responsible).strip('_') or 'без_имени'
+
+
+def report_paths(people, out_dir):
+    # Файл отчёта каждого ответственного; разные имена могут дать одно имя файла
+    used = set()
+    paths = {}
+    for responsible, count in people:
+        name = report_name(responsible)
+        suffix = 1
+        while name.casefold() in used:
+            suffix += 1
+            name = f'{report_name(responsible)}_{suffix}'
+        used.add(name.casefold())
+        paths[responsible] = os.path.join(out_dir, f'{name}.txt')
+    return paths
+
+
+def id_bounds(conn, responsible, count, parts):
+    # Границы частей по id: каждая часть - примерно count / parts заявок ответственного.
+    # Смещение отсчитывается по индексу без чтения строк таблицы.
+    # Если заявок меньше, чем count, частей получается меньше: последняя доходит до конца
+    bounds = [None]
+    for part in range(1, parts):
+        row = conn.execute('SELECT id FROM requests WHERE responsible = ? ORDER BY id LIMIT 1 OFFSET ?',
+                           (responsible, count * part // parts)).fetchone()
+        if row is None:
+            break
+        bounds.append(row[0])
+    return bounds + [None]
+
+
+def plan_tasks(conn, people, paths, task_rows=REPORT_TASK_ROWS):
+    # Задания пула - списки частей (ответственный, файл, id от, id до, номер части); номер None -
+    # отчёт целиком. Крупные задания идут первыми, чтобы в конце не ждать одного длинного.
+    # Возвращает задания и число частей у ответственных, чьи отчёты собираются из частей
+    tasks = []
+    split = {}
+    task = []
+    rows = 0
+    for responsible, count in sorted(people, key=lambda person: -person[1]):
+        path = paths[responsible]
+        if count > task_rows:
+            bounds = id_bounds(conn, responsible, count, -(-count // task_rows))
+            parts = len(bounds) - 1
+            for part in range(parts):
+                tasks.append([(responsible, path, bounds[part], bounds[part + 1], part)])
+            split[responsible] = parts
+            continue
+        task.append((responsible, path, None, None, None))
+        rows += count
+        if rows >= task_rows:
+            tasks.append(task)
+            task = []
+            rows = 0
+    if task:
+        tasks.append(task)
+    return tasks, split
+
+
+def part_filter(responsible, low, high):
+    conditions = ['requests.responsible = ?']
+    params = [responsible]
+    if low is not None:
+        conditions.append('requests.id >= ?')
+        params.append(low)
+    if high is not None:
+        conditions.append('requests.id < ?')
+        params.append(high)
+    return ' AND '.join(conditions), params
+
+
+def part_path(path, part):
+    return f'{path}.{part}.part'
+
+
+def init_worker(db_path):
+    # Своё соединение в каждом процессе: соединения SQLite нельзя передавать между процессами
+    global _conn
+    _conn = db.connect_readonly(db_path)
+
+
+def write_reports(task, now, open_status):
+    # Выполняется в процессе пула. Возвращает число готовых отчётов и сводки частей
+    today = now[:10]
+    written = 0
+    parts = []
+    _conn.execute('BEGIN')
+    try:
+        for responsible, path, low, high, part in task:
+            where, params = part_filter(responsible, low, high)
+            summary = read_summary(_conn, where, params, now, open_status)
+            cursor = _conn.execute(OVERDUE_SQL.format(where=where), (today, *params, open_status, today))
+            if part is None:
+                write_report(path, responsible, now, summary, overdue_lines(cursor))
+                written += 1
+            else:
+                # Строки части начинаются с ключа сортировки: при сборке части сливаются по сроку и id
+                with open(part_path(path, part), 'w', encoding='utf-8') as f:
+                    f.writelines(f'{row[1]}\t{row[0]:012d}\t{line}' for row, line in overdue_rows(cursor))
+                parts.append((responsible, part, summary))
+    finally:
+        _conn.rollback()
+    return written, parts
+
+
+def read_summary(conn, where, params, now, open_status):
+    # Сводка: статусы {код: [подпись, число]} и возраст открытых {код приоритета: [подпись, число, с датой, сумма]}
+    statuses = {code: [label, count] for code, label, count
+                in conn.execute(STATUS_COUNTS_SQL.format(where=where), params)}
+    ages = {code: [label, count, known, total or 0.0] for code, label, count, known, total
+            in conn.execute(OPEN_AGE_SQL.format(where=where), (now, *params, open_status))}
+    return statuses, ages
+
+
+def merge_summary(summary, other):
+    for target, source in zip(summary, other):
+        for code, values in source.items():
+            if code in target:
+                target[code][1:] = [a + b for a, b in zip(target[code][1:], values[1:])]
+            else:
+                target[code] = list(values)
+
+
+def overdue_rows(cursor):
+    while True:
+        rows = cursor.fetchmany(REPORT_BATCH_SIZE)
+        if not rows:
+            break
+        for row in rows:
+            request_id, due_date, days, priority, subject = row
+            # Одна заявка - одна строка отчёта
+            subject = subject.replace('\n', ' ')
+            yield row, f"  #{request_id}  срок {due_date}  просрочено на {days} дн.  {priority}  {subject}\n"
+
+
+def overdue_lines(cursor):
+    return (line for row, line in overdue_rows(cursor))
+
+
+def write_report(path, responsible, now, summary, lines):
+    # Файл переименовывается только после полной записи: прерванный запуск не оставляет неполных отчётов
+    statuses, ages = summary
+    partial = path + '.part'
+    try:
+        with open(partial, 'w', encoding='utf-8') as f:
+            f.write(f"Ответственный: {responsible}\n")
+            f.write(f"Отчёт на: {now}\n\n")
+
+            f.write("Заявки по статусам:\n")
+            for code in sorted(statuses):
+                label, count = statuses[code]
+                f.write(f"  {label}: {count}\n")
+
+            f.write("\nСредний возраст открытых заявок, дней:\n")
+            for code in sorted(ages, reverse=True):
+                label, count, known, total = ages[code]
+                age = f"{total / known:.1f}" if known else "нет данных"
+                f.write(f"  {label}: {age} (заявок: {count})\n")
+
+            f.write("\nПросроченные заявки:\n")
+            overdue = 0
+            for line in lines:
+                f.write(line)
+                overdue += 1
+            f.write(f"Всего просрочено: {overdue}\n")
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+
+def assemble_report(path, responsible, now, summaries, parts):
+    # Отчёт из частей: сводки складываются, списки просроченных сливаются по сроку и id потоком
+    summary = ({}, {})
+    for other in summaries:
+        merge_summary(summary, other)
+    files = [open(part_path(path, part), encoding='utf-8') for part in range(parts)]
+    try:
+        lines = (line.split('\t', 2)[2] for line in heapq.merge(*files))
+        write_report(path, responsible, now, summary, lines)
+    finally:
+        for f in files:
+            f.close()
+        for part in range(parts):
+            os.remove(part_path(path, part))
+
+
+def generate_reports(db_path, out_dir, open_status, workers=None, task_rows=REPORT_TASK_ROWS, progress=None):
+    # Строит отчёты всех ответственных; возвращает их число.
+    # open_status - подпись статуса открытых заявок (requests.OPEN_STATUS): модуль приложения не импортируется,
+    # чтобы процессы пула не загружали tkinter
+    os.makedirs(out_dir, exist_ok=True)
+    conn = db.connect_readonly(db_path)
+    try:
+        # Число заявок и границы частей читаются из одного снимка, как задание в write_reports
+        conn.execute('BEGIN')
+        people = conn.execute('SELECT responsible, COUNT(*) FROM requests GROUP BY responsible').fetchall()
+        paths = report_paths(people, out_dir)
+        tasks, split = plan_tasks(conn, people, paths, task_rows)
+        conn.rollback()
+    finally:
+        conn.close()
+    # Одна дата отчёта для всех процессов
+    now = datetime.datetime.now().isoformat(sep=' ', timespec='seconds')
+    summaries = {responsible: [] for responsible in split}
+    done = 0
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                                    initargs=(db_path,)) as pool:
+            futures = [pool.submit(write_reports, task, now, open_status) for task in tasks]
+            for future in concurrent.futures.as_completed(futures):
+                written, parts = future.result()
+                done += written
+                for responsible, part, summary in parts:
+                    summaries[responsible].append(summary)
+                    if len(summaries[responsible]) == split[responsible]:
+                        assemble_report(paths[responsible], responsible, now, summaries.pop(responsible),
+                                        split[responsible])
+                        done += 1
+                if progress is not None:
+                    progress(done, len(people))
+    except BaseException:
+        # Части несобранных отчётов не остаются в каталоге
+        for responsible in summaries:
+            for part in range(split[responsible]):
+                if os.path.exists(part_path(paths[responsible], part)):
+                    os.remove(part_path(paths[responsible], part))
+        raise
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отчёты о загрузке ответственных, по файлу на каждого")
+    parser.add_argument('out_dir', help="Каталог для отчётов")
+    parser.add_argument('--db', default='requests.db', help="Файл базы данных")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Процессов в пуле")
+    parser.add_argument('--open-status', default="Открыта", help="Подпись статуса открытых заявок")
+    parser.add_argument('--task-rows', type=int, default=REPORT_TASK_ROWS, help="Заявок на одно задание пула")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"база не найдена: {args.db}")
+
+    printed = 0
+
+    def progress(done, total):
+        nonlocal printed
+        if done - printed >= 1000 or done == total:
+            printed = done
+            print(f"Отчётов: {done} из {total}", file=sys.stderr)
+
+    start = time.perf_counter()
+    try:
+        count = generate_reports(args.db, args.out_dir, args.open_status, max(1, args.workers),
+                                 max(1, args.task_rows), progress)
+    except Exception as e:
+        print(f"Error generating reports: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Отчётов: {count}, время: {time.perf_counter() - start:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,93 +1,883 @@
+import concurrent.futures
+import datetime
 import os
-import sqlite3
+import re
 import tkinter as tk
+from tkinter import filedialog
 from tkinter import messagebox
 from tkinter import ttk
-from tkcalendar import DateEntry
+
+import db
+import exporter
+import metrics
+from widgets import (Autocomplete, DeadlineScheduler, Debouncer, MetricsWindow, PagedTreeLoader, ReusableDialog,
+                     StatusBar, TreeDelta)
+from prefixindex import PrefixIndex
+from rowstore import RowStore
+from worker import QueryWorker, WriteQueue
+
+DB_PATH = 'requests.db'
+
+# Клиент локального сервиса (service.py): при APP_SERVICE_URL заявки читаются и изменяются
+# через сервис, а не в базе напрямую
+SERVICE = None
+
+# Сколько строк подгружается в таблицу за один раз
+PAGE_SIZE = 100
+
+# Максимум строк в результатах поиска
+SEARCH_LIMIT = 500
+
+# Задержка поиска при вводе текста, мс
+SEARCH_DELAY = 300
+
+# Сколько id передаётся в одном DELETE ... WHERE id IN (...) при массовом удалении
+# (и в одном запросе изменённых заявок по журналу изменений)
+DELETE_BATCH_SIZE = 500
+
+# Сколько свободных страниц возвращается файлу базы за один шаг и пауза между шагами, мс
+VACUUM_STEP_PAGES = 1000
+VACUUM_STEP_DELAY = 50
+
+# Как часто открытое окно проверяет изменения других операторов, мс, и сколько записей
+# журнала изменений хранится
+CHANGE_POLL_INTERVAL = 1000
+CHANGE_LOG_KEEP = 10000
+
+# Через сколько проверок окно очищает журнал изменений от записей сверх CHANGE_LOG_KEEP (около минуты)
+CHANGE_PRUNE_POLLS = 60
+
+# За сколько дней до плановой даты открытая заявка подсвечивается как срочная
+DUE_SOON_DAYS = 2
+
+# Допустимые значения полей заявки
+PRIORITIES = ["Низкий", "Средний", "Высокий"]
+REQUEST_TYPES = ["Инцидент", "Обслуживание"]
+STATUSES = ["Открыта", "Закрыта"]
+
+# Статус, заявки с которым считаются открытыми (и просроченными, если плановая дата прошла)
+OPEN_STATUS = "Открыта"
+
+# Столбцы, заполняемые при добавлении заявки
+REQUEST_COLUMNS = ('subject', 'priority', 'request_type', 'description', 'due_date', 'responsible', 'status')
+
+# Столбцы строки requests_view и столбцы с повторяющимися значениями, которые хранятся без повторов
+REQUEST_FIELDS = ('id',) + REQUEST_COLUMNS
+REQUEST_INTERNED = ('priority', 'request_type', 'due_date', 'responsible', 'status')
+
+# Подписи приоритета, типа и статуса переводятся в коды справочников;
+# неизвестная подпись даёт NULL и отклоняется ограничением NOT NULL
+INSERT_REQUEST_TEMPLATE = '''
+    INSERT INTO requests (subject, priority, request_type, description, due_date, responsible, status, created_at) 
+    VALUES (?, (SELECT code FROM priorities WHERE label = ?), (SELECT code FROM request_types WHERE label = ?),
+            ?, ?, ?, (SELECT code FROM statuses WHERE label = ?), {created_at})
+'''
+INSERT_REQUEST_SQL = INSERT_REQUEST_TEMPLATE.format(created_at="datetime('now', 'localtime')")
+# С заданным временем создания последним параметром - для синтетических данных (sampledata.py)
+INSERT_REQUEST_CREATED_SQL = INSERT_REQUEST_TEMPLATE.format(created_at='?')
 
 
 # Функции работы с базой данных
 def create_db():
     try:
-        conn = sqlite3.connect('requests.db')
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS requests (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                subject TEXT NOT NULL,
-                priority TEXT NOT NULL,
-                request_type TEXT NOT NULL,
-                description TEXT NOT NULL,
-                due_date TEXT NOT NULL,
-                responsible TEXT NOT NULL,
-                status TEXT NOT NULL
-            )
-        ''')
+        conn = db.get_connection(DB_PATH)
+        with conn:
+            cursor = conn.cursor()
 
-        conn.commit()
-        conn.close()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS requests (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    subject TEXT NOT NULL,
+                    priority TEXT NOT NULL,
+                    request_type TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    due_date TEXT NOT NULL,
+                    responsible TEXT NOT NULL,
+                    status TEXT NOT NULL
+                )
+            ''')
+
+        db.migrate(conn, MIGRATIONS)
+        with conn:
+            prune_request_changes(conn.cursor())
     except Exception as e:
         print(f"Error creating database: {e}")
+        return
+    enable_vacuum()
 
-def add_request(subject, priority, request_type, description, due_date, responsible, status):
+def enable_vacuum():
+    # Однократный VACUUM при переходе на incremental_vacuum - уже после миграций и отдельно от них:
+    # его ошибка (нет места на диске, база занята другим процессом) не оставляет схему старой
     try:
-        conn = sqlite3.connect('requests.db')
-        cursor = conn.cursor()
-
+        db.enable_incremental_vacuum(db.get_connection(DB_PATH))
+    except Exception as e:
+        print(f"Error enabling incremental vacuum: {e}")
+
+def prune_request_changes(cursor):
+    # Журнал изменений хранит только последние CHANGE_LOG_KEEP записей; отставшее сильнее окно
+    # перезагружает таблицу целиком. Выполняется в открытой транзакции: при запуске, периодически
+    # через очередь записи окна и после каждого пакета записей сервиса
+    cursor.execute('''
+        DELETE FROM request_changes
+        WHERE seq <= (SELECT MAX(seq) FROM request_changes) - ?
+    ''', (CHANGE_LOG_KEEP,))
+
+def change_log_seq(cursor):
+    # Последний выданный номер журнала изменений (AUTOINCREMENT хранит его и после очистки журнала)
+    row = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'request_changes'").fetchone()
+    return row[0] if row else 0
+
+def logged_write(cursor, fn, *args):
+    # Запись очереди окна вместе с номерами журнала, которые она добавила: (результат, (после, до)).
+    # Очередь пишет в транзакции BEGIN IMMEDIATE, поэтому номера между двумя чтениями - только её
+    first = change_log_seq(cursor)
+    result = fn(cursor, *args)
+    return result, (first, change_log_seq(cursor))
+
+# Миграции схемы (номер версии хранится в PRAGMA user_version)
+def migrate_v1_fulltext(cursor):
+    # Полнотекстовый индекс по теме и описанию, синхронизируемый триггерами
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS requests_fts USING fts5(
+            subject, description, content='requests', content_rowid='id', prefix='2 3'
+        )
+    ''')
+    create_fulltext_triggers(cursor)
+    # Индексируем заявки, уже сохранённые в существующем requests.db
+    cursor.execute("INSERT INTO requests_fts (requests_fts) VALUES ('rebuild')")
+
+def create_fulltext_triggers(cursor):
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS requests_fts_insert AFTER INSERT ON requests BEGIN
+            INSERT INTO requests_fts (rowid, subject, description) VALUES (new.id, new.subject, new.description);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS requests_fts_delete AFTER DELETE ON requests BEGIN
+            INSERT INTO requests_fts (requests_fts, rowid, subject, description)
+            VALUES ('delete', old.id, old.subject, old.description);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS requests_fts_update AFTER UPDATE OF subject, description ON requests BEGIN
+            INSERT INTO requests_fts (requests_fts, rowid, subject, description)
+            VALUES ('delete', old.id, old.subject, old.description);
+            INSERT INTO requests_fts (rowid, subject, description) VALUES (new.id, new.subject, new.description);
+        END
+    ''')
+
+def migrate_v2_coded_fields(cursor):
+    # Приоритет, тип и статус хранятся небольшими целыми кодами со справочниками,
+    # а частые фильтры получают вторичные индексы. Порядок кодов приоритета совпадает с его важностью.
+    for table, labels in (('priorities', PRIORITIES), ('request_types', REQUEST_TYPES), ('statuses', STATUSES)):
+        cursor.execute(f'''
+            CREATE TABLE {table} (
+                code INTEGER PRIMARY KEY,
+                label TEXT NOT NULL UNIQUE
+            )
+        ''')
+        cursor.executemany(f'INSERT INTO {table} (code, label) VALUES (?, ?)',
+                           [(code, label) for code, label in enumerate(labels, 1)])
+
+    # Значения, введённые вручную вне списков, тоже получают коды, чтобы ни одна заявка не потерялась
+    cursor.execute('INSERT OR IGNORE INTO priorities (label) SELECT DISTINCT priority FROM requests')
+    cursor.execute('INSERT OR IGNORE INTO request_types (label) SELECT DISTINCT request_type FROM requests')
+    cursor.execute('INSERT OR IGNORE INTO statuses (label) SELECT DISTINCT status FROM requests')
+
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'requests'")
+    sequence = cursor.fetchone()
+
+    cursor.execute('''
+        CREATE TABLE requests_v2 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject TEXT NOT NULL,
+            priority INTEGER NOT NULL REFERENCES priorities (code),
+            request_type INTEGER NOT NULL REFERENCES request_types (code),
+            description TEXT NOT NULL,
+            due_date TEXT NOT NULL,
+            responsible TEXT NOT NULL,
+            status INTEGER NOT NULL REFERENCES statuses (code)
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO requests_v2 (id, subject, priority, request_type, description, due_date, responsible, status)
+        SELECT requests.id, requests.subject, priorities.code, request_types.code, requests.description,
+               requests.due_date, requests.responsible, statuses.code
+        FROM requests
+        JOIN priorities ON priorities.label = requests.priority
+        JOIN request_types ON request_types.label = requests.request_type
+        JOIN statuses ON statuses.label = requests.status
+    ''')
+    cursor.execute('DROP TABLE requests')
+    cursor.execute('ALTER TABLE requests_v2 RENAME TO requests')
+    if sequence:
+        # Счётчик AUTOINCREMENT не должен повторно выдать id удалённых заявок
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'requests'")
         cursor.execute('''
-            INSERT INTO requests (subject, priority, request_type, description, due_date, responsible, status) 
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (subject, priority, request_type, description, due_date, responsible, status))
+            INSERT INTO sqlite_sequence (name, seq)
+            VALUES ('requests', MAX(?, (SELECT IFNULL(MAX(id), 0) FROM requests)))
+        ''', sequence)
+
+    # Триггеры полнотекстового индекса удалены вместе со старой таблицей; id не изменились,
+    # поэтому сам индекс остаётся верным
+    create_fulltext_triggers(cursor)
+
+    # Составной индекс обслуживает и фильтр по статусу, и выборку открытых заявок по плановой дате
+    cursor.execute('CREATE INDEX idx_requests_status_due_date ON requests (status, due_date)')
+    cursor.execute('CREATE INDEX idx_requests_priority ON requests (priority)')
+    cursor.execute('CREATE INDEX idx_requests_due_date ON requests (due_date)')
+    cursor.execute('CREATE INDEX idx_requests_responsible ON requests (responsible)')
+
+    # Представление с подписями вместо кодов: столбцы в прежнем порядке, интерфейс их и показывает.
+    # LEFT JOIN по первичному ключу SQLite пропускает, если подпись в запросе не нужна
+    cursor.execute('''
+        CREATE VIEW requests_view AS
+        SELECT requests.id, requests.subject, priorities.label AS priority, request_types.label AS request_type,
+               requests.description, requests.due_date, requests.responsible, statuses.label AS status
+        FROM requests
+        LEFT JOIN priorities ON priorities.code = requests.priority
+        LEFT JOIN request_types ON request_types.code = requests.request_type
+        LEFT JOIN statuses ON statuses.code = requests.status
+    ''')
+
+    # Статистика для планировщика, чтобы он выбирал подходящий индекс. Собирается только по заявкам:
+    # статистика служебных таблиц полнотекстового индекса, снятая с пустой базы, замедляет вставку
+    cursor.execute('ANALYZE requests')
+
+def migrate_v3_fulltext_stats(cursor):
+    # Убирает статистику служебных таблиц requests_fts, записанную прежним ANALYZE по всей базе:
+    # с ней планировщик выбирает для внутренних запросов индекса полный просмотр,
+    # и каждая вставка становится тем медленнее, чем больше заявок
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+    if cursor.fetchone():
+        cursor.execute("DELETE FROM sqlite_stat1 WHERE tbl LIKE 'requests_fts%'")
+        # Перечитывает статистику в уже открытых соединениях
+        cursor.execute('ANALYZE sqlite_master')
+
+# Сводные таблицы для панели показателей поддерживаются триггерами: строка заявки
+# добавляется в свою группу (new) и вычитается из прежней (old)
+STATS_ADD_SQL = '''
+    INSERT INTO request_stats (priority, request_type, responsible, status, count)
+    VALUES ({row}.priority, {row}.request_type, {row}.responsible, {row}.status, 1)
+    ON CONFLICT (priority, request_type, responsible, status) DO UPDATE SET count = count + 1;
+    INSERT INTO request_due_stats (due_date, priority, request_type, count)
+    SELECT {row}.due_date, {row}.priority, {row}.request_type, 1
+    WHERE {row}.status = (SELECT code FROM statuses WHERE label = '{open_status}')
+    ON CONFLICT (due_date, priority, request_type) DO UPDATE SET count = count + 1;
+'''
+
+STATS_REMOVE_SQL = '''
+    UPDATE request_stats SET count = count - 1
+    WHERE priority = {row}.priority AND request_type = {row}.request_type
+      AND responsible = {row}.responsible AND status = {row}.status;
+    DELETE FROM request_stats
+    WHERE priority = {row}.priority AND request_type = {row}.request_type
+      AND responsible = {row}.responsible AND status = {row}.status AND count <= 0;
+    UPDATE request_due_stats SET count = count - 1
+    WHERE due_date = {row}.due_date AND priority = {row}.priority AND request_type = {row}.request_type
+      AND {row}.status = (SELECT code FROM statuses WHERE label = '{open_status}');
+    DELETE FROM request_due_stats
+    WHERE due_date = {row}.due_date AND priority = {row}.priority AND request_type = {row}.request_type
+      AND count <= 0;
+'''
+
+# Открытые заявки ответственного по плановой дате (с версии 9) - те же триггеры, вторая часть тела
+DUE_BY_RESPONSIBLE_ADD_SQL = '''
+    INSERT INTO request_responsible_due_stats (responsible, due_date, count)
+    SELECT {row}.responsible, {row}.due_date, 1
+    WHERE {row}.status = (SELECT code FROM statuses WHERE label = '{open_status}')
+    ON CONFLICT (responsible, due_date) DO UPDATE SET count = count + 1;
+'''
+
+DUE_BY_RESPONSIBLE_REMOVE_SQL = '''
+    UPDATE request_responsible_due_stats SET count = count - 1
+    WHERE responsible = {row}.responsible AND due_date = {row}.due_date
+      AND {row}.status = (SELECT code FROM statuses WHERE label = '{open_status}');
+    DELETE FROM request_responsible_due_stats
+    WHERE responsible = {row}.responsible AND due_date = {row}.due_date AND count <= 0;
+'''
+
+# Пересчёт сводных таблиц с нуля: (таблица, запрос с GROUP BY по заявкам)
+STATS_QUERIES = (
+    ('request_stats', '''
+        SELECT priority, request_type, responsible, status, COUNT(*) FROM requests
+        GROUP BY priority, request_type, responsible, status
+    '''),
+    ('request_due_stats', f'''
+        SELECT due_date, priority, request_type, COUNT(*) FROM requests
+        WHERE status = (SELECT code FROM statuses WHERE label = '{OPEN_STATUS}')
+        GROUP BY due_date, priority, request_type
+    '''),
+    ('request_responsible_due_stats', f'''
+        SELECT responsible, due_date, COUNT(*) FROM requests
+        WHERE status = (SELECT code FROM statuses WHERE label = '{OPEN_STATUS}')
+        GROUP BY responsible, due_date
+    '''),
+)
+
+def create_stats_triggers(cursor, add_sql, remove_sql):
+    add_new = add_sql.format(row='new', open_status=OPEN_STATUS)
+    remove_old = remove_sql.format(row='old', open_status=OPEN_STATUS)
+    cursor.execute(f'CREATE TRIGGER request_stats_insert AFTER INSERT ON requests BEGIN {add_new} END')
+    cursor.execute(f'CREATE TRIGGER request_stats_delete AFTER DELETE ON requests BEGIN {remove_old} END')
+    cursor.execute(f'''
+        CREATE TRIGGER request_stats_update
+        AFTER UPDATE OF priority, request_type, responsible, status, due_date ON requests
+        BEGIN {remove_old} {add_new} END
+    ''')
+
+def migrate_v4_request_stats(cursor):
+    # Число заявок в каждой группе (приоритет, тип, ответственный, статус)
+    cursor.execute('''
+        CREATE TABLE request_stats (
+            priority INTEGER NOT NULL,
+            request_type INTEGER NOT NULL,
+            responsible TEXT NOT NULL,
+            status INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (priority, request_type, responsible, status)
+        ) WITHOUT ROWID
+    ''')
+    # Открытые заявки по плановой дате: просроченные - сумма по датам раньше сегодняшней
+    cursor.execute('''
+        CREATE TABLE request_due_stats (
+            due_date TEXT NOT NULL,
+            priority INTEGER NOT NULL,
+            request_type INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (due_date, priority, request_type)
+        ) WITHOUT ROWID
+    ''')
+    create_stats_triggers(cursor, STATS_ADD_SQL, STATS_REMOVE_SQL)
+    rebuild_request_stats(cursor, ('request_stats', 'request_due_stats'))
+
+def migrate_v5_change_log(cursor):
+    # Журнал изменений для открытых окон: номер seq только растёт (AUTOINCREMENT не переиспользует
+    # номера после очистки), поэтому клиент запрашивает всё, что появилось после последнего номера
+    cursor.execute('''
+        CREATE TABLE request_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            request_id INTEGER NOT NULL,
+            op TEXT NOT NULL
+        )
+    ''')
+    for op, event, row in (('insert', 'INSERT', 'new'), ('update', 'UPDATE', 'new'), ('delete', 'DELETE', 'old')):
+        cursor.execute(f'''
+            CREATE TRIGGER request_changes_{op} AFTER {event} ON requests BEGIN
+                INSERT INTO request_changes (request_id, op) VALUES ({row}.id, '{op}');
+            END
+        ''')
 
-        conn.commit()
-        conn.close()
-        messagebox.showinfo("Успех", "Заявка успешно добавлена!")
-    except Exception as e:
-        print(f"Error adding request: {e}")
-        messagebox.showerror("Ошибка", f"Ошибка при добавлении заявки: {e}")
+def migrate_v6_created_at(cursor):
+    # Время создания заявки - для возраста заявок в отчётах (reports.py); заполняет INSERT_REQUEST_SQL.
+    # У заявок, созданных до этой версии, оно неизвестно: NULL, и в среднем возрасте они не учитываются
+    cursor.execute('ALTER TABLE requests ADD COLUMN created_at TEXT')
+
+def migrate_v7_priority_due_date_index(cursor):
+    # Отдельный индекс приоритета малоизбирателен: страница с фильтром по приоритету вместо короткого
+    # просмотра таблицы читала строки вразброс по индексу, а сортировка по сроку всё равно шла через
+    # временное B-дерево. Составной индекс отдаёт страницу "приоритет + сортировка по сроку" готовым
+    # отрезком и покрывает подсчёт по приоритету; страница по id снова читается просмотром таблицы
+    cursor.execute('DROP INDEX IF EXISTS idx_requests_priority')
+    cursor.execute('CREATE INDEX idx_requests_priority_due_date ON requests (priority, due_date)')
+    cursor.execute('ANALYZE requests')
+
+def migrate_v8_sort_indexes(cursor):
+    # Индексы для сортировки по теме и типу: страница с ключом (столбец, id) читается отрезком индекса
+    # без сортировки всей таблицы. id - rowid таблицы и уже входит в каждый индекс последним столбцом
+    cursor.execute('CREATE INDEX idx_requests_subject ON requests (subject)')
+    cursor.execute('CREATE INDEX idx_requests_request_type ON requests (request_type)')
+    cursor.execute('ANALYZE requests')
+
+def migrate_v9_overdue_by_responsible(cursor):
+    # Открытые заявки по ответственному и плановой дате: просрочка ответственного - сумма по датам
+    # раньше сегодняшней, отрезок первичного ключа. Триггеры сводных таблиц пересоздаются с этой частью
+    cursor.execute('''
+        CREATE TABLE request_responsible_due_stats (
+            responsible TEXT NOT NULL,
+            due_date TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (responsible, due_date)
+        ) WITHOUT ROWID
+    ''')
+    for event in ('insert', 'delete', 'update'):
+        cursor.execute(f'DROP TRIGGER request_stats_{event}')
+    create_stats_triggers(cursor, STATS_ADD_SQL + DUE_BY_RESPONSIBLE_ADD_SQL,
+                          STATS_REMOVE_SQL + DUE_BY_RESPONSIBLE_REMOVE_SQL)
+    rebuild_request_stats(cursor, ('request_responsible_due_stats',))
+
+MIGRATIONS = [
+    (1, migrate_v1_fulltext),
+    (2, migrate_v2_coded_fields),
+    (3, migrate_v3_fulltext_stats),
+    (4, migrate_v4_request_stats),
+    (5, migrate_v5_change_log),
+    (6, migrate_v6_created_at),
+    (7, migrate_v7_priority_due_date_index),
+    (8, migrate_v8_sort_indexes),
+    (9, migrate_v9_overdue_by_responsible),
+]
+
+def rebuild_request_stats(cursor, tables=None):
+    # tables - только эти сводные таблицы (миграция создаёт их не все сразу); None - все
+    for table, query in STATS_QUERIES:
+        if tables is not None and table not in tables:
+            continue
+        cursor.execute(f'DELETE FROM {table}')
+        cursor.execute(f'INSERT INTO {table} {query}')
+
+def insert_request(cursor, values):
+    # Добавляет заявку в открытой транзакции; values - в порядке REQUEST_COLUMNS. Возвращает строку requests_view
+    cursor.execute(INSERT_REQUEST_SQL, values)
+    cursor.execute('SELECT * FROM requests_view WHERE id = ?', (cursor.lastrowid,))
+    return cursor.fetchone()
+
+def remove_requests(cursor, request_ids):
+    # Удаляет заявки в открытой транзакции, передавая id пакетами; возвращает id удалённых
+    deleted = []
+    for start in range(0, len(request_ids), DELETE_BATCH_SIZE):
+        batch = request_ids[start:start + DELETE_BATCH_SIZE]
+        placeholders = ', '.join('?' * len(batch))
+        cursor.execute(f'DELETE FROM requests WHERE id IN ({placeholders}) RETURNING id', batch)
+        deleted.extend(row[0] for row in cursor.fetchall())
+    return deleted
+
+def remove_requests_by_filter(cursor, filters):
+    # Удаляет в открытой транзакции все заявки, подходящие под фильтры, одним запросом; возвращает id удалённых
+    conditions, params = request_filter_conditions(filters)
+    if not conditions:
+        raise ValueError("фильтр не задан: удаление всех заявок не выполняется")
+    cursor.execute(f"DELETE FROM requests WHERE {' AND '.join(conditions)} RETURNING id", params)
+    return [row[0] for row in cursor.fetchall()]
+
+# Записи одной транзакцией (в режиме клиента - через сервис) для пакетных скриптов и бенчмарков.
+# Ошибки не перехватываются: о них сообщает вызывающий, окно - в строке состояния
+@metrics.timed
+def add_request(subject, priority, request_type, description, due_date, responsible, status):
+    # Возвращает строку requests_view новой заявки
+    values = (subject, priority, request_type, description, due_date, responsible, status)
+    if SERVICE is not None:
+        return SERVICE.add_request(dict(zip(REQUEST_COLUMNS, values)))
+    conn = db.get_connection(DB_PATH)
+    with conn:
+        return insert_request(conn.cursor(), values)
+
+def validate_request(record):
+    # Проверяет запись (словарь полей) и возвращает значения в порядке REQUEST_COLUMNS
+    values = {}
+    for column in REQUEST_COLUMNS:
+        value = record.get(column)
+        value = '' if value is None else str(value).strip()
+        if not value:
+            raise ValueError(f"поле {column} обязательно для заполнения")
+        values[column] = value
+
+    if values['priority'] not in PRIORITIES:
+        raise ValueError(f"недопустимый приоритет: {values['priority']}")
+    if values['request_type'] not in REQUEST_TYPES:
+        raise ValueError(f"недопустимый тип: {values['request_type']}")
+    if values['status'] not in STATUSES:
+        raise ValueError(f"недопустимый статус: {values['status']}")
+    try:
+        values['due_date'] = datetime.date.fromisoformat(values['due_date']).isoformat()
+    except ValueError:
+        raise ValueError(f"дата должна быть в формате ГГГГ-ММ-ДД: {values['due_date']}")
+
+    return tuple(values[column] for column in REQUEST_COLUMNS)
 
+@metrics.timed
 def view_requests():
     try:
-        conn = sqlite3.connect('requests.db')
-        cursor = conn.cursor()
+        rows = db.fetchall_cached(DB_PATH, 'SELECT * FROM requests_view')
 
-        cursor.execute('SELECT * FROM requests')
-        rows = cursor.fetchall()
+        return rows
+    except Exception as e:
+        print(f"Error viewing requests: {e}")
+        return []
+
+# Столбцы таблицы, по которым возможна сортировка на стороне базы. Приоритет, тип и статус
+# сортируются по коду, поэтому приоритет упорядочен по важности, а не по алфавиту подписи
+SORT_COLUMNS = {
+    'id': 'requests.id',
+    'subject': 'requests.subject',
+    'priority': 'requests.priority',
+    'request_type': 'requests.request_type',
+    'due_date': 'requests.due_date',
+    'responsible': 'requests.responsible',
+    'status': 'requests.status',
+}
+
+# Ключи фильтров request_filter_conditions
+FILTER_KEYS = ('status', 'priority', 'responsible', 'due_from', 'due_to')
+
+def request_filter_conditions(filters):
+    # Условия WHERE и параметры для фильтров: status, priority, responsible, due_from, due_to.
+    # Подписи статуса и приоритета переводятся в коды, чтобы сработали индексы по кодам
+    conditions = []
+    params = []
+    filters = filters or {}
+    if filters.get('status'):
+        conditions.append('requests.status = (SELECT code FROM statuses WHERE label = ?)')
+        params.append(filters['status'])
+    if filters.get('priority'):
+        conditions.append('requests.priority = (SELECT code FROM priorities WHERE label = ?)')
+        params.append(filters['priority'])
+    if filters.get('responsible'):
+        conditions.append('requests.responsible = ?')
+        params.append(filters['responsible'])
+    if filters.get('due_from'):
+        conditions.append('requests.due_date >= ?')
+        params.append(filters['due_from'])
+    if filters.get('due_to'):
+        conditions.append('requests.due_date <= ?')
+        params.append(filters['due_to'])
+    return conditions, params
+
+@metrics.timed
+def query_requests(filters=None, order_by='id', descending=False, after=None, limit=PAGE_SIZE):
+    # Страница заявок с фильтрами и сортировкой. Последним столбцом строки идёт ключ сортировки:
+    # следующая страница продолжается после строки after по паре (ключ, id) без OFFSET
+    try:
+        if SERVICE is not None:
+            return SERVICE.query_requests(filters, order_by, descending, after, limit)
+        column = SORT_COLUMNS[order_by]
+        direction = 'DESC' if descending else 'ASC'
+        conditions, params = request_filter_conditions(filters)
+        if after is not None:
+            if order_by == 'id':
+                conditions.append(f"requests.id {'<' if descending else '>'} ?")
+                params.append(after[0])
+            else:
+                conditions.append(f"({column}, requests.id) {'<' if descending else '>'} (?, ?)")
+                params.extend((after[-1], after[0]))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        rows = db.fetchall_cached(DB_PATH, f'''
+            SELECT requests_view.*, {column} FROM requests
+            JOIN requests_view ON requests_view.id = requests.id
+            {where}
+            ORDER BY {column} {direction}, requests.id {direction}
+            LIMIT ?
+        ''', (*params, limit))
 
-        conn.close()
         return rows
     except Exception as e:
         print(f"Error viewing requests: {e}")
         return []
 
-def search_requests(subject):
+@metrics.timed
+def request_changes(since, filters=None, text='', skip=()):
+    # Изменения после номера since по журналу: (последний номер, строки, удалённые id).
+    # Строки - изменённые заявки, подходящие под фильтры и поисковый запрос text; изменённые заявки,
+    # которые больше под них не подходят, попадают в удалённые. skip - отрезки номеров (после, до]
+    # собственных записей окна, уже применённых к таблице. None - нужные записи журнала уже очищены
+    # и таблицу надо перезагрузить целиком.
+    try:
+        if SERVICE is not None:
+            return SERVICE.request_changes(since, filters, text, skip)
+        conn = db.get_connection(DB_PATH)
+        if since is None:
+            return conn.execute('SELECT MAX(seq) FROM request_changes').fetchone()[0] or 0, [], []
+        oldest = conn.execute('SELECT MIN(seq) FROM request_changes').fetchone()[0]
+        if oldest is not None and oldest > since + 1:
+            return None
+        # Верхняя граница читается первой: запись, появившаяся между запросами, войдёт в следующую проверку
+        last = conn.execute('SELECT MAX(seq) FROM request_changes').fetchone()[0]
+        if last is None or last <= since:
+            return since, [], []
+        skipped = ''.join(' AND NOT (seq > ? AND seq <= ?)' for span in skip)
+        changes = conn.execute(f'''
+            SELECT MAX(seq), request_id FROM request_changes WHERE seq > ? AND seq <= ?{skipped}
+            GROUP BY request_id
+        ''', (since, last, *(seq for span in skip for seq in span))).fetchall()
+        if not changes:
+            return last, [], []
+        ids = [request_id for seq, request_id in changes]
+
+        conditions, params = request_filter_conditions(filters)
+        query = fulltext_query(text)
+        if query:
+            # Изменённая заявка из результатов поиска, переставшая ему соответствовать, убирается из таблицы
+            conditions.append('requests.id IN (SELECT rowid FROM requests_fts WHERE requests_fts MATCH ?)')
+            params.append(query)
+        where = ''.join(f' AND {condition}' for condition in conditions)
+        rows = []
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            batch = ids[start:start + DELETE_BATCH_SIZE]
+            placeholders = ', '.join('?' * len(batch))
+            rows += conn.execute(f'''
+                SELECT requests_view.* FROM requests
+                JOIN requests_view ON requests_view.id = requests.id
+                WHERE requests.id IN ({placeholders}){where}
+            ''', (*batch, *params)).fetchall()
+        found = {row[0] for row in rows}
+        return last, rows, [request_id for request_id in ids if request_id not in found]
+    except Exception as e:
+        print(f"Error reading request changes: {e}")
+        return since, [], []
+
+def deadline_state(due_date, status, today=None):
+    # 'overdue' - плановая дата открытой заявки прошла, 'due_soon' - до неё не больше DUE_SOON_DAYS дней
+    if status != OPEN_STATUS:
+        return None
+    today = today or datetime.date.today()
+    if due_date < today.isoformat():
+        return 'overdue'
+    if due_date <= (today + datetime.timedelta(days=DUE_SOON_DAYS)).isoformat():
+        return 'due_soon'
+    return None
+
+def deadline_events(due_date, today=None):
+    # Моменты (местная полночь), когда состояние срока открытой заявки изменится: (время, состояние)
+    today = today or datetime.date.today()
+    due = datetime.date.fromisoformat(due_date)
+    events = []
+    for date, state in ((due - datetime.timedelta(days=DUE_SOON_DAYS), 'due_soon'),
+                        (due + datetime.timedelta(days=1), 'overdue')):
+        if date > today:
+            events.append((datetime.datetime.combine(date, datetime.time.min).timestamp(), state))
+    return events
+
+@metrics.timed
+def open_request_deadlines(request_ids=None):
+    # Плановые даты открытых заявок по индексу (status, due_date): всех ещё не просроченных
+    # или только заявок из request_ids (после их изменения)
     try:
-        conn = sqlite3.connect('requests.db')
-        cursor = conn.cursor()
+        if SERVICE is not None:
+            return SERVICE.open_request_deadlines(request_ids)
+        conn = db.get_connection(DB_PATH)
+        status = 'requests.status = (SELECT code FROM statuses WHERE label = ?)'
+        if request_ids is None:
+            return conn.execute(f'SELECT id, due_date FROM requests WHERE {status} AND due_date >= ?',
+                                (OPEN_STATUS, datetime.date.today().isoformat())).fetchall()
+        rows = []
+        for start in range(0, len(request_ids), DELETE_BATCH_SIZE):
+            batch = request_ids[start:start + DELETE_BATCH_SIZE]
+            placeholders = ', '.join('?' * len(batch))
+            rows += conn.execute(f'SELECT id, due_date FROM requests WHERE {status} AND id IN ({placeholders})',
+                                 (OPEN_STATUS, *batch)).fetchall()
 
-        cursor.execute('SELECT * FROM requests WHERE subject LIKE ?', ('%' + subject + '%',))
-        rows = cursor.fetchall()
+        return rows
+    except Exception as e:
+        print(f"Error reading request deadlines: {e}")
+        return []
+
+def responsible_counts():
+    # Ответственные и число их заявок - для подсказок в диалоге создания.
+    # Группировка читает только индекс idx_requests_responsible, без строк таблицы
+    try:
+        if SERVICE is not None:
+            return SERVICE.responsible_counts()
+        conn = db.get_connection(DB_PATH)
+        return conn.execute('SELECT responsible, COUNT(*) FROM requests GROUP BY responsible').fetchall()
+    except Exception as e:
+        print(f"Error reading responsibles: {e}")
+        return []
+
+@metrics.timed
+def get_request_by_id(request_id):
+    try:
+        if SERVICE is not None:
+            return SERVICE.get_request_by_id(request_id)
+        row = db.fetchone_cached(DB_PATH, 'SELECT * FROM requests_view WHERE id = ?', (request_id,))
+
+        return row
+    except Exception as e:
+        print(f"Error retrieving request: {e}")
+        return None
+
+def fulltext_query(text):
+    # Каждое слово ищется по префиксу: "сер" найдёт "сервер" и "сервис"
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+@metrics.timed
+def search_requests(text, filters=None, limit=SEARCH_LIMIT):
+    try:
+        query = fulltext_query(text)
+        if not query:
+            return []
+        if SERVICE is not None:
+            return SERVICE.search_requests(text, filters, limit)
+
+        # Фильтры панели применяются и к результатам поиска
+        conditions, params = request_filter_conditions(filters)
+        where = ''.join(f' AND {condition}' for condition in conditions)
+
+        # Тема весит вдвое больше описания; лучшие совпадения по bm25 идут первыми
+        rows = db.fetchall_cached(DB_PATH, f'''
+            SELECT requests_view.* FROM requests_fts
+            JOIN requests ON requests.id = requests_fts.rowid
+            JOIN requests_view ON requests_view.id = requests_fts.rowid
+            WHERE requests_fts MATCH ?{where}
+            ORDER BY bm25(requests_fts, 2.0, 1.0)
+            LIMIT ?
+        ''', (query, *params, limit))
 
-        conn.close()
         return rows
     except Exception as e:
+        # Поиск, прерванный окном ради более нового, передаётся QueryWorker: тот отбрасывает его молча
+        if db.is_interrupted(e):
+            raise
         print(f"Error searching requests: {e}")
         return []
 
+@metrics.timed
+def export_requests(path, filters=None, order_by='id', descending=False, text='',
+                    fmt=None, batch_size=exporter.EXPORT_BATCH_SIZE, progress=None):
+    # Потоковая выгрузка заявок в том же виде, что и в таблице: с фильтрами, сортировкой
+    # или результатами поиска (без ограничения SEARCH_LIMIT); возвращает число строк
+    try:
+        conditions, params = request_filter_conditions(filters)
+        query = fulltext_query(text)
+        if query:
+            where = ''.join(f' AND {condition}' for condition in conditions)
+            sql = f'''
+                SELECT requests_view.* FROM requests_fts
+                JOIN requests ON requests.id = requests_fts.rowid
+                JOIN requests_view ON requests_view.id = requests_fts.rowid
+                WHERE requests_fts MATCH ?{where}
+                ORDER BY bm25(requests_fts, 2.0, 1.0)
+            '''
+            params = [query, *params]
+        else:
+            column = SORT_COLUMNS[order_by]
+            direction = 'DESC' if descending else 'ASC'
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+            sql = f'''
+                SELECT requests_view.* FROM requests
+                JOIN requests_view ON requests_view.id = requests.id
+                {where}
+                ORDER BY {column} {direction}, requests.id {direction}
+            '''
+
+        return exporter.export_rows(DB_PATH, sql, params, path, fmt, batch_size, progress)
+    except Exception as e:
+        print(f"Error exporting requests: {e}")
+        return None
+
+@metrics.timed
 def delete_request(request_id):
+    # True, если заявка была найдена и удалена
+    return bool(delete_requests([request_id]))
+
+@metrics.timed
+def delete_requests(request_ids):
+    # Удаляет выбранные заявки одной транзакцией, передавая id пакетами; возвращает id удалённых
+    if SERVICE is not None:
+        return SERVICE.delete_requests(request_ids)
+    conn = db.get_connection(DB_PATH)
+    with conn:
+        return remove_requests(conn.cursor(), request_ids)
+
+def service_write(fn, *args):
+    # Запись через сервис в фоновом потоке окна. Результат - в том же виде, что у очереди записи:
+    # Future с парой (результат, отрезок журнала); fn - метод ServiceClient, возвращающий такую пару
+    future = concurrent.futures.Future()
     try:
-        conn = sqlite3.connect('requests.db')
-        cursor = conn.cursor()
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+def use_service(url):
+    # Режим клиента: база открывается только сервисом, приложение обращается к нему по HTTP
+    global SERVICE
+    import service
+    SERVICE = service.ServiceClient(url)
 
-        cursor.execute('DELETE FROM requests WHERE id = ?', (request_id,))
+def count_requests(filters):
+    try:
+        conditions, params = request_filter_conditions(filters)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        row = db.fetchone_cached(DB_PATH, f'SELECT COUNT(*) FROM requests {where}', params)
 
-        conn.commit()
-        conn.close()
-        messagebox.showinfo("Успех", f"Заявка с ID {request_id} успешно удалена!")
+        return row[0]
     except Exception as e:
-        print(f"Error deleting request: {e}")
-        messagebox.showerror("Ошибка", f"Ошибка при удалении заявки: {e}")
+        print(f"Error counting requests: {e}")
+        return None
+
+def reclaim_space(pages=VACUUM_STEP_PAGES):
+    # Один шаг возврата свободного места файлу базы; возвращает число оставшихся свободных страниц
+    try:
+        return db.incremental_vacuum(DB_PATH, pages)
+    except Exception as e:
+        print(f"Error reclaiming space: {e}")
+        return 0
+
+@metrics.timed
+def request_dashboard(today=None):
+    # Показатели для панели из сводных таблиц: время чтения зависит от числа групп, а не заявок.
+    # Строки групп - (подпись, открыто, закрыто, просрочено)
+    try:
+        today = today or datetime.date.today().isoformat()
+        row = db.fetchone_cached(DB_PATH, 'SELECT code FROM statuses WHERE label = ?', (OPEN_STATUS,))
+        open_code = row[0] if row else None
+
+        dashboard = {}
+        for key, column, lookup in (('by_priority', 'priority', 'priorities'),
+                                    ('by_type', 'request_type', 'request_types')):
+            overdue = dict(db.fetchall_cached(DB_PATH, f'''
+                SELECT {column}, SUM(count) FROM request_due_stats
+                WHERE due_date < ?
+                GROUP BY {column}
+            ''', (today,)))
+            rows = db.fetchall_cached(DB_PATH, f'''
+                SELECT {lookup}.code, {lookup}.label,
+                       SUM(CASE WHEN request_stats.status = ? THEN request_stats.count ELSE 0 END),
+                       SUM(CASE WHEN request_stats.status = ? THEN 0 ELSE request_stats.count END)
+                FROM request_stats
+                JOIN {lookup} ON {lookup}.code = request_stats.{column}
+                GROUP BY {lookup}.code
+                ORDER BY {lookup}.code
+            ''', (open_code, open_code))
+            dashboard[key] = [(label, opened, closed, overdue.get(code, 0)) for code, label, opened, closed in rows]
+
+        overdue = dict(db.fetchall_cached(DB_PATH, '''
+            SELECT responsible, SUM(count) FROM request_responsible_due_stats
+            WHERE due_date < ?
+            GROUP BY responsible
+        ''', (today,)))
+        rows = db.fetchall_cached(DB_PATH, '''
+            SELECT responsible,
+                   SUM(CASE WHEN status = ? THEN count ELSE 0 END),
+                   SUM(CASE WHEN status = ? THEN 0 ELSE count END)
+            FROM request_stats
+            GROUP BY responsible
+            ORDER BY responsible
+        ''', (open_code, open_code))
+        dashboard['by_responsible'] = [(responsible, opened, closed, overdue.get(responsible, 0))
+                                       for responsible, opened, closed in rows]
+
+        dashboard['total'] = (sum(row[1] for row in dashboard['by_priority']),
+                              sum(row[2] for row in dashboard['by_priority']),
+                              sum(row[3] for row in dashboard['by_priority']))
+        return dashboard
+    except Exception as e:
+        print(f"Error reading dashboard: {e}")
+        return None
+
+def check_request_stats(repair=False):
+    # Сверяет сводные таблицы с пересчётом по всем заявкам; возвращает число расхождений по группам.
+    # repair=True пересчитывает сводные таблицы заново, если расхождения найдены
+    try:
+        conn = db.get_connection(DB_PATH)
+        with conn:
+            cursor = conn.cursor()
+            mismatches = 0
+            for table, query in STATS_QUERIES:
+                # Группы, которые есть только в пересчёте или только в сводной таблице, либо с разным числом
+                cursor.execute(f'''
+                    SELECT (SELECT COUNT(*) FROM (SELECT * FROM ({query}) EXCEPT SELECT * FROM {table}))
+                         + (SELECT COUNT(*) FROM (SELECT * FROM {table} EXCEPT SELECT * FROM ({query})))
+                ''')
+                mismatches += cursor.fetchone()[0]
+            if mismatches and repair:
+                rebuild_request_stats(cursor)
+        return mismatches
+    except Exception as e:
+        print(f"Error checking request stats: {e}")
+        return None
 
 # Графический интерфейс
 class RequestApp:
@@ -104,22 +894,85 @@ class RequestApp:
         menubar.add_cascade(label="Файл", menu=file_menu)
         file_menu.add_command(label="Создать заявку", command=self.open_create_request_window)
         file_menu.add_command(label="Удалить заявку", command=self.open_delete_request_window)
+        file_menu.add_command(label="Удалить выбранные", command=self.delete_selected_requests)
+        # В режиме клиента сервиса доступны только список, поиск, создание и удаление заявок
+        local_state = tk.NORMAL if SERVICE is None else tk.DISABLED
+        file_menu.add_command(label="Удалить по фильтру", command=self.delete_filtered_requests, state=local_state)
+        file_menu.add_separator()
+        file_menu.add_command(label="Экспорт...", command=self.export_requests, state=local_state)
         file_menu.add_separator()
         file_menu.add_command(label="Выход", command=root.quit)
 
+        view_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Вид", menu=view_menu)
+        view_menu.add_command(label="Все заявки", command=self.view_requests)
+        view_menu.add_command(label="Показатели", command=self.open_dashboard_window, state=local_state)
+        view_menu.add_separator()
+        view_menu.add_command(label="Статистика кэша", command=self.show_cache_stats, state=local_state)
+        if metrics.ENABLED:
+            view_menu.add_command(label="Замеры производительности", command=lambda: MetricsWindow(root))
+
+        # Строка состояния: результаты записи показываются в ней, а не модальными окнами
+        self.status_bar = StatusBar(root)
+        # Создание и удаление заявок идут через очередь с групповой фиксацией: окно не ждёт записи на диск.
+        # В режиме клиента записи группирует сам сервис
+        self.writes = WriteQueue(DB_PATH, root) if SERVICE is None else None
+
         # Поисковая строка
         self.search_frame = ttk.Frame(root)
         self.search_frame.pack(fill=tk.X, padx=10, pady=5)
 
-        self.search_label = ttk.Label(self.search_frame, text="Поиск по теме:")
+        self.search_label = ttk.Label(self.search_frame, text="Поиск по теме и описанию:")
         self.search_label.pack(side=tk.LEFT, padx=(0, 5))
 
-        self.search_entry = ttk.Entry(self.search_frame)
+        # Запросы поиска выполняются в фоне, поиск запускается после паузы в наборе текста
+        self.worker = QueryWorker(root)
+        # Экспорт выполняется в своём потоке, чтобы поиск не ждал окончания выгрузки
+        self.export_worker = None
+        self.search_debouncer = Debouncer(root, SEARCH_DELAY, self.search_requests)
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add('write', lambda *args: self.search_debouncer())
+
+        self.search_entry = ttk.Entry(self.search_frame, textvariable=self.search_var)
         self.search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.search_entry.bind("<Return>", lambda event: self.search_requests())
 
         self.search_button = ttk.Button(self.search_frame, text="Поиск", command=self.search_requests)
         self.search_button.pack(side=tk.LEFT, padx=(5, 0))
 
+        # Панель фильтров: условия передаются в запрос к базе, а не применяются к загруженным строкам
+        self.filters = {}
+        self.sort_column = 'id'
+        self.sort_descending = False
+
+        self.filter_frame = ttk.Frame(root)
+        self.filter_frame.pack(fill=tk.X, padx=10, pady=(0, 5))
+
+        ttk.Label(self.filter_frame, text="Статус:").pack(side=tk.LEFT)
+        self.status_filter = ttk.Combobox(self.filter_frame, values=[""] + STATUSES, state="readonly", width=10)
+        self.status_filter.pack(side=tk.LEFT, padx=(2, 8))
+
+        ttk.Label(self.filter_frame, text="Приоритет:").pack(side=tk.LEFT)
+        self.priority_filter = ttk.Combobox(self.filter_frame, values=[""] + PRIORITIES, state="readonly", width=10)
+        self.priority_filter.pack(side=tk.LEFT, padx=(2, 8))
+
+        ttk.Label(self.filter_frame, text="Ответственный:").pack(side=tk.LEFT)
+        self.responsible_filter = ttk.Entry(self.filter_frame, width=15)
+        self.responsible_filter.pack(side=tk.LEFT, padx=(2, 8))
+
+        ttk.Label(self.filter_frame, text="Дата с:").pack(side=tk.LEFT)
+        self.due_from_filter = ttk.Entry(self.filter_frame, width=11)
+        self.due_from_filter.pack(side=tk.LEFT, padx=(2, 4))
+
+        ttk.Label(self.filter_frame, text="по:").pack(side=tk.LEFT)
+        self.due_to_filter = ttk.Entry(self.filter_frame, width=11)
+        self.due_to_filter.pack(side=tk.LEFT, padx=(2, 8))
+
+        self.apply_filter_button = ttk.Button(self.filter_frame, text="Применить", command=self.apply_filters)
+        self.apply_filter_button.pack(side=tk.LEFT)
+        self.reset_filter_button = ttk.Button(self.filter_frame, text="Сбросить", command=self.reset_filters)
+        self.reset_filter_button.pack(side=tk.LEFT, padx=(5, 0))
+
         # Таблица заявок
         self.tree_frame = ttk.Frame(root)
         self.tree_frame.pack(fill=tk.BOTH, expand=True)
@@ -129,14 +982,19 @@ class RequestApp:
 
         self.tree = ttk.Treeview(self.tree_frame, columns=(
         "id", "subject", "priority", "request_type", "due_date", "responsible", "status"),
-                                 show='headings', yscrollcommand=self.tree_scroll.set)
-        self.tree.heading("id", text="ID")
-        self.tree.heading("subject", text="Тема")
-        self.tree.heading("priority", text="Приоритет")
-        self.tree.heading("request_type", text="Тип")
-        self.tree.heading("due_date", text="Плановая дата")
-        self.tree.heading("responsible", text="Ответственный")
-        self.tree.heading("status", text="Статус")
+                                 show='headings')
+        self.headings = {
+            "id": "ID",
+            "subject": "Тема",
+            "priority": "Приоритет",
+            "request_type": "Тип",
+            "due_date": "Плановая дата",
+            "responsible": "Ответственный",
+            "status": "Статус",
+        }
+        # Щелчок по заголовку сортирует таблицу в базе, повторный щелчок меняет направление
+        for column, text in self.headings.items():
+            self.tree.heading(column, text=text, command=lambda c=column: self.sort_by(c))
 
         self.tree.column("id", width=40)
         self.tree.column("subject", width=150)
@@ -151,13 +1009,64 @@ class RequestApp:
         self.tree.tag_configure('low', background='#F0F0F0')  # Серый для низкого приоритета
         self.tree.tag_configure('medium', background='#FFFF99')  # Желтый для среднего приоритета
         self.tree.tag_configure('high', background='#FF9999')  # Красный для высокого приоритета
+        self.tree.tag_configure('overdue', foreground='#CC0000')  # Красный текст для просроченных
+        self.tree.tag_configure('due_soon', foreground='#B36B00')  # Оранжевый текст для срочных
 
         self.tree.pack(fill=tk.BOTH, expand=True)
         self.tree_scroll.config(command=self.tree.yview)
 
         self.tree.bind("<Double-1>", self.open_request_detail_window)
-
+        self.tree.bind("<Delete>", lambda event: self.delete_selected_requests())
+
+        # Точечные изменения строк (iid = id заявки) и постраничная подгрузка при прокрутке
+        # Загруженные строки хранятся по id для окна деталей; подписи и даты хранятся без повторов
+        self.rows = RowStore('RequestRow', REQUEST_FIELDS, REQUEST_INTERNED)
+        self.delta = TreeDelta(self.tree, self.format_tree_row, self.rows)
+        self.pager = PagedTreeLoader(self.tree, self.tree_scroll, self.fetch_page, self.delta.upsert, PAGE_SIZE)
+
+        # Диалоги строятся при первом открытии и затем переиспользуются
+        self.create_request_dialog = ReusableDialog(root, "Создать заявку", "400x500",
+                                                    self.build_create_request_window, self.reset_create_request_window)
+        self.delete_request_dialog = ReusableDialog(root, "Удалить заявку", "300x150",
+                                                    self.build_delete_request_window, self.reset_delete_request_window)
+        self.request_detail_dialog = ReusableDialog(root, "Детали заявки", "400x400", self.build_request_detail_window)
+        self.dashboard_dialog = ReusableDialog(root, "Показатели заявок", "600x450",
+                                               self.build_dashboard_window, self.refresh_dashboard)
+
+        # Возврат освободившегося после удаления места выполняется шагами между событиями интерфейса
+        self.reclaim_after_id = None
+
+        # Изменения других операторов применяются к таблице по журналу изменений. Номера журнала
+        # собственных записей очереди пропускаются: окно применило их, когда запись зафиксировалась
+        self.change_seq = None
+        self.data_version = None
+        self.own_changes = []
+        self.change_polls = 0
+        self.pruned_seq = None
+
+        # Префиксный индекс ответственных для подсказок (строится при первом открытии диалога создания)
+        self.responsible_index = None
+
+        # Сроки открытых заявок: таймер срабатывает только на ближайшей смене состояния срока
+        self.deadlines = DeadlineScheduler(root, self.on_deadline)
+
+        # База открывается и таблица заполняется только после первой отрисовки окна
+        self.root.after_idle(self.start)
+
+    def start(self):
+        self.root.wait_visibility()
+        self.root.update_idletasks()
+        metrics.startup_mark('first_paint')
+        if SERVICE is None:
+            create_db()
+        # Номер берётся до загрузки таблицы: изменения, попавшие между ними, применятся повторно без вреда
+        self.change_seq = request_changes(None)[0]
         self.view_requests()
+        self.load_deadlines()
+        self.root.update_idletasks()
+        metrics.startup_mark('data_loaded')
+        metrics.startup_done(self.root)
+        self.root.after(CHANGE_POLL_INTERVAL, self.poll_changes)
 
     def center_window(self, width=1000, height=700):
         # Получаем размеры экрана
@@ -171,10 +1080,15 @@ class RequestApp:
         # Устанавливаем размеры и позицию окна
         self.root.geometry(f'{width}x{height}+{x}+{y}')
 
+    @metrics.timed
     def open_create_request_window(self):
-        self.create_request_window = tk.Toplevel(self.root)
-        self.create_request_window.title("Создать заявку")
-        self.create_request_window.geometry("400x500")
+        self.create_request_dialog.show()
+
+    def build_create_request_window(self, window):
+        # Календарь нужен только в этом окне, поэтому tkcalendar загружается при первом открытии
+        from tkcalendar import DateEntry
+
+        self.create_request_window = window
 
         self.subject_label = ttk.Label(self.create_request_window, text="Тема")
         self.subject_label.pack(pady=5)
@@ -183,12 +1097,12 @@ class RequestApp:
 
         self.priority_label = ttk.Label(self.create_request_window, text="Приоритет")
         self.priority_label.pack(pady=5)
-        self.priority_combo = ttk.Combobox(self.create_request_window, values=["Низкий", "Средний", "Высокий"])
+        self.priority_combo = ttk.Combobox(self.create_request_window, values=PRIORITIES)
         self.priority_combo.pack(pady=5)
 
         self.type_label = ttk.Label(self.create_request_window, text="Тип")
         self.type_label.pack(pady=5)
-        self.type_combo = ttk.Combobox(self.create_request_window, values=["Инцидент", "Обслуживание"])
+        self.type_combo = ttk.Combobox(self.create_request_window, values=REQUEST_TYPES)
         self.type_combo.pack(pady=5)
 
         self.desc_label = ttk.Label(self.create_request_window, text="Описание")
@@ -205,15 +1119,36 @@ class RequestApp:
         self.responsible_label.pack(pady=5)
         self.responsible_entry = ttk.Entry(self.create_request_window)
         self.responsible_entry.pack(pady=5)
+        # Подсказки уже встречавшихся ответственных, чтобы не множились разные написания одного имени.
+        # Индекс строится в фоне при первом открытии окна
+        self.responsible_autocomplete = Autocomplete(self.responsible_entry, self.suggest_responsible)
+        self.worker.submit('responsible-index', lambda: PrefixIndex(responsible_counts()),
+                           callback=self.set_responsible_index)
 
         self.status_label = ttk.Label(self.create_request_window, text="Статус")
         self.status_label.pack(pady=5)
-        self.status_combo = ttk.Combobox(self.create_request_window, values=["Открыта", "Закрыта"])
+        self.status_combo = ttk.Combobox(self.create_request_window, values=STATUSES)
         self.status_combo.pack(pady=5)
 
         self.submit_button = ttk.Button(self.create_request_window, text="Добавить заявку", command=self.submit_request)
         self.submit_button.pack(pady=10)
 
+    def reset_create_request_window(self):
+        for entry in (self.subject_entry, self.desc_entry, self.responsible_entry):
+            entry.delete(0, tk.END)
+        for combo in (self.priority_combo, self.type_combo, self.status_combo):
+            combo.set("")
+        self.due_date_entry.set_date(datetime.date.today())
+        self.responsible_autocomplete.hide()
+        self.subject_entry.focus_set()
+
+    def set_responsible_index(self, index):
+        self.responsible_index = index
+
+    def suggest_responsible(self, text):
+        return self.responsible_index.suggest(text) if self.responsible_index is not None else []
+
+    @metrics.timed
     def submit_request(self):
         subject = self.subject_entry.get()
         priority = self.priority_combo.get()
@@ -223,16 +1158,51 @@ class RequestApp:
         responsible = self.responsible_entry.get()
         status = self.status_combo.get()
         if subject and priority and request_type and description and due_date and responsible and status:
-            add_request(subject, priority, request_type, description, due_date, responsible, status)
-            self.create_request_window.destroy()
-            self.view_requests()
+            values = (subject, priority, request_type, description, due_date, responsible, status)
+            try:
+                values = validate_request(dict(zip(REQUEST_COLUMNS, values)))
+            except ValueError as e:
+                messagebox.showerror("Ошибка", f"Некорректные данные: {e}")
+                return
+            self.create_request_dialog.hide()
+            if self.writes is None:
+                # В режиме клиента запрос к сервису выполняется в фоне, как и запись через очередь
+                self.worker.submit(None, service_write, (SERVICE.add_request_logged, dict(zip(REQUEST_COLUMNS, values))),
+                                   self.request_saved)
+            else:
+                self.writes.submit(logged_write, (insert_request, values), self.request_saved)
         else:
             messagebox.showerror("Ошибка", "Все поля обязательны для заполнения!")
 
+    def request_saved(self, future):
+        # Вызывается после фиксации пакета очереди записи (в режиме клиента - после ответа сервиса)
+        error = future.exception()
+        if error is not None:
+            self.status_bar.show(f"Ошибка при добавлении заявки: {error}", error=True)
+            return
+        request, span = future.result()
+        self.skip_own_changes(span)
+        self.status_bar.show(f"Заявка #{request[0]} добавлена")
+        self.request_added(request)
+
+    def request_added(self, request):
+        if not request:
+            return
+        # Новая заявка с наибольшим id появится сама, когда до неё дойдёт постраничная подгрузка;
+        # при фильтрах или другой сортировке её место в таблице определяет только запрос к базе
+        if self.pager.exhausted and not self.filters and self.sort_column == 'id' \
+                and not self.sort_descending and not self.search_entry.get().strip():
+            self.delta.apply(upserts=[request])
+        self.track_deadline(request)
+        if self.responsible_index is not None:
+            self.responsible_index.add(request[6])
+
+    @metrics.timed
     def open_delete_request_window(self):
-        self.delete_request_window = tk.Toplevel(self.root)
-        self.delete_request_window.title("Удалить заявку")
-        self.delete_request_window.geometry("300x150")
+        self.delete_request_dialog.show()
+
+    def build_delete_request_window(self, window):
+        self.delete_request_window = window
 
         self.delete_label = ttk.Label(self.delete_request_window, text="ID заявки для удаления")
         self.delete_label.pack(pady=5)
@@ -242,100 +1212,391 @@ class RequestApp:
         self.delete_button = ttk.Button(self.delete_request_window, text="Удалить заявку", command=self.delete_request)
         self.delete_button.pack(pady=10)
 
+    def reset_delete_request_window(self):
+        self.delete_entry.delete(0, tk.END)
+        self.delete_entry.focus_set()
+
+    @metrics.timed
     def delete_request(self):
-        request_id = self.delete_entry.get()
-        if request_id:
-            delete_request(request_id)
-            self.delete_request_window.destroy()
-            self.view_requests()
+        request_id = self.delete_entry.get().strip()
+        if request_id.isdigit():
+            request_id = int(request_id)
+            if self.writes is None:
+                self.worker.submit(None, service_write, (SERVICE.delete_requests_logged, [request_id]),
+                                   self.requests_removed)
+            else:
+                self.writes.submit(logged_write, (remove_requests, [request_id]), self.requests_removed)
+            self.delete_request_dialog.hide()
         else:
             messagebox.showerror("Ошибка", "ID заявки обязательно для заполнения!")
 
+    @metrics.timed
+    def delete_selected_requests(self):
+        request_ids = [int(iid) for iid in self.tree.selection()]
+        if not request_ids:
+            messagebox.showerror("Ошибка", "Выберите заявки в таблице!")
+            return
+        if not messagebox.askyesno("Удаление", f"Удалить выбранные заявки ({len(request_ids)})?"):
+            return
+        if self.writes is None:
+            self.worker.submit(None, service_write, (SERVICE.delete_requests_logged, request_ids),
+                               self.requests_removed)
+        else:
+            self.writes.submit(logged_write, (remove_requests, request_ids), self.requests_removed)
+
+    def requests_removed(self, future):
+        # Вызывается после фиксации пакета очереди записи (в режиме клиента - после ответа сервиса)
+        error = future.exception()
+        if error is not None:
+            self.status_bar.show(f"Ошибка при удалении заявок: {error}", error=True)
+            return
+        deleted, span = future.result()
+        self.skip_own_changes(span)
+        if not deleted:
+            self.status_bar.show("Заявки для удаления не найдены", error=True)
+        elif len(deleted) == 1:
+            self.status_bar.show(f"Заявка #{deleted[0]} удалена")
+        else:
+            self.status_bar.show(f"Удалено заявок: {len(deleted)}")
+        self.requests_deleted(deleted)
+
+    def requests_deleted(self, deleted):
+        if deleted:
+            self.delta.apply(deletes=deleted)
+            for request_id in deleted:
+                self.deadlines.remove(request_id)
+            self.schedule_reclaim()
+
+    @metrics.timed
+    def delete_filtered_requests(self):
+        # Удаляются все заявки, подходящие под фильтры панели (а не только загруженные в таблицу)
+        if not self.filters:
+            messagebox.showerror("Ошибка", "Задайте и примените фильтр, например статус и дату \"по\"!")
+            return
+        count = count_requests(self.filters)
+        if not count:
+            messagebox.showinfo("Удаление", "Нет заявок, подходящих под фильтр")
+            return
+        if not messagebox.askyesno("Удаление", f"Удалить все заявки, подходящие под фильтр ({count})?"):
+            return
+        # Удаление по фильтру доступно только с локальной базой и идёт через очередь записи
+        self.writes.submit(logged_write, (remove_requests_by_filter, self.filters), self.requests_removed)
+
+    def schedule_reclaim(self):
+        # В режиме клиента место после удаления возвращает сервис
+        if SERVICE is None and self.reclaim_after_id is None:
+            self.reclaim_after_id = self.root.after(VACUUM_STEP_DELAY, self.reclaim_step)
+
+    def reclaim_step(self):
+        self.reclaim_after_id = None
+        if reclaim_space() > 0:
+            self.schedule_reclaim()
+
+    @metrics.timed
     def open_request_detail_window(self, event):
         selected_item = self.tree.selection()
         if selected_item:
-            item = self.tree.item(selected_item)
-            request_id = item['values'][0]
-
-            request = self.get_request_by_id(request_id)
+            # Строка берётся из уже загруженных, к базе обращаемся, только если её там нет
+            request_id = int(selected_item[0])
+            request = self.rows.get(request_id) or self.get_request_by_id(request_id)
             if request:
-                self.detail_window = tk.Toplevel(self.root)
-                self.detail_window.title("Детали заявки")
-                self.detail_window.geometry("400x400")
-
-                detail_frame = ttk.Frame(self.detail_window, padding="10")
-                detail_frame.pack(fill=tk.BOTH, expand=True)
-
-                ttk.Label(detail_frame, text="ID:", font=("Arial", 12, "bold")).grid(row=0, column=0, sticky="w", pady=2)
-                ttk.Label(detail_frame, text=request[0], font=("Arial", 12)).grid(row=0, column=1, sticky="w", pady=2)
-
-                ttk.Label(detail_frame, text="Тема:", font=("Arial", 12, "bold")).grid(row=1, column=0, sticky="w", pady=2)
-                ttk.Label(detail_frame, text=request[1], font=("Arial", 12)).grid(row=1, column=1, sticky="w", pady=2)
-
-                ttk.Label(detail_frame, text="Приоритет:", font=("Arial", 12, "bold")).grid(row=2, column=0, sticky="w", pady=2)
-                ttk.Label(detail_frame, text=request[2], font=("Arial", 12)).grid(row=2, column=1, sticky="w", pady=2)
-
-                ttk.Label(detail_frame, text="Тип:", font=("Arial", 12, "bold")).grid(row=3, column=0, sticky="w", pady=2)
-                ttk.Label(detail_frame, text=request[3], font=("Arial", 12)).grid(row=3, column=1, sticky="w", pady=2)
-
-                ttk.Label(detail_frame, text="Описание:", font=("Arial", 12, "bold")).grid(row=4, column=0, sticky="w", pady=2)
-                ttk.Label(detail_frame, text=request[4], font=("Arial", 12), wraplength=300).grid(row=4, column=1, sticky="w", pady=2)
-
-                ttk.Label(detail_frame, text="Плановая дата:", font=("Arial", 12, "bold")).grid(row=5, column=0, sticky="w", pady=2)
-                ttk.Label(detail_frame, text=request[5], font=("Arial", 12)).grid(row=5, column=1, sticky="w", pady=2)
-
-                ttk.Label(detail_frame, text="Ответственный:", font=("Arial", 12, "bold")).grid(row=6, column=0, sticky="w", pady=2)
-                ttk.Label(detail_frame, text=request[6], font=("Arial", 12)).grid(row=6, column=1, sticky="w", pady=2)
+                self.request_detail_dialog.show()
+                for label, value in zip(self.detail_values, request):
+                    label.config(text=value)
+
+    def build_request_detail_window(self, window):
+        self.detail_window = window
+
+        detail_frame = ttk.Frame(self.detail_window, padding="10")
+        detail_frame.pack(fill=tk.BOTH, expand=True)
+
+        # Подписи полей создаются один раз, при открытии меняются только значения
+        fields = ("ID:", "Тема:", "Приоритет:", "Тип:", "Описание:", "Плановая дата:", "Ответственный:", "Статус:")
+        self.detail_values = []
+        for row, text in enumerate(fields):
+            ttk.Label(detail_frame, text=text, font=("Arial", 12, "bold")).grid(row=row, column=0, sticky="w", pady=2)
+            value = ttk.Label(detail_frame, font=("Arial", 12), wraplength=300 if text == "Описание:" else 0)
+            value.grid(row=row, column=1, sticky="w", pady=2)
+            self.detail_values.append(value)
+
+    @metrics.timed
+    def open_dashboard_window(self):
+        self.dashboard_dialog.show()
+
+    def build_dashboard_window(self, window):
+        self.dashboard_window = window
+
+        self.dashboard_total_label = ttk.Label(self.dashboard_window, font=("Arial", 12, "bold"))
+        self.dashboard_total_label.pack(fill=tk.X, padx=10, pady=5)
+
+        notebook = ttk.Notebook(self.dashboard_window)
+        notebook.pack(fill=tk.BOTH, expand=True, padx=10)
+
+        # Вкладки панели: ключ результата request_dashboard -> таблица
+        self.dashboard_trees = {}
+        for key, title, group in (('by_priority', "По приоритету", "Приоритет"),
+                                  ('by_type', "По типу", "Тип"),
+                                  ('by_responsible', "По ответственным", "Ответственный")):
+            frame = ttk.Frame(notebook)
+            notebook.add(frame, text=title)
+            columns = ("group", "open", "closed", "overdue")
+            tree = ttk.Treeview(frame, columns=columns, show='headings')
+            for column, text in zip(columns, (group, "Открыто", "Закрыто", "Просрочено")):
+                tree.heading(column, text=text)
+                tree.column(column, width=200 if column == "group" else 100)
+            scroll = ttk.Scrollbar(frame, command=tree.yview)
+            tree.configure(yscrollcommand=scroll.set)
+            scroll.pack(side=tk.RIGHT, fill=tk.Y)
+            tree.pack(fill=tk.BOTH, expand=True)
+            self.dashboard_trees[key] = tree
+
+        button_frame = ttk.Frame(self.dashboard_window)
+        button_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Button(button_frame, text="Обновить", command=self.refresh_dashboard).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="Проверить согласованность",
+                   command=self.check_dashboard).pack(side=tk.LEFT, padx=5)
+
+    @metrics.timed
+    def refresh_dashboard(self):
+        dashboard = request_dashboard()
+        if dashboard is None:
+            messagebox.showerror("Ошибка", "Не удалось загрузить показатели!", parent=self.dashboard_window)
+            return
+        opened, closed, overdue = dashboard['total']
+        self.dashboard_total_label.config(text=f"Открыто: {opened}   Закрыто: {closed}   Просрочено: {overdue}")
+        for key, tree in self.dashboard_trees.items():
+            tree.delete(*tree.get_children())
+            for row in dashboard[key]:
+                tree.insert('', 'end', values=row)
+
+    def check_dashboard(self):
+        mismatches = check_request_stats()
+        if mismatches is None:
+            messagebox.showerror("Ошибка", "Не удалось проверить показатели!", parent=self.dashboard_window)
+        elif mismatches == 0:
+            messagebox.showinfo("Проверка", "Показатели совпадают с пересчётом по всем заявкам.",
+                                parent=self.dashboard_window)
+        elif messagebox.askyesno("Проверка", f"Расхождений в группах: {mismatches}. Пересчитать показатели?",
+                                 parent=self.dashboard_window):
+            check_request_stats(repair=True)
+            self.refresh_dashboard()
+
+    def export_requests(self):
+        path = filedialog.asksaveasfilename(parent=self.root, defaultextension=".csv", initialfile="requests.csv",
+                                            filetypes=[("CSV", "*.csv"), ("CSV, gzip", "*.csv.gz"),
+                                                       ("JSONL", "*.jsonl"), ("JSONL, gzip", "*.jsonl.gz")])
+        if not path:
+            return
+        if self.export_worker is None:
+            self.export_worker = QueryWorker(self.root)
+        # Выгружается то, что показано в таблице: фильтры, сортировка или результаты поиска
+        # Ключ - файл выгрузки: экспорт в другой файл не отменяет идущий, повторный в тот же файл заменяет его
+        self.export_worker.submit(('export', path), export_requests,
+                                  (path, self.filters, self.sort_column, self.sort_descending, self.search_entry.get()),
+                                  lambda count: self.export_done(path, count))
+
+    def export_done(self, path, count):
+        if count is None:
+            messagebox.showerror("Ошибка", "Ошибка при экспорте заявок!")
+        else:
+            messagebox.showinfo("Успех", f"Выгружено заявок: {count} в {path}")
 
-                ttk.Label(detail_frame, text="Статус:", font=("Arial", 12, "bold")).grid(row=7, column=0, sticky="w", pady=2)
-                ttk.Label(detail_frame, text=request[7], font=("Arial", 12)).grid(row=7, column=1, sticky="w", pady=2)
+    def show_cache_stats(self):
+        stats = db.cache_stats(DB_PATH)
+        messagebox.showinfo("Статистика кэша",
+                            f"Попаданий: {stats['hits']}\n"
+                            f"Промахов: {stats['misses']}\n"
+                            f"Доля попаданий: {stats['hit_rate']:.0%}\n"
+                            f"Запросов в кэше: {stats['size']}\n"
+                            f"Сбросов: {stats['invalidations']}")
 
     def get_request_by_id(self, request_id):
-        try:
-            conn = sqlite3.connect('requests.db')
-            cursor = conn.cursor()
-
-            cursor.execute('SELECT * FROM requests WHERE id = ?', (request_id,))
-            row = cursor.fetchone()
-
-            conn.close()
-            return row
-        except Exception as e:
-            print(f"Error retrieving request: {e}")
-            return None
+        return get_request_by_id(request_id)
 
     def search_requests(self):
-        subject = self.search_entry.get()
-        filtered_requests = search_requests(subject)
-        self.update_tree(filtered_requests)
+        self.search_debouncer.cancel()
+        text = self.search_entry.get()
+        if not text.strip():
+            self.worker.cancel('search')
+            self.view_requests()
+            return
+        # Результат устаревшего поиска отбрасывается, если пользователь продолжил ввод
+        self.worker.submit('search', search_requests, (text, self.filters), self.update_tree)
 
+    @metrics.timed
     def view_requests(self):
-        all_requests = view_requests()
-        self.update_tree(all_requests)
+        self.delta.clear()
+        self.pager.reset()
+
+    def poll_changes(self):
+        if SERVICE is not None:
+            # У сервиса журнал запрашивается по HTTP в фоновом потоке; следующая проверка - после ответа
+            self.worker.submit('changes', request_changes,
+                               (self.change_seq, self.filters, self.search_entry.get(),
+                                [tuple(span) for span in self.own_changes]), self.changes_received)
+            return
+        # Журнал читается, только если базу изменило другое соединение
+        version = db.data_version(DB_PATH)
+        if version != self.data_version:
+            self.data_version = version
+            self.apply_changes(request_changes(self.change_seq, self.filters, self.search_entry.get(),
+                                               [tuple(span) for span in self.own_changes]))
+        self.change_polls += 1
+        if self.change_polls % CHANGE_PRUNE_POLLS == 0 and self.change_seq != self.pruned_seq:
+            # Пока журнал не растёт, очищать в нём нечего
+            self.pruned_seq = self.change_seq
+            self.writes.submit(prune_request_changes)
+        self.root.after(CHANGE_POLL_INTERVAL, self.poll_changes)
+
+    def changes_received(self, changes):
+        self.apply_changes(changes)
+        self.root.after(CHANGE_POLL_INTERVAL, self.poll_changes)
+
+    def skip_own_changes(self, span):
+        # Отрезок номеров журнала, добавленных собственной записью; соседние отрезки одного пакета сливаются
+        first, last = span
+        if last <= first or last <= (self.change_seq or 0):
+            return
+        if self.own_changes and self.own_changes[-1][1] == first:
+            self.own_changes[-1][1] = last
+        else:
+            self.own_changes.append([first, last])
+
+    @metrics.timed
+    def apply_changes(self, changes):
+        if changes is None:
+            # Окно отстало больше, чем хранит журнал
+            self.change_seq = request_changes(None)[0]
+            self.own_changes = []
+            self.search_requests()
+            self.load_deadlines()
+            return
+        self.change_seq, rows, deleted = changes
+        self.own_changes = [span for span in self.own_changes if span[1] > self.change_seq]
+        # Новые заявки добавляются в конец, только если таблица загружена полностью и упорядочена по id;
+        # иначе обновляются лишь уже показанные строки
+        append = self.pager.exhausted and self.sort_column == 'id' and not self.sort_descending \
+            and not self.search_entry.get().strip()
+        upserts = [row for row in rows if append or row[0] in self.rows]
+        if upserts or deleted:
+            self.delta.apply(upserts=upserts, deletes=deleted)
+        for row in rows:
+            self.track_deadline(row)
+        if deleted:
+            # Среди не попавших под фильтры есть и открытые заявки: их сроки берутся из базы
+            self.update_deadlines(deleted)
+
+    def load_deadlines(self):
+        # Сроки считаются один раз на каждую плановую дату: у многих заявок она общая
+        today = datetime.date.today()
+        events = {}
+        items = {}
+        for request_id, due_date in open_request_deadlines():
+            if due_date not in events:
+                events[due_date] = deadline_events(due_date, today)
+            items[request_id] = events[due_date]
+        self.deadlines.load(items)
+
+    def track_deadline(self, request):
+        if request[7] == OPEN_STATUS:
+            self.deadlines.set(request[0], deadline_events(request[5]))
+        else:
+            self.deadlines.remove(request[0])
+
+    def update_deadlines(self, request_ids):
+        opened = dict(open_request_deadlines(request_ids))
+        for request_id in request_ids:
+            if request_id in opened:
+                self.deadlines.set(request_id, deadline_events(opened[request_id]))
+            else:
+                self.deadlines.remove(request_id)
 
+    def on_deadline(self, request_id, state):
+        # Перекрашивается только строка, чей срок наступил, и только если она загружена в таблицу
+        request = self.rows.get(request_id)
+        if request is not None:
+            self.tree.item(str(request_id), tags=self.format_tree_row(request)[1])
+
+    def fetch_page(self, last_row, limit):
+        return query_requests(self.filters, self.sort_column, self.sort_descending, last_row, limit)
+
+    def sort_by(self, column):
+        if self.sort_column == column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column = column
+            self.sort_descending = False
+        for name, text in self.headings.items():
+            if name == column:
+                text += " ▼" if self.sort_descending else " ▲"
+            self.tree.heading(name, text=text)
+        # Результаты поиска упорядочены по релевантности, сортировка применяется к списку заявок
+        self.search_var.set("")
+        self.search_requests()
+
+    def apply_filters(self):
+        filters = {
+            'status': self.status_filter.get(),
+            'priority': self.priority_filter.get(),
+            'responsible': self.responsible_filter.get().strip(),
+            'due_from': self.due_from_filter.get().strip(),
+            'due_to': self.due_to_filter.get().strip(),
+        }
+        for key in ('due_from', 'due_to'):
+            if filters[key]:
+                try:
+                    datetime.date.fromisoformat(filters[key])
+                except ValueError:
+                    messagebox.showerror("Ошибка", "Дата должна быть в формате ГГГГ-ММ-ДД!")
+                    return
+        self.filters = {key: value for key, value in filters.items() if value}
+        self.search_requests()
+
+    def reset_filters(self):
+        self.status_filter.set("")
+        self.priority_filter.set("")
+        self.responsible_filter.delete(0, tk.END)
+        self.due_from_filter.delete(0, tk.END)
+        self.due_to_filter.delete(0, tk.END)
+        self.filters = {}
+        self.search_requests()
+
+    @metrics.timed
     def update_tree(self, requests):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.pager.stop()
+        self.delta.clear()
 
         for request in requests:
-            tags = ()
-            if request[7] == "Закрыта":
-                tags += ('closed',)
-            else:
-                tags += ('open',)
+            self.delta.upsert(request)
+
+    def format_tree_row(self, request):
+        tags = ()
+        if request[7] == "Закрыта":
+            tags += ('closed',)
+        else:
+            tags += ('open',)
+
+        if request[2] == "Низкий":
+            tags += ('low',)
+        elif request[2] == "Средний":
+            tags += ('medium',)
+        elif request[2] == "Высокий":
+            tags += ('high',)
 
-            if request[2] == "Низкий":
-                tags += ('low',)
-            elif request[2] == "Средний":
-                tags += ('medium',)
-            elif request[2] == "Высокий":
-                tags += ('high',)
+        state = deadline_state(request[5], request[7])
+        if state:
+            tags += (state,)
 
-            self.tree.insert('', tk.END, values=(request[0], request[1], request[2], request[3], request[5], request[6], request[7]), tags=tags)
+        return (request[0], request[1], request[2], request[3], request[5], request[6], request[7]), tags
 
 
 if __name__ == "__main__":
-    create_db()
+    if os.environ.get('APP_SERVICE_URL'):
+        use_service(os.environ['APP_SERVICE_URL'])
     root = tk.Tk()
     app = RequestApp(root)
+    metrics.startup_mark('window_built')
     root.mainloop()
+    # Поставленные в очередь записи фиксируются до выхода из процесса
+    if app.writes is not None:
+        app.writes.flush()
@@ -0,0 +1,44 @@
+import operator
+import sys
+
+
+# Компактное хранилище строк, загруженных в таблицу, с доступом по id.
+# Строка хранится записью с __slots__ (без словаря атрибутов и без служебного столбца ключа сортировки),
+# а повторяющиеся значения (подписи приоритета и статуса, жанр, даты) - одним общим объектом str:
+# sqlite3 создаёт для каждой строки результата новые объекты str, даже если значения совпадают.
+
+class RowStore:
+    def __init__(self, name, fields, interned=()):
+        self.fields = tuple(fields)
+        self.record = type(name, (), {'__slots__': self.fields})
+        # Дескрипторы слотов: запись заполняется без setattr по имени
+        self.setters = [getattr(self.record, field).__set__ for field in self.fields]
+        self.interned = frozenset(self.fields.index(field) for field in interned)
+        self.getter = operator.attrgetter(*self.fields)
+        self.rows = {}
+
+    def put(self, row):
+        record = self.record()
+        for index, (setter, value) in enumerate(zip(self.setters, row)):
+            if index in self.interned and value.__class__ is str:
+                value = sys.intern(value)
+            setter(record, value)
+        self.rows[row[0]] = record
+        return record
+
+    def get(self, row_id):
+        # Строка в виде кортежа, как её возвращает запрос к базе; None - строка не загружена
+        record = self.rows.get(row_id)
+        return None if record is None else self.getter(record)
+
+    def remove(self, row_id):
+        self.rows.pop(row_id, None)
+
+    def clear(self):
+        self.rows.clear()
+
+    def __contains__(self, row_id):
+        return row_id in self.rows
+
+    def __len__(self):
+        return len(self.rows)
@@ -0,0 +1,100 @@
+import datetime
+import itertools
+import random
+import time
+
+import db
+
+
+# Синтетические данные приложений: генераторы правдоподобных строк и заполнение базы приложения.
+# Используются в bench.py (замеры на заданном объёме) и del.py (эталоны с данными).
+
+# Словари генераторов
+SUBJECT_OBJECTS = ["принтер", "сервер", "ноутбук", "монитор", "почта", "VPN", "сеть", "телефон",
+                   "учётная запись", "база данных", "сканер", "роутер", "1С", "сайт", "проектор"]
+SUBJECT_PROBLEMS = ["не работает", "не включается", "медленно работает", "выдаёт ошибку",
+                    "требует обновления", "нет доступа", "плановое обслуживание", "замена картриджа",
+                    "не печатает", "пропало соединение", "настройка", "перенос данных"]
+DESCRIPTION_WORDS = ["пользователь", "сообщает", "после", "обновления", "кабинет", "этаж", "срочно",
+                     "ошибка", "перезагрузка", "не", "помогла", "проверить", "заменить", "настроить",
+                     "отдел", "бухгалтерия", "склад", "клиент", "журнал", "диск", "пароль", "доступ"]
+FIRST_NAMES = ["Иван", "Пётр", "Анна", "Мария", "Сергей", "Ольга", "Дмитрий", "Елена", "Алексей",
+               "Наталья", "Михаил", "Татьяна", "Андрей", "Ирина", "Николай", "Светлана"]
+LAST_NAMES = ["Иванов", "Петров", "Смирнов", "Кузнецов", "Попов", "Васильев", "Соколов", "Михайлов",
+              "Новиков", "Фёдоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов", "Егоров"]
+TITLE_ADJECTIVES = ["Тихий", "Последний", "Северный", "Забытый", "Золотой", "Тёмный", "Долгий",
+                    "Белый", "Старый", "Новый", "Дикий", "Пятый", "Чужой", "Лунный"]
+TITLE_NOUNS = ["дом", "берег", "сад", "город", "путь", "остров", "ветер", "океан", "лес", "мост",
+               "маяк", "час", "мир", "снег", "рассвет", "архив"]
+GENRES = ["Роман", "Детектив", "Фантастика", "Фэнтези", "Поэзия", "История", "Биография",
+          "Научно-популярное", "Детская литература", "Приключения", "Драма", "Психология"]
+
+
+def person_name(rng, count):
+    # Имя из ограниченного круга: count разных людей с неравномерной нагрузкой
+    index = min(int(rng.paretovariate(1.2)) - 1, count - 1)
+    return f"{LAST_NAMES[index % len(LAST_NAMES)]} {FIRST_NAMES[index // len(LAST_NAMES) % len(FIRST_NAMES)]} {index}"
+
+
+def generate_requests(count, seed=0):
+    # Строки в порядке столбцов INSERT_REQUEST_SQL: подписи приоритета, типа и статуса
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    for i in range(count):
+        subject = f"{rng.choice(SUBJECT_OBJECTS).capitalize()} {rng.choice(SUBJECT_PROBLEMS)}"
+        description = ' '.join(rng.choices(DESCRIPTION_WORDS, k=rng.randint(5, 25)))
+        due_date = (today + datetime.timedelta(days=rng.randint(-365, 90))).isoformat()
+        yield (subject,
+               rng.choices(("Низкий", "Средний", "Высокий"), weights=(5, 3, 1))[0],
+               rng.choices(("Инцидент", "Обслуживание"), weights=(2, 1))[0],
+               description, due_date, person_name(rng, 200),
+               rng.choices(("Открыта", "Закрыта"), weights=(1, 3))[0])
+
+
+def generate_requests_created(count, seed=0):
+    # Строки generate_requests со временем создания последним столбцом (INSERT_REQUEST_CREATED_SQL):
+    # за 1-60 дней до плановой даты, но не позже текущего момента, чтобы у заявок был разный возраст
+    rng = random.Random(f'created-{seed}')
+    now = datetime.datetime.now().replace(microsecond=0)
+    for row in generate_requests(count, seed):
+        created = datetime.datetime.fromisoformat(row[4]) - datetime.timedelta(days=rng.randint(1, 60),
+                                                                               seconds=rng.randrange(86400))
+        yield (*row, min(created, now).isoformat(sep=' '))
+
+
+def generate_books(count, seed=0):
+    # Строки в порядке столбцов INSERT_BOOK_SQL
+    rng = random.Random(seed)
+    for i in range(count):
+        title = f"{rng.choice(TITLE_ADJECTIVES)} {rng.choice(TITLE_NOUNS)}"
+        if rng.random() < 0.5:
+            title += f". Книга {rng.randint(1, 12)}"
+        pub_date = datetime.date(rng.randint(1950, 2024), rng.randint(1, 12), rng.randint(1, 28)).isoformat()
+        stock = 0 if rng.random() < 0.15 else rng.randint(1, 50)
+        yield (title, person_name(rng, 5000), rng.choice(GENRES),
+               round(rng.uniform(150, 3500), 2), pub_date, stock)
+
+
+def fill_database(table, path, rows, batch_size=10000, seed=0):
+    # Создаёт схему приложения и вставляет rows сгенерированных строк пакетами.
+    # Заявкам created_at задаётся явно, чтобы даты создания были разбросаны по прошлому
+    app = db.load_app(table)
+    if table == 'requests':
+        insert_sql, generate = app.INSERT_REQUEST_CREATED_SQL, generate_requests_created
+    else:
+        insert_sql, generate = app.INSERT_BOOK_SQL, generate_books
+    app.DB_PATH = path
+    app.create_db()
+    conn = db.connect(path)
+    rows_iter = generate(rows, seed)
+    start = time.perf_counter()
+    while True:
+        batch = list(itertools.islice(rows_iter, batch_size))
+        if not batch:
+            break
+        with conn:
+            conn.executemany(insert_sql, batch)
+    elapsed = time.perf_counter() - start
+    conn.execute(f"ANALYZE {'requests' if table == 'requests' else 'books'}")
+    conn.close()
+    return elapsed
@@ -0,0 +1,370 @@
+import argparse
+import asyncio
+import concurrent.futures
+import http.client
+import json
+import threading
+import urllib.parse
+
+import db
+
+
+# Локальный HTTP/JSON-сервис, который единолично владеет requests.db.
+# Несколько операторов запускают RequestApp в режиме клиента и работают с базой через сервис:
+# чтения выполняются в пуле потоков (у каждого потока своё соединение, результаты кэшируются
+# общим QueryCache), а все записи проходят через одну очередь и одно пишущее соединение,
+# поэтому ошибок "database is locked" между клиентами нет.
+# Запуск: python service.py --db requests.db --port 8765
+#         APP_SERVICE_URL=http://127.0.0.1:8765 python requests.py
+
+HOST = '127.0.0.1'
+PORT = 8765
+
+# Потоков (и соединений) для чтения
+READ_WORKERS = 4
+
+# Сколько записей из очереди объединяется в одну транзакцию
+WRITE_BATCH_SIZE = 100
+
+# Максимум строк в одном ответе на список и поиск
+MAX_LIMIT = 1000
+
+# Свободных страниц, возвращаемых файлу базы после удаления
+VACUUM_PAGES = 1000
+
+REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error'}
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RequestService:
+    def __init__(self, db_path, read_workers=READ_WORKERS):
+        self.app = db.load_app('requests')
+        self.app.DB_PATH = db_path
+        self.db_path = db_path
+        self.readers = concurrent.futures.ThreadPoolExecutor(read_workers, thread_name_prefix='reader')
+        self.writer = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='writer')
+        self.writes = None
+        self.server = None
+
+    async def start(self, host=HOST, port=PORT):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.writer, self.app.create_db)
+        self.writes = asyncio.Queue()
+        self.write_task = asyncio.create_task(self.write_loop())
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.write_task.cancel()
+        self.readers.shutdown()
+        self.writer.shutdown()
+
+    # Записи
+
+    async def write(self, kind, payload):
+        future = asyncio.get_running_loop().create_future()
+        await self.writes.put((kind, payload, future))
+        return await future
+
+    async def write_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.writes.get()]
+            while len(batch) < WRITE_BATCH_SIZE and not self.writes.empty():
+                batch.append(self.writes.get_nowait())
+            try:
+                results = await loop.run_in_executor(self.writer, self.apply_writes,
+                                                     [(kind, payload) for kind, payload, future in batch])
+            except Exception as e:
+                print(f"Error writing requests: {e}")
+                for kind, payload, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (kind, payload, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def apply_writes(self, batch):
+        # Выполняется в потоке записи: пакет записей - одна транзакция,
+        # ошибка одной записи откатывает только её точку сохранения
+        conn = db.get_connection(self.db_path)
+        results = []
+        deleted = False
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            for kind, payload in batch:
+                cursor.execute('SAVEPOINT item')
+                try:
+                    # Результат вместе с отрезком номеров журнала, добавленных записью: окно клиента
+                    # пропускает их при чтении изменений, как и номера своих записей очереди
+                    if kind == 'create':
+                        results.append(self.app.logged_write(cursor, self.app.insert_request, payload))
+                    else:
+                        results.append(self.app.logged_write(cursor, self.app.remove_requests, payload))
+                        deleted = True
+                    cursor.execute('RELEASE item')
+                except Exception as e:
+                    cursor.execute('ROLLBACK TO item')
+                    cursor.execute('RELEASE item')
+                    results.append(e)
+            # Журнал изменений не растёт без предела: лишнее сверх CHANGE_LOG_KEEP удаляется в той же транзакции
+            self.app.prune_request_changes(cursor)
+        if deleted:
+            db.incremental_vacuum(self.db_path, VACUUM_PAGES)
+        return results
+
+    # Чтения
+
+    async def read(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.readers, fn, *args)
+
+    # HTTP
+
+    async def handle(self, reader, writer):
+        # HTTP/1.1 с keep-alive: клиент держит одно соединение на поток
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                method, target, version = line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length') or 0))
+
+                try:
+                    status, payload = await self.dispatch(method, target, body)
+                except ServiceError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except ValueError as e:
+                    status, payload = 400, {'error': str(e)}
+                except Exception as e:
+                    print(f"Error handling {method} {target}: {e}")
+                    status, payload = 500, {'error': str(e)}
+
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                head = (f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+                        f'Content-Type: application/json; charset=utf-8\r\n'
+                        f'Content-Length: {len(data)}\r\n')
+                if not keep_alive:
+                    head += 'Connection: close\r\n'
+                writer.write(head.encode('latin-1') + b'\r\n' + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, body):
+        url = urllib.parse.urlsplit(target)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        parts = [part for part in url.path.split('/') if part]
+        if not parts or parts[0] != 'requests' or len(parts) > 2:
+            raise ServiceError(404, f"неизвестный адрес: {url.path}")
+        data = json.loads(body) if body else {}
+
+        if len(parts) == 1:
+            if method == 'GET':
+                return 200, {'rows': await self.list_requests(query)}
+            if method == 'POST':
+                values = self.app.validate_request(data)
+                row, span = await self.write('create', values)
+                return 201, {'row': row, 'span': span}
+        elif parts[1] == 'search':
+            if method == 'GET':
+                rows = await self.read(self.app.search_requests, query.get('q', ''), self.filters(query),
+                                       self.limit(query, self.app.SEARCH_LIMIT))
+                return 200, {'rows': rows}
+        elif parts[1] == 'changes':
+            if method == 'GET':
+                since = int(query['since']) if query.get('since') else None
+                # skip - JSON-список отрезков [после, до] номеров журнала собственных записей клиента
+                skip = [(int(first), int(last)) for first, last in json.loads(query['skip'])] \
+                    if query.get('skip') else ()
+                changes = await self.read(self.app.request_changes, since, self.filters(query), query.get('q', ''),
+                                          skip)
+                if changes is None:
+                    return 200, {'reset': True}
+                seq, rows, deleted = changes
+                return 200, {'seq': seq, 'rows': rows, 'deleted': deleted}
+        elif parts[1] == 'deadlines':
+            if method in ('GET', 'POST'):
+                ids = [int(request_id) for request_id in data['ids']] if method == 'POST' else None
+                return 200, {'rows': await self.read(self.app.open_request_deadlines, ids)}
+        elif parts[1] == 'responsibles':
+            if method == 'GET':
+                return 200, {'rows': await self.read(self.app.responsible_counts)}
+        elif parts[1] == 'delete':
+            if method == 'POST':
+                ids = [int(request_id) for request_id in data.get('ids', [])]
+                # Одна запись очереди - одна транзакция: remove_requests сам делит id на пакеты IN (...)
+                deleted, span = await self.write('delete', ids)
+                return 200, {'deleted': deleted, 'span': span}
+        else:
+            if not parts[1].isdigit():
+                raise ServiceError(404, f"неизвестный адрес: {url.path}")
+            request_id = int(parts[1])
+            if method == 'GET':
+                row = await self.read(self.app.get_request_by_id, request_id)
+                if row is None:
+                    raise ServiceError(404, f"Заявка с ID {request_id} не найдена!")
+                return 200, {'row': row}
+            if method == 'DELETE':
+                deleted, span = await self.write('delete', [request_id])
+                if not deleted:
+                    raise ServiceError(404, f"Заявка с ID {request_id} не найдена!")
+                return 200, {'deleted': deleted, 'span': span}
+        raise ServiceError(405, f"метод {method} не поддерживается для {url.path}")
+
+    def filters(self, query):
+        return {key: query[key] for key in self.app.FILTER_KEYS if query.get(key)}
+
+    def limit(self, query, default):
+        return max(1, min(int(query.get('limit', default)), MAX_LIMIT))
+
+    async def list_requests(self, query):
+        order_by = query.get('order_by', 'id')
+        if order_by not in self.app.SORT_COLUMNS:
+            raise ValueError(f"неизвестный столбец сортировки: {order_by}")
+        after = json.loads(query['after']) if query.get('after') else None
+        return await self.read(self.app.query_requests, self.filters(query), order_by, query.get('desc') == '1',
+                               after, self.limit(query, self.app.PAGE_SIZE))
+
+
+class ServiceClient:
+    # Клиент сервиса для RequestApp: одно keep-alive соединение на поток
+    # (окно и фоновый поиск обращаются к сервису из разных потоков)
+    def __init__(self, url, timeout=10):
+        parts = urllib.parse.urlsplit(url)
+        self.host = parts.hostname or HOST
+        self.port = parts.port or PORT
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def call(self, method, path, params=None, body=None):
+        if params:
+            path += '?' + urllib.parse.urlencode(params)
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if data is not None else {}
+        for attempt in range(2):
+            conn = getattr(self.local, 'conn', None)
+            reused = conn is not None
+            if conn is None:
+                conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                conn.request(method, path, data, headers)
+                response = conn.getresponse()
+                payload = json.loads(response.read())
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # Сервис мог закрыть простаивавшее соединение: повторяем один раз на новом
+                conn.close()
+                self.local.conn = None
+                if not reused or attempt:
+                    raise
+        if response.status >= 400:
+            raise ServiceError(response.status, payload.get('error', response.reason))
+        return payload
+
+    def query_requests(self, filters, order_by, descending, after, limit):
+        params = dict(filters or {}, order_by=order_by, desc='1' if descending else '0', limit=limit)
+        if after is not None:
+            params['after'] = json.dumps(list(after), ensure_ascii=False)
+        return [tuple(row) for row in self.call('GET', '/requests', params)['rows']]
+
+    def search_requests(self, text, filters, limit):
+        params = dict(filters or {}, q=text, limit=limit)
+        return [tuple(row) for row in self.call('GET', '/requests/search', params)['rows']]
+
+    def request_changes(self, since, filters=None, text='', skip=()):
+        params = dict(filters or {})
+        if text:
+            params['q'] = text
+        if skip:
+            params['skip'] = json.dumps([list(span) for span in skip])
+        if since is not None:
+            params['since'] = since
+        payload = self.call('GET', '/requests/changes', params)
+        if payload.get('reset'):
+            return None
+        return payload['seq'], [tuple(row) for row in payload['rows']], payload['deleted']
+
+    def responsible_counts(self):
+        return [tuple(row) for row in self.call('GET', '/requests/responsibles')['rows']]
+
+    def open_request_deadlines(self, request_ids=None):
+        if request_ids is None:
+            rows = self.call('GET', '/requests/deadlines')['rows']
+        else:
+            rows = self.call('POST', '/requests/deadlines', body={'ids': list(request_ids)})['rows']
+        return [tuple(row) for row in rows]
+
+    def get_request_by_id(self, request_id):
+        try:
+            return tuple(self.call('GET', f'/requests/{int(request_id)}')['row'])
+        except ServiceError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def add_request(self, record):
+        return self.add_request_logged(record)[0]
+
+    def delete_requests(self, request_ids):
+        return self.delete_requests_logged(request_ids)[0]
+
+    # Записи окна: результат и отрезок номеров журнала, как у requests.logged_write
+    def add_request_logged(self, record):
+        payload = self.call('POST', '/requests', body=record)
+        return tuple(payload['row']), tuple(payload['span'])
+
+    def delete_requests_logged(self, request_ids):
+        payload = self.call('POST', '/requests/delete', body={'ids': list(request_ids)})
+        return payload['deleted'], tuple(payload['span'])
+
+
+async def serve(db_path, host, port, read_workers):
+    service = RequestService(db_path, read_workers)
+    host, port = await service.start(host, port)
+    print(f"Сервис заявок: http://{host}:{port}, база {db_path}")
+    async with service.server:
+        await service.server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный HTTP/JSON-сервис заявок")
+    parser.add_argument('--db', default='requests.db', help="Файл базы данных")
+    parser.add_argument('--host', default=HOST, help="Адрес (по умолчанию только локальный)")
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--readers', type=int, default=READ_WORKERS, help="Потоков для чтения")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.db, args.host, args.port, max(1, args.readers)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
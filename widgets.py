@@ -0,0 +1,368 @@
+import heapq
+import math
+import time
+import tkinter as tk
+from tkinter import filedialog
+from tkinter import messagebox
+from tkinter import ttk
+
+import metrics
+
+
+# Общие компоненты интерфейса для requests.py и G.py
+
+
+class PagedTreeLoader:
+    # Оконная загрузка Treeview: в таблицу попадает только первая страница строк,
+    # следующие подгружаются keyset-пагинацией (продолжение после последней загруженной строки)
+    # по мере прокрутки.
+    def __init__(self, tree, scrollbar, fetch_page, insert_row, page_size=100, threshold=0.9):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.fetch_page = fetch_page  # fetch_page(last_row, limit) -> строки после last_row (None - с начала)
+        self.insert_row = insert_row
+        self.page_size = page_size
+        self.threshold = threshold
+        self.last_row = None
+        self.exhausted = True
+        self.pending = False
+        self.tree.configure(yscrollcommand=self.on_scroll)
+
+    def reset(self):
+        for item in self.tree.get_children():
+            self.tree.delete(item)
+        self.last_row = None
+        self.exhausted = False
+        self.load_next()
+
+    def stop(self):
+        # Таблица заполнена не постранично (например, результатами поиска)
+        self.exhausted = True
+
+    @metrics.timed
+    def load_next(self):
+        self.pending = False
+        if self.exhausted:
+            return
+        rows = self.fetch_page(self.last_row, self.page_size)
+        for row in rows:
+            self.insert_row(row)
+        if rows:
+            self.last_row = rows[-1]
+        if len(rows) < self.page_size:
+            self.exhausted = True
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        # Подгружаем следующую страницу, когда видимая область подошла к концу загруженных строк
+        if not self.exhausted and not self.pending and float(last) >= self.threshold:
+            self.pending = True
+            self.tree.after_idle(self.load_next)
+
+
+class TreeDelta:
+    # Точечное применение изменений к Treeview вместо полной перерисовки.
+    # iid строки совпадает с id записи в базе, поэтому поиск и удаление строки - O(1).
+    # Если задано хранилище строк (rowstore.RowStore), оно заполняется вместе с таблицей.
+    def __init__(self, tree, format_row, store=None):
+        self.tree = tree
+        self.format_row = format_row  # format_row(row) -> (values, tags)
+        self.store = store
+
+    def upsert(self, row):
+        iid = str(row[0])
+        values, tags = self.format_row(row)
+        if self.store is not None:
+            self.store.put(row)
+        if self.tree.exists(iid):
+            self.tree.item(iid, values=values, tags=tags)
+        else:
+            self.tree.insert('', 'end', iid=iid, values=values, tags=tags)
+
+    def delete(self, row_id):
+        iid = str(row_id)
+        if self.store is not None:
+            self.store.remove(row_id)
+        if self.tree.exists(iid):
+            self.tree.delete(iid)
+
+    def clear(self):
+        self.tree.delete(*self.tree.get_children())
+        if self.store is not None:
+            self.store.clear()
+
+    @metrics.timed
+    def apply(self, upserts=(), deletes=()):
+        # Позиция прокрутки и выделение сохраняются после изменения
+        top = self.tree.yview()[0]
+        selection = self.tree.selection()
+        for row_id in deletes:
+            self.delete(row_id)
+        for row in upserts:
+            self.upsert(row)
+        self.tree.selection_set([iid for iid in selection if self.tree.exists(iid)])
+        self.tree.yview_moveto(top)
+
+
+class Debouncer:
+    # Откладывает вызов callback, пока пользователь не перестанет печатать на delay мс
+    def __init__(self, widget, delay, callback):
+        self.widget = widget
+        self.delay = delay
+        self.callback = callback
+        self.after_id = None
+
+    def __call__(self, event=None):
+        self.cancel()
+        self.after_id = self.widget.after(self.delay, self.fire)
+
+    def cancel(self):
+        if self.after_id is not None:
+            self.widget.after_cancel(self.after_id)
+            self.after_id = None
+
+    def fire(self):
+        self.after_id = None
+        self.callback()
+
+
+class DeadlineScheduler:
+    # Мин-куча сроков (время, ключ): таймер root.after ставится только на ближайший срок,
+    # и по нему on_due(key, state) вызывается лишь для записей, чей срок наступил.
+    # Новые сроки записи заменяют прежние: устаревшие элементы кучи пропускаются по номеру версии.
+    def __init__(self, widget, on_due, max_delay=3600000):
+        self.widget = widget
+        self.on_due = on_due
+        self.max_delay = max_delay  # мс; таймер перепроверяется хотя бы так часто (сон, перевод часов)
+        self.heap = []  # (время, ключ, версия, состояние)
+        self.versions = {}
+        self.counter = 0
+        self.after_id = None
+        self.scheduled_at = None
+
+    def load(self, items):
+        # items: {ключ: [(время, состояние), ...]} - все сроки сразу, куча строится за O(n)
+        self.versions.clear()
+        self.heap = []
+        for key, events in items.items():
+            self.counter += 1
+            self.versions[key] = self.counter
+            self.heap.extend((when, key, self.counter, state) for when, state in events)
+        heapq.heapify(self.heap)
+        self.reschedule()
+
+    def set(self, key, events):
+        self.counter += 1
+        self.versions[key] = self.counter
+        for when, state in events:
+            heapq.heappush(self.heap, (when, key, self.counter, state))
+        self.compact()
+        self.reschedule()
+
+    def remove(self, key):
+        if self.versions.pop(key, None) is not None:
+            self.compact()
+            self.reschedule()
+
+    def is_current(self, entry):
+        return self.versions.get(entry[1]) == entry[2]
+
+    def compact(self):
+        # Устаревших элементов стало больше половины - куча перестраивается без них
+        if len(self.heap) > 2 * len(self.versions) + 64:
+            self.heap = [entry for entry in self.heap if self.is_current(entry)]
+            heapq.heapify(self.heap)
+
+    def reschedule(self):
+        while self.heap and not self.is_current(self.heap[0]):
+            heapq.heappop(self.heap)
+        when = self.heap[0][0] if self.heap else None
+        if when == self.scheduled_at and self.after_id is not None:
+            return
+        if self.after_id is not None:
+            self.widget.after_cancel(self.after_id)
+            self.after_id = None
+        self.scheduled_at = when
+        if when is not None:
+            delay = min(max(0, math.ceil((when - time.time()) * 1000)), self.max_delay)
+            self.after_id = self.widget.after(delay, self.fire)
+
+    def fire(self):
+        self.after_id = None
+        self.scheduled_at = None
+        now = time.time()
+        while self.heap and self.heap[0][0] <= now:
+            entry = heapq.heappop(self.heap)
+            if self.is_current(entry):
+                self.on_due(entry[1], entry[3])
+        self.reschedule()
+
+
+class StatusBar:
+    # Строка состояния внизу окна: сообщения о результатах фоновых операций без модальных окон.
+    # Обычное сообщение исчезает через timeout мс, сообщение об ошибке остаётся до следующего.
+    def __init__(self, root, timeout=5000):
+        self.root = root
+        self.timeout = timeout
+        self.after_id = None
+        self.label = ttk.Label(root, anchor=tk.W, padding=(8, 2))
+        self.label.pack(side=tk.BOTTOM, fill=tk.X)
+
+    def show(self, text, error=False):
+        self.cancel()
+        self.label.config(text=text, foreground='red' if error else '')
+        if not error:
+            self.after_id = self.root.after(self.timeout, self.clear)
+
+    def cancel(self):
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+
+    def clear(self):
+        self.after_id = None
+        self.label.config(text='', foreground='')
+
+
+class Autocomplete:
+    # Список подсказок под полем ввода: suggest(text) возвращает значения для введённого начала.
+    # Стрелки выбирают подсказку, Enter или щелчок подставляют её, Escape закрывает список
+    def __init__(self, entry, suggest, height=6):
+        self.entry = entry
+        self.suggest = suggest
+        self.listbox = tk.Listbox(entry.winfo_toplevel(), height=height, exportselection=False, takefocus=0)
+        self.listbox.bind('<ButtonRelease-1>', lambda event: self.accept())
+        self.visible = False
+        entry.bind('<KeyRelease>', self.update, add='+')
+        entry.bind('<Down>', lambda event: self.move(1), add='+')
+        entry.bind('<Up>', lambda event: self.move(-1), add='+')
+        entry.bind('<Return>', lambda event: self.accept(), add='+')
+        entry.bind('<Escape>', lambda event: self.hide(), add='+')
+        # Задержка - чтобы щелчок по списку успел подставить значение до его скрытия
+        entry.bind('<FocusOut>', lambda event: entry.after(150, self.hide), add='+')
+
+    def update(self, event=None):
+        if event is not None and event.keysym in ('Up', 'Down', 'Return', 'Escape', 'Tab'):
+            return
+        text = self.entry.get().strip()
+        values = self.suggest(text) if text else []
+        # Единственная подсказка, совпадающая с введённым, не показывается
+        if not values or values == [text]:
+            self.hide()
+            return
+        self.listbox.delete(0, tk.END)
+        self.listbox.insert(tk.END, *values)
+        self.listbox.config(height=min(len(values), 6))
+        if not self.visible:
+            self.listbox.place(in_=self.entry, relx=0, rely=1, relwidth=1)
+            self.visible = True
+        self.listbox.lift()
+
+    def move(self, step):
+        if not self.visible:
+            return None
+        selection = self.listbox.curselection()
+        index = selection[0] + step if selection else (0 if step > 0 else self.listbox.size() - 1)
+        index = max(0, min(index, self.listbox.size() - 1))
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(index)
+        self.listbox.see(index)
+        return 'break'
+
+    def accept(self):
+        selection = self.listbox.curselection()
+        if not self.visible or not selection:
+            return None
+        self.entry.delete(0, tk.END)
+        self.entry.insert(0, self.listbox.get(selection[0]))
+        self.entry.icursor(tk.END)
+        self.hide()
+        return 'break'
+
+    def hide(self):
+        if self.visible:
+            self.listbox.place_forget()
+            self.visible = False
+
+
+class ReusableDialog:
+    # Toplevel, который строится один раз при первом открытии, а при закрытии только скрывается.
+    # Повторное открытие сбрасывает поля через reset вместо создания всех виджетов заново.
+    def __init__(self, root, title, geometry, build, reset=None):
+        self.root = root
+        self.title = title
+        self.geometry = geometry
+        self.build = build  # build(window) - создаёт виджеты окна
+        self.reset = reset  # reset() - возвращает поля к исходным значениям
+        self.window = None
+
+    def show(self):
+        if self.window is None or not self.window.winfo_exists():
+            self.window = tk.Toplevel(self.root)
+            self.window.title(self.title)
+            self.window.geometry(self.geometry)
+            self.window.protocol("WM_DELETE_WINDOW", self.hide)
+            self.build(self.window)
+        else:
+            self.window.deiconify()
+        self.window.lift()
+        self.window.focus_set()
+        if self.reset is not None:
+            self.reset()
+        return self.window
+
+    def hide(self):
+        if self.window is not None and self.window.winfo_exists():
+            self.window.withdraw()
+
+
+class MetricsWindow:
+    # Окно замеров (APP_METRICS=1): время функций работы с базой и обновления интерфейса,
+    # число медленных запросов и выгрузка всех замеров в JSON
+    def __init__(self, root):
+        self.window = tk.Toplevel(root)
+        self.window.title("Замеры производительности")
+        self.window.geometry("700x400")
+
+        self.summary_label = ttk.Label(self.window)
+        self.summary_label.pack(fill=tk.X, padx=10, pady=5)
+
+        columns = ("name", "count", "mean", "p50", "p95", "max")
+        self.tree = ttk.Treeview(self.window, columns=columns, show='headings')
+        for column, text, width in zip(columns, ("Функция", "Вызовов", "Среднее, мс", "p50, мс", "p95, мс", "Макс., мс"),
+                                       (250, 70, 90, 80, 80, 90)):
+            self.tree.heading(column, text=text)
+            self.tree.column(column, width=width)
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10)
+
+        button_frame = ttk.Frame(self.window)
+        button_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Button(button_frame, text="Обновить", command=self.refresh).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="Экспорт в JSON", command=self.export).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Сбросить", command=self.reset).pack(side=tk.LEFT)
+
+        self.refresh()
+
+    def refresh(self):
+        stats = metrics.snapshot()
+        self.summary_label.config(text=f"Медленных запросов (>= {stats['slow_query_ms']:g} мс): "
+                                       f"{stats['slow_queries']}, журнал: {stats['slow_query_log']}")
+        self.tree.delete(*self.tree.get_children())
+        for name, timing in stats['timings'].items():
+            self.tree.insert('', 'end', values=(name, timing['count'], f"{timing['mean_ms']:.2f}",
+                                                f"{timing['p50_ms']:.2f}", f"{timing['p95_ms']:.2f}",
+                                                f"{timing['max_ms']:.2f}"))
+
+    def export(self):
+        path = filedialog.asksaveasfilename(parent=self.window, defaultextension=".json",
+                                            filetypes=[("JSON", "*.json")], initialfile="metrics.json")
+        if path:
+            try:
+                metrics.dump(path)
+                messagebox.showinfo("Успех", f"Замеры сохранены в {path}", parent=self.window)
+            except OSError as e:
+                messagebox.showerror("Ошибка", f"Не удалось сохранить замеры: {e}", parent=self.window)
+
+    def reset(self):
+        metrics.reset()
+        self.refresh()
@@ -0,0 +1,195 @@
+import concurrent.futures
+import queue
+import threading
+import time
+
+import db
+
+
+# Фоновое выполнение запросов к базе, чтобы окно Tk не замирало на медленных запросах
+
+class QueryWorker:
+    # Запросы выполняются по очереди в отдельном потоке со своим соединением к базе,
+    # а результаты передаются обратно в поток Tk через root.after.
+    # Каждый запрос отправляется с ключом: новый запрос с тем же ключом отменяет устаревший.
+    # Запрос с ключом None (например, запись через сервис) не отменяется и не отменяет другие.
+    def __init__(self, root, poll_interval=20):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.generations = {}
+        self.lock = threading.Lock()
+        self.running_key = None
+        self.pending = 0
+        self.polling = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, key, fn, args=(), callback=None):
+        with self.lock:
+            generation = None
+            if key is not None:
+                generation = self.generations.get(key, 0) + 1
+                self.generations[key] = generation
+                self.interrupt_running(key)
+            self.pending += 1
+        self.jobs.put((key, generation, fn, args, callback))
+        if not self.polling:
+            self.polling = True
+            self.root.after(self.poll_interval, self.poll)
+
+    def cancel(self, key):
+        # Результат ещё не завершённого запроса с этим ключом будет отброшен
+        with self.lock:
+            self.generations[key] = self.generations.get(key, 0) + 1
+            self.interrupt_running(key)
+
+    def interrupt_running(self, key):
+        # Вызывается под self.lock: пока блокировка удерживается, поток не начнёт следующий запрос
+        if self.running_key == key:
+            db.interrupt(self.thread.ident)
+
+    def is_stale(self, key, generation):
+        return self.generations.get(key) != generation
+
+    def run(self):
+        while True:
+            key, generation, fn, args, callback = self.jobs.get()
+            with self.lock:
+                if self.is_stale(key, generation):
+                    self.pending -= 1
+                    continue
+                self.running_key = key
+            try:
+                result = fn(*args)
+            except Exception as e:
+                # Прерванный устаревший запрос - не ошибка
+                if not self.is_stale(key, generation):
+                    print(f"Error running background query: {e}")
+                result = None
+            with self.lock:
+                self.running_key = None
+            self.results.put((key, generation, callback, result))
+
+    def poll(self):
+        while True:
+            try:
+                key, generation, callback, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            with self.lock:
+                self.pending -= 1
+                stale = self.is_stale(key, generation)
+            if callback is not None and not stale:
+                callback(result)
+        if self.pending > 0:
+            self.root.after(self.poll_interval, self.poll)
+        else:
+            self.polling = False
+
+
+class WriteQueue:
+    # Отложенная запись с групповой фиксацией: операции копятся в очереди и выполняются в отдельном
+    # потоке пакетами, одна транзакция на пакет. Пакет закрывается, когда в нём batch_size операций
+    # или первая операция ждёт max_delay мс. Каждая операция - функция fn(cursor, *args) - выполняется
+    # в своей точке сохранения: её ошибка откатывает только её изменения.
+    # submit возвращает concurrent.futures.Future; callback(future) вызывается после фиксации пакета -
+    # в потоке Tk через root.after, а без root (пакетные скрипты) - в потоке записи.
+    def __init__(self, path, root=None, batch_size=500, max_delay=20, poll_interval=20):
+        self.path = path
+        self.root = root
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.polling = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, fn, args=(), callback=None):
+        future = concurrent.futures.Future()
+        with self.lock:
+            self.pending += 1
+        self.jobs.put((fn, args, callback, future))
+        # Опрос результатов запускается из потока Tk: сам Tk из других потоков не вызывается
+        if self.root is not None and not self.polling:
+            self.polling = True
+            self.root.after(self.poll_interval, self.poll)
+        return future
+
+    def flush(self):
+        # Ждёт, пока будут зафиксированы все отправленные операции
+        self.jobs.join()
+
+    def next_batch(self):
+        batch = [self.jobs.get()]
+        deadline = time.perf_counter() + self.max_delay / 1000
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.jobs.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            results = []
+            try:
+                conn = db.get_connection(self.path)
+                with conn:
+                    cursor = conn.cursor()
+                    cursor.execute('BEGIN IMMEDIATE')
+                    for fn, args, callback, future in batch:
+                        cursor.execute('SAVEPOINT item')
+                        try:
+                            results.append((fn(cursor, *args), None))
+                            cursor.execute('RELEASE item')
+                        except Exception as e:
+                            cursor.execute('ROLLBACK TO item')
+                            cursor.execute('RELEASE item')
+                            results.append((None, e))
+            except Exception as e:
+                # Пакет не зафиксирован: ошибка у всех его операций
+                print(f"Error writing batch: {e}")
+                results = [(None, e)] * len(batch)
+            for (fn, args, callback, future), (result, error) in zip(batch, results):
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+                self.done(callback, future)
+                self.jobs.task_done()
+
+    def done(self, callback, future):
+        if self.root is not None:
+            self.results.put((callback, future))
+            return
+        with self.lock:
+            self.pending -= 1
+        if callback is not None:
+            callback(future)
+
+    def poll(self):
+        while True:
+            try:
+                callback, future = self.results.get_nowait()
+            except queue.Empty:
+                break
+            with self.lock:
+                self.pending -= 1
+            if callback is not None:
+                callback(future)
+        with self.lock:
+            pending = self.pending
+        if pending > 0:
+            self.root.after(self.poll_interval, self.poll)
+        else:
+            self.polling = False